@@ -6,12 +6,15 @@ from datetime import datetime
 from dku_io_utils.utils import set_column_description
 from gluonts_forecasts.training_session import TrainingSession
 from dku_io_utils.recipe_config_loading import load_training_config, get_models_parameters
-from dku_io_utils.utils import write_to_folder
+from dku_io_utils.utils import write_to_folder, write_directory_to_folder
 from gluonts_forecasts.model_handler import get_model_label
+from gluonts_forecasts.gluon_dataset import save_lazy_list_dataset
 from constants import ObjectType
 from timeseries_preparation.preparation import TimeseriesPreparator
+from timeseries_preparation.streaming import StreamingTimeseriesPreparator
 from safe_logger import SafeLogger
 from time import perf_counter
+import tempfile
 
 logger = SafeLogger("Forecast plugin")
 session_name = datetime.utcnow().isoformat() + "Z"
@@ -25,8 +28,6 @@ mxnet_context = set_mxnet_context(params["gpu_devices"])
 models_parameters = get_models_parameters(config, is_training_multivariate=params["is_training_multivariate"])
 start = perf_counter()
 
-training_df = params["training_dataset"].get_dataframe()
-
 timeseries_preparator = TimeseriesPreparator(
     time_column_name=params["time_column_name"],
     frequency=params["frequency"],
@@ -34,9 +35,22 @@ timeseries_preparator = TimeseriesPreparator(
     timeseries_identifiers_names=params["timeseries_identifiers_names"],
     external_features_columns_names=params["external_features_columns_names"],
     max_timeseries_length=params["max_timeseries_length"],
+    low_memory=params["low_memory"],
+    n_workers=params["preparation_workers"],
 )
 
-training_df_prepared = timeseries_preparator.prepare_timeseries_dataframe(training_df)
+if params["streaming_ingestion"]:
+    # prepared shards are read from disk during the whole session, the directory is removed at the end of the recipe
+    shards_directory = tempfile.TemporaryDirectory()
+    streaming_preparator = StreamingTimeseriesPreparator(timeseries_preparator, shards_directory.name, compact_dtypes=params["compact_dtypes"])
+    training_df_prepared = streaming_preparator.prepare_timeseries_shards(params["training_dataset"])
+else:
+    training_df = params["training_dataset"].get_dataframe()
+    training_df_prepared = timeseries_preparator.prepare_timeseries_dataframe(training_df)
+    del training_df  # release the raw input dataset as only the prepared dataframe is used from now on
+
+    if params["compact_dtypes"]:
+        training_df_prepared = timeseries_preparator.compact_dtypes(training_df_prepared)
 
 training_session = TrainingSession(
     target_columns_names=params["target_columns_names"],
@@ -53,6 +67,7 @@ training_session = TrainingSession(
     user_num_batches_per_epoch=params["num_batches_per_epoch"],
     season_length=params["season_length"],
     mxnet_context=mxnet_context,
+    n_workers=params["training_workers"],
 )
 training_session.init(partition_root=params["partition_root"], session_name=session_name)
 
@@ -71,8 +86,10 @@ if not params["evaluation_only"]:
     metrics_path = "{}/metrics.csv".format(training_session.session_path)
     write_to_folder(training_session.get_metrics_df(), model_folder, metrics_path, ObjectType.CSV)
 
-    gluon_train_dataset_path = "{}/gluon_train_dataset.pk.gz".format(training_session.session_path)
-    write_to_folder(training_session.full_list_dataset, model_folder, gluon_train_dataset_path, ObjectType.PICKLE_GZ)
+    gluon_train_dataset_path = "{}/gluon_train_dataset".format(training_session.session_path)
+    with tempfile.TemporaryDirectory() as local_directory:
+        filenames = save_lazy_list_dataset(training_session.full_list_dataset, local_directory, original_dtypes=timeseries_preparator.original_dtypes)
+        write_directory_to_folder(local_directory, filenames, model_folder, gluon_train_dataset_path)
 
     for model in training_session.models:
         model_path = "{}/{}/model.pk.gz".format(training_session.session_path, get_model_label(model.model_name))
@@ -88,8 +105,11 @@ evaluation_results_columns_descriptions = training_session.create_evaluation_res
 set_column_description(params["evaluation_dataset"], evaluation_results_columns_descriptions)
 
 if params["make_forecasts"]:
-    evaluation_forecasts_df = training_session.get_evaluation_forecasts_df()
+    evaluation_forecasts_df = timeseries_preparator.restore_dtypes(training_session.get_evaluation_forecasts_df())
     params["evaluation_forecasts_dataset"].write_with_schema(evaluation_forecasts_df)
 
     evaluation_forecasts_columns_descriptions = training_session.create_evaluation_forecasts_column_description()
     set_column_description(params["evaluation_forecasts_dataset"], evaluation_forecasts_columns_descriptions)
+
+if params["streaming_ingestion"]:
+    shards_directory.cleanup()
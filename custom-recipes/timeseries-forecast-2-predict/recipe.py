@@ -1,5 +1,5 @@
 from dku_io_utils.recipe_config_loading import load_predict_config
-from dku_io_utils.utils import set_column_description
+from dku_io_utils.utils import set_column_description, write_dataframes_with_schema
 from dku_io_utils.checks_utils import external_features_check
 from dku_io_utils.model_selection import ModelSelection
 from gluonts_forecasts.utils import add_future_external_features
@@ -47,12 +47,10 @@ trained_model = TrainedModel(
     history_length_limit=params["history_length_limit"],
 )
 
-trained_model.predict()
+forecasts_dfs = trained_model.iter_forecasts_dfs(session=model_selection.get_session_name(), model_label=model_selection.get_model_label())
+write_dataframes_with_schema(params["output_dataset"], forecasts_dfs)
 
 logger.info("Forecasting future values: Done in {:.2f} seconds".format(perf_counter() - start))
 
-forecasts_df = trained_model.get_forecasts_df(session=model_selection.get_session_name(), model_label=model_selection.get_model_label())
-params["output_dataset"].write_with_schema(forecasts_df)
-
 column_descriptions = trained_model.create_forecasts_column_description()
 set_column_description(params["output_dataset"], column_descriptions)
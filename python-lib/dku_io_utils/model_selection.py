@@ -1,8 +1,10 @@
 import re
 import os
-from dku_io_utils.utils import read_from_folder
+import tempfile
+from dku_io_utils.utils import read_from_folder, get_local_directory_from_folder
 from constants import METRICS_DATASET, TIMESTAMP_REGEX_PATTERN, ObjectType
 from gluonts_forecasts.model_handler import list_available_models_labels
+from gluonts_forecasts.gluon_dataset import load_lazy_list_dataset
 
 
 class ModelSelectionError(ValueError):
@@ -32,6 +34,7 @@ class ModelSelection:
         self.session_path = None
         self.model_label = None
         self.performance_metric = None
+        self._download_directory = None
 
     def set_manual_selection_parameters(self, session_name, model_label):
         """Set the session and model label if there were manually selected in the recipe form/
@@ -81,7 +84,14 @@ class ModelSelection:
         return model
 
     def get_gluon_train_dataset(self):
-        """ Retrieve the GluonDataset object with training data that was saved in the model folder during training """
+        """Retrieve the GluonDataset object with training data that was saved in the model folder during training.
+        Datasets saved as memory-mappable buffers are read lazily, sessions trained with previous versions are unpickled.
+        """
+        gluon_train_dataset_directory = f"{self.session_path}/gluon_train_dataset"
+        if self.folder.get_path_details(path=f"{gluon_train_dataset_directory}/index.json")["exists"]:
+            self._download_directory = tempfile.TemporaryDirectory()
+            local_directory = get_local_directory_from_folder(self.folder, gluon_train_dataset_directory, self._download_directory.name)
+            return load_lazy_list_dataset(local_directory)
         gluon_train_dataset_path = f"{self.session_path}/gluon_train_dataset.pk.gz"
         gluon_train_dataset = read_from_folder(self.folder, gluon_train_dataset_path, ObjectType.PICKLE_GZ)
         return gluon_train_dataset
@@ -131,6 +131,16 @@ def load_training_config(recipe_config):
         if params["max_timeseries_length"] < 4:
             raise PluginParamValidationError("Number of records must be higher than 4")
 
+    params["low_memory"] = recipe_config.get("low_memory", False)
+    params["compact_dtypes"] = recipe_config.get("compact_dtypes", False)
+    params["streaming_ingestion"] = recipe_config.get("streaming_ingestion", False)
+    params["preparation_workers"] = recipe_config.get("preparation_workers", 1)
+    if params["preparation_workers"] < 1:
+        raise PluginParamValidationError("Number of preparation workers must be higher than 1")
+    params["training_workers"] = recipe_config.get("training_workers", 1)
+    if params["training_workers"] < 1:
+        raise PluginParamValidationError("Number of training workers must be higher than 1")
+
     params["evaluation_strategy"] = "split"
     params["evaluation_only"] = False
 
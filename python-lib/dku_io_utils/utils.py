@@ -1,4 +1,7 @@
 import io
+import os
+import itertools
+import shutil
 import dill as pickle
 import pandas as pd
 import json
@@ -81,6 +84,77 @@ def write_to_folder(object_to_save, folder, path, object_type):
             )
 
 
+def write_directory_to_folder(local_directory, filenames, folder, path):
+    """Upload files of a local directory to the folder/path directory.
+
+    Args:
+        local_directory (str): Local directory containing the files.
+        filenames (list): Names of the files to upload.
+        folder (dataiku.Folder)
+        path (str): Directory path within the folder.
+    """
+    logger.info(f"Saving directory '{path}' to folder")
+    for filename in filenames:
+        with open(os.path.join(local_directory, filename), "rb") as local_file, folder.get_writer(f"{path}/{filename}") as writer:
+            shutil.copyfileobj(local_file, writer)
+
+
+def get_local_directory_from_folder(folder, path, download_directory):
+    """Return a local directory with the files of the folder/path directory, to read them with local file functions (e.g. numpy.load).
+    Files of a folder stored on the local filesystem are read in place, otherwise they are downloaded to download_directory.
+
+    Args:
+        folder (dataiku.Folder)
+        path (str): Directory path within the folder.
+        download_directory (str): Local directory where files of a remote folder are downloaded.
+
+    Raises:
+        ValueError: No directory were found at the requested path.
+
+    Returns:
+        Path of the local directory
+    """
+    logger.info(f"Loading directory '{path}' from folder")
+    if not folder.get_path_details(path=path)["exists"]:
+        raise ValueError(f"Directory at path '{path}' does not exist in folder {folder.get_name()}")
+    try:
+        return os.path.join(folder.get_path(), path.lstrip("/"))
+    except Exception:
+        logger.info("Folder is not stored on the local filesystem, downloading files")
+    for child in folder.get_path_details(path=path)["children"]:
+        with folder.get_download_stream(f"{path}/{child['name']}") as stream, open(os.path.join(download_directory, child["name"]), "wb") as local_file:
+            shutil.copyfileobj(stream, local_file)
+    return download_directory
+
+
+def write_dataframes_with_schema(dataset, dataframes, columns=None):
+    """Write a stream of dataframes to a dataset with a fixed schema, set from the first dataframe.
+    Only one dataframe is in memory at a time, unlike dataiku.Dataset.write_with_schema which needs the whole dataframe.
+    If there are no dataframes, the dataset is still overwritten with an empty dataframe of the expected columns.
+
+    Args:
+        dataset (dataiku.Dataset)
+        dataframes (iterable): Dataframes with the same columns.
+        columns (list, optional): Expected columns of the schema when there are no dataframes. Defaults to None.
+
+    Returns:
+        Number of rows written
+    """
+    dataframes = iter(dataframes)
+    first_dataframe = next(dataframes, None)
+    if first_dataframe is None:
+        logger.warning("No rows to write, writing an empty dataset")
+        first_dataframe = pd.DataFrame(columns=columns)
+    dataset.write_schema_from_dataframe(first_dataframe)
+    rows_count = 0
+    with dataset.get_writer() as writer:
+        for dataframe in itertools.chain([first_dataframe], dataframes):
+            writer.write_dataframe(dataframe)
+            rows_count += len(dataframe.index)
+    logger.info(f"Written {rows_count} rows to dataset")
+    return rows_count
+
+
 def set_column_description(output_dataset, column_description_dict, input_dataset=None):
     """Set column descriptions of the output dataset based on a dictionary of column descriptions
 
@@ -3,19 +3,33 @@ from gluonts.model.forecast import SampleForecast
 from gluonts.model.predictor import RepresentablePredictor
 from gluonts.support.pandas import frequency_add
 from gluonts.core.component import validated
-from gluonts_forecasts.custom_models.utils import cast_kwargs
+from gluonts_forecasts.custom_models.utils import cast_kwargs, cast_string, compute_confidence_intervals_samples, get_n_jobs, map_timeseries
 from constants import TIMESERIES_KEYS
 from pmdarima.arima.utils import nsdiffs
 import pmdarima as pm
 import numpy as np
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from scipy.stats import norm
 from safe_logger import SafeLogger
 from tqdm import tqdm
 from threadpoolctl import threadpool_limits
 
+STANDARD_ERROR_ALPHA = 0.05
+MAX_LOGGED_FAILED_TIMESERIES = 10
+
+# errors of pm.auto_arima or statsmodels when a model can't be fitted on a timeseries (too short, missing values, singular matrix, ...)
+TIMESERIES_FIT_ERRORS = (ValueError, IndexError, ArithmeticError, np.linalg.LinAlgError)
+
 
 logger = SafeLogger("Forecast plugin - AutoARIMA")
 
 
+class AutoARIMAParameterError(ValueError):
+    """Custom exception raised when the AutoARIMA parameters can't be used to train the models, whatever the timeseries"""
+
+    pass
+
+
 class AutoARIMAPredictor(RepresentablePredictor):
     """
     An abstract predictor that can be subclassed by models that are not based
@@ -36,6 +50,11 @@ class AutoARIMAPredictor(RepresentablePredictor):
         super().__init__(freq=freq, lead_time=lead_time, prediction_length=prediction_length)
         self.trained_models = trained_models
 
+    def __reduce__(self):
+        """Pickle the trained models as CompactAutoARIMAModel, rebuilt one timeseries at a time when predicting"""
+        compact_trained_models = [CompactAutoARIMAModel.from_trained_model(trained_model) for trained_model in self.trained_models]
+        return self.__class__, (self.prediction_length, self.freq, compact_trained_models, self.lead_time)
+
     def predict(self, dataset, **kwargs):
         """
 
@@ -54,21 +73,38 @@ class AutoARIMAPredictor(RepresentablePredictor):
 
         Args:
             item (DataEntry): One timeseries.
-            trained_model (pm.auto_arima): Trained autoarima model.
+            trained_model (pm.auto_arima or CompactAutoARIMAModel): Trained autoarima model. None if the training failed on this timeseries.
 
         Returns:
             SampleForecast of quantiles.
         """
         start_date = frequency_add(item[TIMESERIES_KEYS.START], len(item[TIMESERIES_KEYS.TARGET]))
 
+        if trained_model is None:  # training failed on this timeseries, fallback to the last value
+            return SampleForecast(samples=np.full((1, self.prediction_length), item[TIMESERIES_KEYS.TARGET][-1]), start_date=start_date, freq=self.freq)
+
         prediction_external_features = self._set_prediction_external_features(item)
 
-        samples = []
-        for alpha in np.arange(0.02, 1.01, 0.02):
-            confidence_intervals = trained_model.predict(n_periods=self.prediction_length, X=prediction_external_features, return_conf_int=True, alpha=alpha)[1]
-            samples += [confidence_intervals[:, 0], confidence_intervals[:, 1]]
+        if isinstance(trained_model, CompactAutoARIMAModel):
+            target_length = len(item[TIMESERIES_KEYS.TARGET])
+            results = trained_model.rebuild(item)
+            predictions = results.get_prediction(
+                start=target_length,
+                end=target_length + self.prediction_length - 1,
+                exog=prediction_external_features if trained_model.use_external_features else None,
+            )
+            samples = compute_confidence_intervals_samples(predictions.predicted_mean, np.sqrt(predictions.var_pred_mean))
+            return SampleForecast(samples=samples, start_date=start_date, freq=self.freq)
 
-        return SampleForecast(samples=np.stack(samples), start_date=start_date, freq=self.freq)
+        # confidence intervals are Gaussian (forecast +/- norm.ppf(1 - alpha / 2) * standard error), so the standard error
+        # is retrieved from a single confidence interval and used to compute the bounds of all alphas at once
+        forecast, confidence_interval = trained_model.predict(
+            n_periods=self.prediction_length, X=prediction_external_features, return_conf_int=True, alpha=STANDARD_ERROR_ALPHA
+        )
+        standard_error = (confidence_interval[:, 1] - confidence_interval[:, 0]) / (2 * norm.ppf(1 - STANDARD_ERROR_ALPHA / 2))
+        samples = compute_confidence_intervals_samples(forecast, standard_error)
+
+        return SampleForecast(samples=samples, start_date=start_date, freq=self.freq)
 
     def _set_prediction_external_features(self, item):
         prediction_external_features = None
@@ -77,9 +113,79 @@ class AutoARIMAPredictor(RepresentablePredictor):
         return prediction_external_features
 
 
+class CompactAutoARIMAModel:
+    """
+    Orders and fitted parameters of a pm.auto_arima model, without its training data and filter results.
+    The statsmodels SARIMAX results are rebuilt by filtering the timeseries to forecast with the fitted parameters,
+    which gives the same forecasts as the original model since this timeseries is the one the model was trained on.
+
+    Attributes:
+        sarimax_kwargs (dict): Keyword arguments of the statsmodels SARIMAX model (order, seasonal_order, trend, ...)
+        params (numpy.array): Fitted parameters
+        use_external_features (bool): If the model was trained with external features
+    """
+
+    def __init__(self, sarimax_kwargs, params, use_external_features=False):
+        self.sarimax_kwargs = sarimax_kwargs
+        self.params = params
+        self.use_external_features = use_external_features
+
+    @classmethod
+    def from_trained_model(cls, trained_model):
+        """Return the compact form of a trained pm.auto_arima model.
+        Models that are already compact or None (failed training) are returned as is, as well as models using simple differencing
+        since pmdarima forecasts them with its own undifferencing.
+        """
+        if not isinstance(trained_model, pm.ARIMA):
+            return trained_model
+        sarimax_kwargs = dict(trained_model.sarimax_kwargs or {})
+        if sarimax_kwargs.get("simple_differencing", False):
+            return trained_model
+        sarimax_kwargs.update(order=trained_model.order, seasonal_order=trained_model.seasonal_order, trend=trained_model.trend)
+        # same SARIMAX arguments as pm.ARIMA.fit: null seasonal orders have a period of 0 and the intercept is a constant trend
+        if sum(trained_model.seasonal_order[:3]) == 0 and trained_model.seasonal_order[3] == 1:
+            sarimax_kwargs["seasonal_order"] = (0, 0, 0, 0)
+        if trained_model.trend is None and trained_model.with_intercept:
+            sarimax_kwargs["trend"] = "c"
+        return cls(sarimax_kwargs, np.asarray(trained_model.arima_res_.params), use_external_features=trained_model.arima_res_.model.k_exog > 0)
+
+    def rebuild(self, item):
+        """Rebuild the statsmodels SARIMAX results of the model trained on the timeseries of item.
+
+        Args:
+            item (DataEntry): Timeseries the model was trained on, possibly with future external features.
+
+        Returns:
+            statsmodels SARIMAXResults
+        """
+        target = item[TIMESERIES_KEYS.TARGET]
+        external_features = None
+        if self.use_external_features:
+            external_features = item[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL][:, : len(target)].T
+        return SARIMAX(target, exog=external_features, **self.sarimax_kwargs).filter(self.params)
+
+
 class AutoARIMAEstimator(Estimator):
+    """
+    Estimator training one pm.auto_arima model per timeseries.
+
+    Attributes:
+        prediction_length (int): Number of time steps to predict
+        freq (str): Pandas timeseries frequency
+        season_length (int): Seasonality 'm' of pm.auto_arima
+        use_feat_dynamic_real (bool): If the models are fed external features
+        n_jobs (int): Number of processes fitting the timeseries in parallel. -1 means all CPUs.
+        chunksize (int): Number of timeseries sent at once to each process. Default to None which means an automatic chunksize.
+        reuse_evaluation_orders (bool): If retrain keeps the orders of the models found during evaluation and only refits their coefficients.
+            Defaults to False which means a full pm.auto_arima search on the full timeseries.
+        kwargs (dict): Kwargs of pm.auto_arima
+        failed_timeseries (list): Identifiers, target name and error of the timeseries whose training failed
+    """
+
     @validated()
-    def __init__(self, prediction_length, freq, season_length=None, use_feat_dynamic_real=False, **kwargs):
+    def __init__(
+        self, prediction_length, freq, season_length=None, use_feat_dynamic_real=False, n_jobs=1, chunksize=None, reuse_evaluation_orders=False, **kwargs
+    ):
         super().__init__()
         self.prediction_length = prediction_length
         self.freq = freq
@@ -89,32 +195,107 @@ class AutoARIMAEstimator(Estimator):
         if "m" in kwargs:
             raise ValueError("Keyword argument 'm' is not writable for AutoARIMA, please use the Season length parameter")
         self.season_length = season_length if season_length is not None else 1
+        self.n_jobs = get_n_jobs(n_jobs)
+        self.chunksize = chunksize
+        self.reuse_evaluation_orders = cast_string(reuse_evaluation_orders)
+        self.failed_timeseries = []
 
     def train(self, training_data, validation_data=None):
         """Train the estimator on the given data.
+        Timeseries on which the training fails are collected in failed_timeseries and forecasted with their last value.
 
         Args:
             training_data (gluonts.dataset.common.Dataset): Dataset to train the model on.
             validation_data (gluonts.dataset.common.Dataset, optional): Dataset to validate the model on during training. Defaults to None.
 
+        Raises:
+            ValueError: If the training failed on all timeseries.
+            AutoARIMAParameterError: If the parameters can't be used, e.g. a season length that can't be tested on a timeseries.
+
         Returns:
             Predictor containing the trained model.
         """
-        trained_models = []
-        logger.info("Training one AutoARIMA model per time series ...")
-        for item in tqdm(training_data):
-            if self.season_length > 1:
-                self._check_season_length(self.season_length, item[TIMESERIES_KEYS.TARGET], self.kwargs)
-            external_features = self._set_external_features(self.kwargs, item)
+        return self._train(training_data)
+
+    def retrain(self, training_data, evaluation_predictor):
+        """Train the estimator on the full timeseries after an evaluation on their truncated version.
+        If reuse_evaluation_orders is True, the orders of each evaluation model are kept and only their coefficients are refitted,
+        with a full pm.auto_arima search when the refit fails or when no evaluation model is available for the timeseries.
+
+        Args:
+            training_data (gluonts.dataset.common.Dataset): Dataset of the full timeseries, in the same order as during evaluation.
+            evaluation_predictor (AutoARIMAPredictor): Predictor trained during evaluation.
+
+        Returns:
+            Predictor containing the trained model.
+        """
+        if not self.reuse_evaluation_orders:
+            return self._train(training_data)
+        return self._train(training_data, evaluation_models=evaluation_predictor.trained_models)
+
+    def _train(self, training_data, evaluation_models=None):
+        """Train one model per timeseries, starting from the orders of evaluation_models if not None"""
+        targets, external_features, descriptions = [], [], []
+        for item in training_data:
+            targets += [item[TIMESERIES_KEYS.TARGET]]
+            external_features += [self._set_external_features(self.kwargs, item)]
+            descriptions += [{key: item[key] for key in [TIMESERIES_KEYS.TARGET_NAME, TIMESERIES_KEYS.IDENTIFIERS] if key in item}]
 
-            with threadpool_limits(limits=self.thread_limit, user_api="blas"):
-                # calls to blas implementation will be limited to use only one thread
-                model = pm.auto_arima(item[TIMESERIES_KEYS.TARGET], X=external_features, m=self.season_length, **self.kwargs)
+        logger.info(f"Training one AutoARIMA model per time series on {len(targets)} time series with {self.n_jobs} processes ...")
+        if self.use_feat_dynamic_real:
+            logger.info("Using external features")
+        if evaluation_models is None:
+            evaluation_models = [None] * len(targets)
+        else:
+            logger.info("Reusing the orders of the models found during evaluation")
+        results = map_timeseries(
+            fit_autoarima, targets, external_features, [self] * len(targets), evaluation_models, n_jobs=self.n_jobs, chunksize=self.chunksize
+        )
 
+        trained_models = []
+        self.failed_timeseries = []
+        for (model, error), description in zip(results, descriptions):
+            if error is not None:
+                self.failed_timeseries += [dict(description, error=error)]
             trained_models += [model]
+        if len(self.failed_timeseries) > 0:
+            if len(self.failed_timeseries) == len(targets):
+                raise ValueError(f"AutoARIMA training failed on all time series. First error: {self.failed_timeseries[0]['error']}")
+            logged_failed_timeseries = self.failed_timeseries[:MAX_LOGGED_FAILED_TIMESERIES]
+            logger.warning(
+                f"AutoARIMA training failed on {len(self.failed_timeseries)} time series, they are forecasted with their last value. "
+                + f"First failures: {logged_failed_timeseries}{' ...' if len(self.failed_timeseries) > MAX_LOGGED_FAILED_TIMESERIES else ''}"
+            )
 
         return AutoARIMAPredictor(prediction_length=self.prediction_length, freq=self.freq, trained_models=trained_models)
 
+    def fit(self, target, external_features=None, evaluation_model=None):
+        """Fit a pm.auto_arima model on one timeseries.
+
+        Args:
+            target (numpy.array): Target to train on.
+            external_features (numpy.array, optional): Array of external features of shape values x features. Defaults to None.
+            evaluation_model (pm.ARIMA, optional): Model found during evaluation whose orders are refitted on target.
+                Defaults to None which means a full pm.auto_arima search.
+
+        Raises:
+            AutoARIMAParameterError: If the season length can't be used on target.
+
+        Returns:
+            Trained pm.auto_arima model
+        """
+        if isinstance(evaluation_model, pm.ARIMA):
+            try:
+                with threadpool_limits(limits=self.thread_limit, user_api="blas"):
+                    return pm.ARIMA(**evaluation_model.get_params()).fit(target, X=external_features)
+            except TIMESERIES_FIT_ERRORS as e:
+                logger.warning(f"Refitting the evaluation orders {evaluation_model.order}{evaluation_model.seasonal_order} failed, searching new orders: {e}")
+        if self.season_length > 1:
+            self._check_season_length(self.season_length, target, self.kwargs)
+        with threadpool_limits(limits=self.thread_limit, user_api="blas"):
+            # calls to blas implementation will be limited to use only one thread
+            return pm.auto_arima(target, X=external_features, m=self.season_length, **self.kwargs)
+
     def _check_season_length(self, season_length, target, kwargs):
         """Check if season_length is a working value for seasonality by performing the same test of seasonality pm.auto_arima does.
         The goal is for pm.auto_arima not to fail the training later.
@@ -124,6 +305,8 @@ class AutoARIMAEstimator(Estimator):
             target (numpy.array): Target to train on.
             kwargs (dict): Kwargs dictionary of pm.auto_arima
 
+        Raises:
+            AutoARIMAParameterError: If the seasonality test fails with this season length.
         """
         logger.info(f"Check if seasonality 'm' can be set to {season_length}")
         try:
@@ -135,11 +318,33 @@ class AutoARIMAEstimator(Estimator):
                 **kwargs.get("seasonal_test_args", dict()),
             )
         except Exception as e:
-            raise ValueError(f"Seasonality of AutoARIMA can't be set to {season_length}. Error when testing seasonality with nsdiffs: {e}")
+            raise AutoARIMAParameterError(f"Seasonality of AutoARIMA can't be set to {season_length}. Error when testing seasonality with nsdiffs: {e}")
 
     def _set_external_features(self, kwargs, item):
         external_features = None
         if self.use_feat_dynamic_real:
             external_features = item[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL].T
-            logger.info("Using external features")
         return external_features
+
+
+def fit_autoarima(target, external_features, estimator, evaluation_model=None):
+    """Fit a pm.auto_arima model on one timeseries, in a worker process or not.
+
+    Args:
+        target (numpy.array): Target to train on.
+        external_features (numpy.array): Array of external features of shape values x features. None if not used.
+        estimator (AutoARIMAEstimator): Estimator holding the pm.auto_arima parameters.
+        evaluation_model (pm.ARIMA, optional): Model found during evaluation whose orders are refitted. Defaults to None.
+
+    Raises:
+        AutoARIMAParameterError: If the parameters of the estimator can't be used, which fails the whole training.
+
+    Returns:
+        Tuple of the trained model and None, or None and the error message if the model can't be fitted on this timeseries
+    """
+    try:
+        return estimator.fit(target, external_features, evaluation_model=evaluation_model), None
+    except AutoARIMAParameterError:
+        raise
+    except TIMESERIES_FIT_ERRORS as e:
+        return None, str(e)
@@ -3,14 +3,16 @@ from gluonts.model.forecast import SampleForecast
 from gluonts.model.predictor import RepresentablePredictor
 from gluonts.support.pandas import frequency_add
 from gluonts.core.component import validated
-from gluonts_forecasts.custom_models.utils import cast_kwargs
+from gluonts_forecasts.custom_models.utils import cast_kwargs, compute_confidence_intervals_samples, get_n_jobs, map_timeseries
 from constants import TIMESERIES_KEYS
-from statsmodels.tsa.api import STLForecast
+from statsmodels.tsa.api import STLForecast, STL
+from statsmodels.tsa.forecasting.stl import STLForecastResults
 from statsmodels.tsa.exponential_smoothing.ets import ETSModel
 import numpy as np
 import pandas as pd
 from safe_logger import SafeLogger
 from tqdm import tqdm
+from threadpoolctl import threadpool_limits
 
 
 logger = SafeLogger("Forecast plugin - SeasonalTrend")
@@ -32,9 +34,15 @@ class SeasonalTrendPredictor(RepresentablePredictor):
     """
 
     @validated()
-    def __init__(self, prediction_length, freq, trained_models, lead_time=0):
+    def __init__(self, prediction_length, freq, trained_models, model_kwargs=None, lead_time=0):
         super().__init__(freq=freq, lead_time=lead_time, prediction_length=prediction_length)
         self.trained_models = trained_models
+        self.model_kwargs = model_kwargs if model_kwargs is not None else {}
+
+    def __reduce__(self):
+        """Pickle the trained models as CompactSeasonalTrendModel, rebuilt one timeseries at a time when predicting"""
+        compact_trained_models = [CompactSeasonalTrendModel.from_trained_model(trained_model, self.model_kwargs) for trained_model in self.trained_models]
+        return self.__class__, (self.prediction_length, self.freq, compact_trained_models, self.model_kwargs, self.lead_time)
 
     def predict(self, dataset, **kwargs):
         """
@@ -54,7 +62,7 @@ class SeasonalTrendPredictor(RepresentablePredictor):
 
         Args:
             item (DataEntry): One timeseries.
-            trained_model (STLForecastResults): Trained STL model.
+            trained_model (STLForecastResults or CompactSeasonalTrendModel): Trained STL model.
 
         Returns:
             SampleForecast of quantiles.
@@ -62,21 +70,81 @@ class SeasonalTrendPredictor(RepresentablePredictor):
         target_length = len(item[TIMESERIES_KEYS.TARGET])
         start_date = frequency_add(item[TIMESERIES_KEYS.START], target_length)
 
-        samples = []
-        for alpha in np.arange(0.02, 1.01, 0.02):
-            predictions = trained_model.get_prediction(start=target_length, end=target_length + self.prediction_length - 1)
-            confidence_intervals = predictions.conf_int(alpha=alpha)
-            samples += [confidence_intervals["lower"].values, confidence_intervals["upper"].values]
+        if isinstance(trained_model, CompactSeasonalTrendModel):
+            trained_model = trained_model.rebuild(item[TIMESERIES_KEYS.TARGET])
+        predictions = trained_model.get_prediction(start=target_length, end=target_length + self.prediction_length - 1)
+        samples = compute_confidence_intervals_samples(
+            predictions.predicted_mean,
+            np.sqrt(predictions.var_pred_mean),
+            ppf=lambda q: predictions.dist.ppf(q, *predictions.dist_args),
+        )
+
+        return SampleForecast(samples=samples, start_date=start_date, freq=self.freq)
+
+
+class CompactSeasonalTrendModel:
+    """
+    STL configuration and fitted parameters of a STLForecast model, without its training data, decomposition and model results.
+    The STLForecastResults are rebuilt by decomposing the timeseries to forecast and smoothing its deseasonalized values with the fitted parameters,
+    which gives the same forecasts as the original model since this timeseries is the one the model was trained on.
+
+    Attributes:
+        stl_config (dict): Keyword arguments of the STL decomposition
+        model (class): Model class fitted on the deseasonalized timeseries (e.g. ETSModel)
+        model_kwargs (dict): Keyword arguments of the model class
+        params (numpy.array): Fitted parameters of the model
+    """
+
+    def __init__(self, stl_config, model, model_kwargs, params):
+        self.stl_config = stl_config
+        self.model = model
+        self.model_kwargs = model_kwargs
+        self.params = params
 
-        return SampleForecast(samples=np.stack(samples), start_date=start_date, freq=self.freq)
+    @classmethod
+    def from_trained_model(cls, trained_model, model_kwargs):
+        """Return the compact form of a STLForecastResults. Models that are already compact are returned as is."""
+        if not isinstance(trained_model, STLForecastResults):
+            return trained_model
+        return cls(trained_model.stl.config, trained_model.model.__class__, model_kwargs, np.asarray(trained_model.model_result.params))
+
+    def rebuild(self, target):
+        """Rebuild the STLForecastResults of the model trained on target, the same way as STLForecast.fit.
+
+        Args:
+            target (numpy.array): Target the model was trained on.
+
+        Returns:
+            STLForecastResults
+        """
+        endog = pd.Series(target)
+        stl = STL(endog, **self.stl_config)
+        stl_result = stl.fit()
+        model = self.model(stl_result.trend + stl_result.resid, **self.model_kwargs)
+        return STLForecastResults(stl, stl_result, model, model.smooth(self.params), endog)
 
 
 class SeasonalTrendEstimator(Estimator):
+    """
+    Estimator fitting one STLForecast model per time series.
+
+    Attributes:
+        prediction_length (int): Number of time steps to predict
+        freq (str): Pandas timeseries frequency
+        season_length (int): Period of the STL decomposition
+        n_jobs (int): Number of processes fitting the timeseries in parallel. -1 means all CPUs.
+        chunksize (int): Number of timeseries sent at once to each process. Default to None which means an automatic chunksize.
+        kwargs (dict): Kwargs of STLForecast
+    """
+
     @validated()
-    def __init__(self, prediction_length, freq, season_length, **kwargs):
+    def __init__(self, prediction_length, freq, season_length, n_jobs=1, chunksize=None, **kwargs):
         super().__init__()
         self.prediction_length = prediction_length
         self.freq = freq
+        self.n_jobs = get_n_jobs(n_jobs)
+        self.chunksize = chunksize
+        self.thread_limit = 1
         self.kwargs = cast_kwargs(kwargs)
         if "period" in self.kwargs:
             raise ValueError("Keyword argument 'period' is not writable for SeasonalTrend, please use the Season length parameter")
@@ -104,11 +172,37 @@ class SeasonalTrendEstimator(Estimator):
         Returns:
             Predictor containing the trained STL models.
         """
-        trained_models = []
-        logger.info("Creating one SeasonalTrend model per time series ...")
-        for item in tqdm(training_data):
-            model = STLForecast(endog=pd.Series(item[TIMESERIES_KEYS.TARGET]), period=self.season_length, **self.kwargs)
-            trained_model = model.fit()
-            trained_models += [trained_model]
-
-        return SeasonalTrendPredictor(prediction_length=self.prediction_length, freq=self.freq, trained_models=trained_models)
+        targets = [item[TIMESERIES_KEYS.TARGET] for item in training_data]
+        logger.info(f"Creating one SeasonalTrend model per time series on {len(targets)} time series with {self.n_jobs} processes ...")
+        trained_models = map_timeseries(fit_seasonal_trend, targets, [self] * len(targets), n_jobs=self.n_jobs, chunksize=self.chunksize)
+
+        return SeasonalTrendPredictor(
+            prediction_length=self.prediction_length, freq=self.freq, trained_models=trained_models, model_kwargs=self.kwargs.get("model_kwargs")
+        )
+
+    def fit(self, target):
+        """Fit a STLForecast model on one timeseries.
+
+        Args:
+            target (numpy.array): Target to train on.
+
+        Returns:
+            Trained STLForecastResults
+        """
+        model = STLForecast(endog=pd.Series(target), period=self.season_length, **self.kwargs)
+        with threadpool_limits(limits=self.thread_limit, user_api="blas"):
+            # calls to blas implementation will be limited to use only one thread
+            return model.fit()
+
+
+def fit_seasonal_trend(target, estimator):
+    """Fit a STLForecast model on one timeseries, in a worker process or not.
+
+    Args:
+        target (numpy.array): Target to train on.
+        estimator (SeasonalTrendEstimator): Estimator holding the STLForecast parameters.
+
+    Returns:
+        Trained STLForecastResults
+    """
+    return estimator.fit(target)
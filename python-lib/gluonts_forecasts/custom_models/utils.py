@@ -1,3 +1,56 @@
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import norm
+from tqdm import tqdm
+
+CONFIDENCE_INTERVALS_ALPHAS = np.arange(0.02, 1.01, 0.02)
+CHUNKS_PER_JOB = 4
+
+
+def compute_confidence_intervals_samples(mean, standard_error, ppf=norm.ppf):
+    """Compute the bounds of the confidence intervals mean +/- ppf(1 - alpha / 2) * standard_error of all CONFIDENCE_INTERVALS_ALPHAS at once.
+
+    Args:
+        mean (numpy.array): Predicted mean of each time step.
+        standard_error (numpy.array): Standard error of the predicted mean of each time step.
+        ppf (function, optional): Percent point function of the prediction distribution. Defaults to the Gaussian one.
+
+    Returns:
+        Array of shape (2 * number of alphas, number of time steps) with the lower and upper bounds of each alpha one after the other
+    """
+    quantiles = ppf(1 - CONFIDENCE_INTERVALS_ALPHAS / 2)[:, np.newaxis]
+    lower_bounds = np.asarray(mean) - quantiles * np.asarray(standard_error)
+    upper_bounds = np.asarray(mean) + quantiles * np.asarray(standard_error)
+    return np.stack([lower_bounds, upper_bounds], axis=1).reshape(-1, len(mean))
+
+
+def get_n_jobs(n_jobs):
+    """Return the number of processes to use, -1 meaning all CPUs"""
+    return multiprocessing.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+
+
+def map_timeseries(function, *iterables, n_jobs=1, chunksize=None):
+    """Apply function to each timeseries, in a pool of n_jobs processes if n_jobs is higher than 1.
+
+    Args:
+        function (function): Module-level function called with one element of each iterable.
+        *iterables (list): Lists of arguments of the same length, one element per timeseries.
+        n_jobs (int, optional): Number of processes. Defaults to 1 which means in the current process.
+        chunksize (int, optional): Number of timeseries sent at once to each process.
+            Defaults to None which means CHUNKS_PER_JOB chunks per process.
+
+    Returns:
+        List of the results of function, in the order of the timeseries
+    """
+    timeseries_number = len(iterables[0])
+    if n_jobs > 1 and timeseries_number > 1:
+        chunksize = chunksize if chunksize else max(1, timeseries_number // (n_jobs * CHUNKS_PER_JOB))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(tqdm(executor.map(function, *iterables, chunksize=chunksize), total=timeseries_number))
+    return list(tqdm(map(function, *iterables), total=timeseries_number))
+
+
 def cast_kwargs(kwargs):
     kwargs_copy = kwargs.copy()
     for arg, value in kwargs_copy.items():
@@ -0,0 +1,140 @@
+from gluonts.evaluation import Evaluator
+from gluonts.time_feature import get_seasonality
+from gluonts_forecasts.utils import MEAN_FORECAST_KEY
+import pandas as pd
+import numpy as np
+
+
+class BatchEvaluator(Evaluator):
+    """
+    GluonTS Evaluator computing the metrics of all timeseries at once with numpy operations on 2-D arrays,
+    instead of calling get_metrics_per_ts on each timeseries and forecast.
+    Item metrics follow get_metrics_per_ts: missing target values are ignored and metrics of timeseries without target values are NaN.
+    Aggregated metrics are computed with the parent get_aggregate_metrics.
+
+    Attributes:
+        forecast_keys (list): Forecasts mean and quantiles needed to compute the metrics, in the order expected by get_metrics_per_batch
+    """
+
+    def __init__(self, quantiles=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9), seasonality=None, alpha=0.05):
+        super().__init__(quantiles=quantiles, seasonality=seasonality, alpha=alpha, num_workers=0)
+        self.forecast_keys = [MEAN_FORECAST_KEY, 0.5, self.alpha / 2, 1.0 - self.alpha / 2] + [quantile.value for quantile in self.quantiles]
+
+    def evaluate_batch(self, targets, past_targets, forecasts_arrays, freq):
+        """Compute the item metrics of all timeseries and the aggregated metrics.
+
+        Args:
+            targets (numpy.array): Array of shape (timeseries number, prediction length) of the target values to forecast.
+            past_targets (list): List of the target values before the forecasted dates of each timeseries.
+            forecasts_arrays (numpy.array): Array of shape (timeseries number, len(forecast_keys), prediction length)
+                of the forecasts values of each forecast key (e.g. returned by gluonts_forecasts.utils.reduce_forecasts_to_quantiles).
+            freq (str): Frequency of the timeseries, used to find the seasonality if none was given.
+
+        Returns:
+            Dictionary of aggregated metrics over all timeseries.
+            DataFrame of metrics for each timeseries.
+        """
+        seasonality = self.seasonality if self.seasonality else get_seasonality(freq)
+        seasonal_errors = self.seasonal_errors(past_targets, seasonality)
+        return self.get_aggregate_metrics(self.get_metrics_per_batch(targets, forecasts_arrays, seasonal_errors))
+
+    def get_metrics_per_batch(self, targets, forecasts_arrays, seasonal_errors):
+        """Compute the same metrics as get_metrics_per_ts for all timeseries at once.
+
+        Args:
+            targets (numpy.array): Array of shape (timeseries number, prediction length) of the target values to forecast.
+            forecasts_arrays (numpy.array): Array of shape (timeseries number, len(forecast_keys), prediction length).
+            seasonal_errors (numpy.array): Seasonal error of each timeseries.
+
+        Returns:
+            DataFrame of metrics for each timeseries.
+        """
+        targets = np.asarray(targets, dtype=np.float64)
+        forecasts_arrays = np.asarray(forecasts_arrays, dtype=np.float64)
+        valid = np.isfinite(targets)
+        targets = np.where(valid, targets, 0.0)
+        mean_forecasts, median_forecasts, lower_forecasts, upper_forecasts = (forecasts_arrays[:, i, :] for i in range(4))
+        seasonal_errors_flag = seasonal_errors <= self.zero_tol
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            abs_errors = np.abs(targets - median_forecasts)
+            mape_denominator = np.abs(targets)
+            mape_flag = mape_denominator <= self.zero_tol
+            smape_denominator = np.abs(targets) + np.abs(median_forecasts)
+            smape_flag = smape_denominator <= self.zero_tol
+            interval_scores = (
+                upper_forecasts
+                - lower_forecasts
+                + 2.0 / self.alpha * (lower_forecasts - targets) * (targets < lower_forecasts)
+                + 2.0 / self.alpha * (targets - upper_forecasts) * (targets > upper_forecasts)
+            )
+
+            metrics = {
+                "item_id": np.full(len(targets), np.nan),
+                "MSE": self._masked_mean(np.square(targets - mean_forecasts), valid),
+                "abs_error": self._masked_sum(abs_errors, valid),
+                "abs_target_sum": self._masked_sum(np.abs(targets), valid),
+                "abs_target_mean": self._masked_mean(np.abs(targets), valid),
+                "seasonal_error": seasonal_errors,
+                "MASE": (self._masked_mean(abs_errors, valid) * (1 - seasonal_errors_flag)) / (seasonal_errors + seasonal_errors_flag),
+                "MAPE": self._masked_mean((abs_errors * (1 - mape_flag)) / (mape_denominator + mape_flag), valid),
+                "sMAPE": 2 * self._masked_mean((abs_errors * (1 - smape_flag)) / (smape_denominator + smape_flag), valid),
+                "OWA": np.full(len(targets), np.nan),
+                "MSIS": (self._masked_mean(interval_scores, valid) * (1 - seasonal_errors_flag)) / (seasonal_errors + seasonal_errors_flag),
+            }
+            for i, quantile in enumerate(self.quantiles, start=4):
+                quantile_forecasts = forecasts_arrays[:, i, :]
+                metrics[quantile.loss_name] = 2.0 * self._masked_sum(
+                    np.abs((quantile_forecasts - targets) * ((targets <= quantile_forecasts) - quantile.value)), valid
+                )
+                metrics[quantile.coverage_name] = self._masked_mean(targets < quantile_forecasts, valid)
+        return pd.DataFrame(metrics, dtype=np.float64)
+
+    @staticmethod
+    def seasonal_errors(past_targets, seasonality):
+        """Compute the seasonal error of each timeseries as Evaluator.seasonal_error, on the concatenation of all past targets.
+        Differences between values of different timeseries or with missing values are ignored.
+
+        Args:
+            past_targets (list): List of the target values before the forecasted dates of each timeseries.
+            seasonality (int): Seasonal lag, reverted to 1 for timeseries not longer than it.
+
+        Returns:
+            Array of seasonal errors (NaN for timeseries without any valid difference).
+        """
+        timeseries_number = len(past_targets)
+        lengths = np.array([len(past_target) for past_target in past_targets], dtype=int)
+        all_past_targets = np.concatenate([np.asarray(past_target, dtype=np.float64) for past_target in past_targets]) if timeseries_number > 0 else np.array([])
+        timeseries_indices = np.repeat(np.arange(timeseries_number), lengths)
+        valid = np.isfinite(all_past_targets)
+        lags = np.where(seasonality < lengths, seasonality, 1)
+
+        abs_differences_sums = np.zeros(timeseries_number)
+        abs_differences_counts = np.zeros(timeseries_number)
+        for lag in np.unique(lags):
+            differences_timeseries_indices = timeseries_indices[lag:]
+            selected = (
+                (differences_timeseries_indices == timeseries_indices[:-lag])
+                & valid[lag:]
+                & valid[:-lag]
+                & (lags[differences_timeseries_indices] == lag)
+            )
+            abs_differences = np.abs(all_past_targets[:-lag] - all_past_targets[lag:])[selected]
+            abs_differences_sums += np.bincount(differences_timeseries_indices[selected], weights=abs_differences, minlength=timeseries_number)
+            abs_differences_counts += np.bincount(differences_timeseries_indices[selected], minlength=timeseries_number)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(abs_differences_counts > 0, abs_differences_sums / abs_differences_counts, np.nan)
+
+    @staticmethod
+    def _masked_sum(values, valid):
+        """Sum of values along the forecast dates where valid, NaN if no value is valid (like a fully masked array)"""
+        counts = valid.sum(axis=1)
+        sums = np.where(valid, values, 0.0).sum(axis=1)
+        return np.where(counts > 0, sums, np.nan)
+
+    @staticmethod
+    def _masked_mean(values, valid):
+        """Mean of values along the forecast dates where valid, NaN if no value is valid (like a fully masked array)"""
+        counts = valid.sum(axis=1)
+        sums = np.where(valid, values, 0.0).sum(axis=1)
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
@@ -1,7 +1,15 @@
-from gluonts.dataset.common import ListDataset
+from gluonts.dataset.common import ListDataset, ProcessDataEntry
 from constants import TIMESERIES_KEYS
+from collections.abc import Sequence
+from bisect import bisect_right
+import os
+import json
+import pandas as pd
 import numpy as np
 
+COLUMNAR_DATASET_FORMAT_VERSION = 1
+COLUMNAR_DATASET_INDEX_FILENAME = "index.json"
+
 
 class GluonDataset:
     """
@@ -9,7 +17,8 @@ class GluonDataset:
     Each timeseries stores information about its target(s), time and external features column names as well as its identifiers values
 
     Attributes:
-        dataframe (DataFrame)
+        dataframe (DataFrame or iterable of DataFrame): Timeseries dataframe, or dataframes (e.g. prepared shards) each holding
+            all the rows of their timeseries so that timeseries are built one dataframe at a time
         time_column_name (list)
         frequency (str): Pandas timeseries frequency (e.g. '3M')
         target_columns_names (list): List of column names to predict
@@ -37,6 +46,7 @@ class GluonDataset:
 
     def create_list_datasets(self, cut_lengths=[]):
         """Create timeseries for each identifier tuple and each target.
+        The timeseries of each cut length are views of the same columnar buffers, so each extra cut length only costs the timeseries dictionaries.
 
         Args:
             cut_length (int, optional): Remove the last cut_length time steps of each timeseries. Defaults to empty list.
@@ -45,38 +55,190 @@ class GluonDataset:
             List of gluonts.dataset.common.ListDataset with extra keys for each timeseries
         """
         multivariate_timeseries_per_cut_length = [[] for cut_length in cut_lengths]
-        if self.timeseries_identifiers_names:
-            for identifiers_values, identifiers_df in self.dataframe.groupby(self.timeseries_identifiers_names):
+        for columnar_timeseries in self._create_all_columnar_timeseries(cut_lengths):
+            for timeseries_index in range(columnar_timeseries.timeseries_number):
                 for cut_length_index, cut_length in enumerate(cut_lengths):
-                    multivariate_timeseries_per_cut_length[cut_length_index] += self._create_gluon_multivariate_timeseries(
-                        identifiers_df, cut_length, identifiers_values=identifiers_values
-                    )
-        else:
-            for cut_length_index, cut_length in enumerate(cut_lengths):
-                multivariate_timeseries_per_cut_length[cut_length_index] += self._create_gluon_multivariate_timeseries(self.dataframe, cut_length)
+                    multivariate_timeseries_per_cut_length[cut_length_index] += columnar_timeseries.create_multivariate_timeseries(timeseries_index, cut_length)
         gluon_list_dataset_per_cut_length = []
         for multivariate_timeseries in multivariate_timeseries_per_cut_length:
             gluon_list_dataset_per_cut_length += [ListDataset(multivariate_timeseries, freq=self.frequency)]
         return gluon_list_dataset_per_cut_length
 
-    def _create_gluon_multivariate_timeseries(self, dataframe, cut_length, identifiers_values=None):
-        """Create a list of timeseries dictionaries for each target column
+    def create_lazy_list_datasets(self, cut_lengths=[]):
+        """Create datasets generating the timeseries dictionaries on demand instead of storing them.
+        Datasets of all cut lengths share the same columnar buffers, so memory doesn't depend on the number of cut lengths.
+
+        Args:
+            cut_length (int, optional): Remove the last cut_length time steps of each timeseries. Defaults to empty list.
+
+        Returns:
+            List of LazyListDataset with the same timeseries dictionaries as the ListDataset of the create_list_datasets method
+        """
+        all_columnar_timeseries = self._create_all_columnar_timeseries(cut_lengths)
+        return [LazyListDataset(LazyTimeseriesList(all_columnar_timeseries, cut_length), freq=self.frequency) for cut_length in cut_lengths]
+
+    def _create_all_columnar_timeseries(self, cut_lengths):
+        """Create the ColumnarTimeseries of each dataframe and check the timeseries are long enough for all cut lengths"""
+        all_columnar_timeseries = []
+        for dataframe in self._iter_dataframes():
+            columnar_timeseries = self._create_columnar_timeseries(dataframe)
+            for cut_length in cut_lengths:
+                self._check_minimum_length(np.diff(columnar_timeseries.offsets), cut_length)
+            all_columnar_timeseries.append(columnar_timeseries)
+        return all_columnar_timeseries
+
+    def _iter_dataframes(self):
+        """Yield the timeseries dataframe, or each dataframe if the timeseries are split across multiple dataframes"""
+        if isinstance(self.dataframe, pd.DataFrame):
+            yield self.dataframe
+        else:
+            yield from self.dataframe
+
+    def _create_columnar_timeseries(self, dataframe):
+        """Store the timeseries of dataframe in contiguous buffers ordered by timeseries identifiers.
+        Identifiers columns are factorized once and timeseries are delimited by comparing the codes of adjacent rows.
+        Rows are only reordered if the dataframe is not already sorted by identifiers (as prepared by the TimeseriesPreparator).
 
         Args:
-            dataframe (DataFrame): Timeseries dataframe with one or multiple target columns.
-            cut_length (int): Remove the last cut_length time steps of each timeseries.
-            identifiers_values (obj/tuple, optional): Values or tuple of values of the groupby. Defaults to None.
+            dataframe (DataFrame): Timeseries dataframe sorted by time within each timeseries.
+
+        Returns:
+            ColumnarTimeseries
+        """
+        rows_order = slice(None)
+        is_timeseries_start = np.zeros(len(dataframe.index), dtype=bool)
+        is_timeseries_start[:1] = True
+        if self.timeseries_identifiers_names:
+            identifiers_codes = [pd.factorize(dataframe[identifier_name], sort=True)[0] for identifier_name in self.timeseries_identifiers_names]
+            if not is_lexicographically_sorted(identifiers_codes):
+                rows_order = np.lexsort(identifiers_codes[::-1])
+                identifiers_codes = [codes[rows_order] for codes in identifiers_codes]
+            for codes in identifiers_codes:
+                is_timeseries_start[1:] |= codes[1:] != codes[:-1]
+        first_rows_positions = np.flatnonzero(is_timeseries_start)
+        offsets = np.append(first_rows_positions, len(dataframe.index))
+        if len(dataframe.index) == 0 and not self.timeseries_identifiers_names:
+            offsets = np.array([0, 0])
+        if isinstance(rows_order, np.ndarray):
+            first_rows_positions = rows_order[first_rows_positions]
+
+        targets_buffers = {target_column_name: dataframe[target_column_name].values[rows_order] for target_column_name in self.target_columns_names}
+        external_features_buffer = None
+        if self.external_features_columns_names:
+            external_features_buffer = np.ascontiguousarray(dataframe[self.external_features_columns_names].values[rows_order].T)
+
+        first_rows = dataframe.iloc[first_rows_positions]
+        identifiers_values = None
+        if self.timeseries_identifiers_names:
+            identifiers_values = list(zip(*[first_rows[identifier_name].tolist() for identifier_name in self.timeseries_identifiers_names]))
+        return ColumnarTimeseries(
+            time_column_name=self.time_column_name,
+            target_columns_names=self.target_columns_names,
+            timeseries_identifiers_names=self.timeseries_identifiers_names,
+            external_features_columns_names=self.external_features_columns_names,
+            starts=first_rows[self.time_column_name].tolist(),
+            offsets=offsets.tolist(),
+            targets_buffers=targets_buffers,
+            external_features_buffer=external_features_buffer,
+            identifiers_values=identifiers_values,
+        )
+
+    def _check_minimum_length(self, timeseries_lengths, cut_length):
+        """Check that all timeseries have enough values.
+
+        Args:
+            timeseries_lengths (numpy.array): Number of time steps of each timeseries.
+            cut_length (int): Numnber of time steps that will be removed from each timeseries.
+
+        Raises:
+            ValueError: If at least one timeseries doesn't have enough values.
+        """
+        min_length = self.min_length
+        if cut_length:
+            min_length += cut_length
+        if (timeseries_lengths < min_length).any():
+            raise ValueError(f"Time series must have at least {min_length} values")
+
+
+def is_lexicographically_sorted(codes_arrays):
+    """Check that rows are sorted by the first codes array, then by the second codes array for equal first codes, etc.
+
+    Args:
+        codes_arrays (list): List of numpy.array of codes of the same length.
+
+    Returns:
+        True if rows are sorted.
+    """
+    is_descending = np.zeros(max(len(codes_arrays[0]) - 1, 0), dtype=bool)
+    is_equal = np.ones(max(len(codes_arrays[0]) - 1, 0), dtype=bool)
+    for codes in codes_arrays:
+        codes_differences = np.diff(codes)
+        is_descending |= is_equal & (codes_differences < 0)
+        is_equal &= codes_differences == 0
+    return not is_descending.any()
+
+
+class ColumnarTimeseries:
+    """
+    Columnar store of multiple timeseries: the values of each target column and the external features of all timeseries
+    are stored in single buffers, one timeseries after the other. Timeseries are delimited by offsets in the buffers.
+
+    Attributes:
+        time_column_name (str)
+        target_columns_names (list): List of target column names
+        timeseries_identifiers_names (list): Columns to identify multiple time series when data is in long format
+        external_features_columns_names (list): List of columns with dynamic real features over time
+        starts (list): Start date (pandas.Timestamp) of each timeseries
+        offsets (list): Position of the first time step of each timeseries in the buffers, followed by the total number of time steps
+        targets_buffers (dict): Array of target values (value) by target column name (key)
+        external_features_buffer (numpy.array): Array of external features of shape features x time steps. None without external features.
+        identifiers_values (list): Tuple of identifiers values of each timeseries. None in wide format.
+    """
+
+    def __init__(
+        self,
+        time_column_name,
+        target_columns_names,
+        timeseries_identifiers_names,
+        external_features_columns_names,
+        starts,
+        offsets,
+        targets_buffers,
+        external_features_buffer=None,
+        identifiers_values=None,
+    ):
+        self.time_column_name = time_column_name
+        self.target_columns_names = target_columns_names
+        self.timeseries_identifiers_names = timeseries_identifiers_names
+        self.external_features_columns_names = external_features_columns_names
+        self.starts = starts
+        self.offsets = offsets
+        self.targets_buffers = targets_buffers
+        self.external_features_buffer = external_features_buffer
+        self.identifiers_values = identifiers_values
+
+    @property
+    def timeseries_number(self):
+        return len(self.offsets) - 1
+
+    def create_multivariate_timeseries(self, timeseries_index, cut_length):
+        """Create a list of timeseries dictionaries for each target column.
+        All the dictionaries point at the same external features array.
+
+        Args:
+            timeseries_index (int): Index of the timeseries in the store.
+            cut_length (int): Remove the last cut_length time steps of the timeseries.
 
         Returns:
             List of timeseries dictionaries
         """
-        self._check_minimum_length(dataframe, cut_length)
-        multivariate_timeseries = []
-        for target_column_name in self.target_columns_names:
-            multivariate_timeseries.append(self._create_gluon_univariate_timeseries(dataframe, target_column_name, cut_length, identifiers_values))
-        return multivariate_timeseries
+        external_features = self._get_external_features(timeseries_index, cut_length)
+        return [
+            self.create_univariate_timeseries(timeseries_index, target_column_name, cut_length, external_features=external_features)
+            for target_column_name in self.target_columns_names
+        ]
 
-    def _create_gluon_univariate_timeseries(self, dataframe, target_column_name, cut_length, identifiers_values=None):
+    def create_univariate_timeseries(self, timeseries_index, target_column_name, cut_length, external_features=None):
         """Create a dictionary with keys to store information about the timeseries:
             - start (Pandas.Timestamp): start date of timeseries
             - target (numpy.array): array of target values
@@ -85,46 +247,214 @@ class GluonDataset:
             - feat_dynamic_real (numpy.array, optional): array of external features of shape features x values
             - feat_dynamic_real_columns_names (list, optional): list of external features column names
             - identifiers (dict, optional): dictionary of identifiers values (value) by identifiers column name (key)
+        Arrays are views of the buffers of the store.
 
         Args:
-            dataframe (DataFrame): Timeseries dataframe with one or multiple target columns
+            timeseries_index (int): Index of the timeseries in the store.
             target_column_name (str)
-            cut_length (int): Remove the last cut_length time steps of each timeseries.
-            identifiers_values (obj/tuple, optional): Values or tuple of values of the groupby. Defaults to None.
+            cut_length (int): Remove the last cut_length time steps of the timeseries.
+            external_features (numpy.array, optional): External features array to share with the other targets of the timeseries.
+                Defaults to None which means a new view of the external features buffer.
 
         Returns:
             Dictionary for one timeseries
         """
-        length = -cut_length if cut_length > 0 else None
+        start_offset = self.offsets[timeseries_index]
+        end_offset = self.offsets[timeseries_index + 1] - cut_length
         univariate_timeseries = {
-            TIMESERIES_KEYS.START: dataframe[self.time_column_name].iloc[0],
-            TIMESERIES_KEYS.TARGET: dataframe[target_column_name].iloc[:length].values,
+            TIMESERIES_KEYS.START: self.starts[timeseries_index],
+            TIMESERIES_KEYS.TARGET: self.targets_buffers[target_column_name][start_offset:end_offset],
             TIMESERIES_KEYS.TARGET_NAME: target_column_name,
             TIMESERIES_KEYS.TIME_COLUMN_NAME: self.time_column_name,
         }
         if self.external_features_columns_names:
-            univariate_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] = dataframe[self.external_features_columns_names].iloc[:length].values.T
+            if external_features is None:
+                external_features = self._get_external_features(timeseries_index, cut_length)
+            univariate_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] = external_features
             univariate_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES] = self.external_features_columns_names
-        if identifiers_values is not None:
-            if len(self.timeseries_identifiers_names) > 1:
-                identifiers_map = {self.timeseries_identifiers_names[i]: identifier_value for i, identifier_value in enumerate(identifiers_values)}
-            else:
-                identifiers_map = {self.timeseries_identifiers_names[0]: identifiers_values}
-            univariate_timeseries[TIMESERIES_KEYS.IDENTIFIERS] = identifiers_map
+        if self.identifiers_values is not None:
+            univariate_timeseries[TIMESERIES_KEYS.IDENTIFIERS] = dict(zip(self.timeseries_identifiers_names, self.identifiers_values[timeseries_index]))
         return univariate_timeseries
 
-    def _check_minimum_length(self, dataframe, cut_length):
-        """Check that the timeseries dataframe has enough values.
+    def get_metadata(self):
+        """Return a JSON serializable dictionary of all attributes except the buffers"""
+        return {
+            "time_column_name": self.time_column_name,
+            "target_columns_names": self.target_columns_names,
+            "timeseries_identifiers_names": self.timeseries_identifiers_names,
+            "external_features_columns_names": self.external_features_columns_names,
+            "starts": [start.isoformat() for start in self.starts],
+            "offsets": self.offsets,
+            "identifiers_values": self.identifiers_values,
+        }
 
-        Args:
-            dataframe (DataFrame): Timeseries dataframe with one or multiple target columns
-            cut_length (int): Numnber of time steps that will be removed from each timeseries.
+    @classmethod
+    def from_metadata(cls, metadata, targets_buffers, external_features_buffer=None):
+        """Create a ColumnarTimeseries from the dictionary of the get_metadata method and the buffers"""
+        identifiers_values = metadata["identifiers_values"]
+        return cls(
+            time_column_name=metadata["time_column_name"],
+            target_columns_names=metadata["target_columns_names"],
+            timeseries_identifiers_names=metadata["timeseries_identifiers_names"],
+            external_features_columns_names=metadata["external_features_columns_names"],
+            starts=[pd.Timestamp(start) for start in metadata["starts"]],
+            offsets=metadata["offsets"],
+            targets_buffers=targets_buffers,
+            external_features_buffer=external_features_buffer,
+            identifiers_values=[tuple(values) for values in identifiers_values] if identifiers_values is not None else None,
+        )
 
-        Raises:
-            ValueError: If the dataframe doesn't have enough values.
-        """
-        min_length = self.min_length
-        if cut_length:
-            min_length += cut_length
-        if len(dataframe.index) < min_length:
-            raise ValueError(f"Time series must have at least {min_length} values")
+    def _get_external_features(self, timeseries_index, cut_length):
+        if not self.external_features_columns_names:
+            return None
+        return self.external_features_buffer[:, self.offsets[timeseries_index] : self.offsets[timeseries_index + 1] - cut_length]
+
+
+class LazyTimeseriesList(Sequence):
+    """
+    Read-only sequence of the timeseries dictionaries of ColumnarTimeseries stores for a given cut length.
+    Dictionaries are created when accessed, in the same order as the create_list_datasets method of GluonDataset.
+
+    Attributes:
+        all_columnar_timeseries (list): List of ColumnarTimeseries
+        cut_length (int): Number of time steps removed from each timeseries
+    """
+
+    def __init__(self, all_columnar_timeseries, cut_length):
+        self.all_columnar_timeseries = all_columnar_timeseries
+        self.cut_length = cut_length
+        self._entries_ends = list(np.cumsum([self._count_entries(columnar_timeseries) for columnar_timeseries in all_columnar_timeseries], dtype=int))
+
+    def __len__(self):
+        return self._entries_ends[-1] if self._entries_ends else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Timeseries index out of range")
+        store_index = bisect_right(self._entries_ends, index)
+        columnar_timeseries = self.all_columnar_timeseries[store_index]
+        entry_index = index - (self._entries_ends[store_index - 1] if store_index > 0 else 0)
+        timeseries_index, target_index = divmod(entry_index, len(columnar_timeseries.target_columns_names))
+        return columnar_timeseries.create_univariate_timeseries(timeseries_index, columnar_timeseries.target_columns_names[target_index], self.cut_length)
+
+    def __iter__(self):
+        for columnar_timeseries in self.all_columnar_timeseries:
+            for timeseries_index in range(columnar_timeseries.timeseries_number):
+                yield from columnar_timeseries.create_multivariate_timeseries(timeseries_index, self.cut_length)
+
+    def _count_entries(self, columnar_timeseries):
+        return columnar_timeseries.timeseries_number * len(columnar_timeseries.target_columns_names)
+
+
+class LazyListDataset(ListDataset):
+    """
+    GluonTS ListDataset whose list_data is a LazyTimeseriesList instead of a list of dictionaries.
+    Timeseries dictionaries are created on demand each time the dataset is iterated (e.g. at each training epoch).
+    """
+
+    def __init__(self, list_data, freq, one_dim_target=True):
+        self.process = ProcessDataEntry(freq, one_dim_target)
+        self.list_data = list_data
+
+
+def save_lazy_list_dataset(lazy_list_dataset, directory, original_dtypes=None):
+    """Save a LazyListDataset in a directory as one .npy file per buffer and a JSON index of the other attributes.
+    Buffers are saved with their own dtype, so that the saved timeseries are identical to the trained ones,
+    or with the dtype they had before being compacted, so that the history written by the predict recipe has the original dtypes.
+
+    Args:
+        lazy_list_dataset (LazyListDataset): Dataset created with the create_lazy_list_datasets method of GluonDataset.
+        directory (str): Local directory, created if it doesn't exist.
+        original_dtypes (dict, optional): Original dtype (value) by column name (key) of the compacted columns,
+            as stored by TimeseriesPreparator.compact_dtypes. Defaults to None which means buffers are saved with their own dtype.
+
+    Returns:
+        List of the names of the files written in directory
+    """
+    original_dtypes = original_dtypes if original_dtypes is not None else {}
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    stores = []
+    for store_index, columnar_timeseries in enumerate(lazy_list_dataset.list_data.all_columnar_timeseries):
+        store = columnar_timeseries.get_metadata()
+        store["targets_filenames"] = {}
+        for target_index, target_column_name in enumerate(columnar_timeseries.target_columns_names):
+            filename = f"store_{store_index:04d}_target_{target_index:04d}.npy"
+            target_buffer = columnar_timeseries.targets_buffers[target_column_name]
+            np.save(os.path.join(directory, filename), target_buffer.astype(original_dtypes.get(target_column_name, target_buffer.dtype), copy=False))
+            store["targets_filenames"][target_column_name] = filename
+            filenames.append(filename)
+        store["external_features_filename"] = None
+        if columnar_timeseries.external_features_buffer is not None:
+            filename = f"store_{store_index:04d}_external_features.npy"
+            external_features_buffer = columnar_timeseries.external_features_buffer
+            external_features_dtype = get_external_features_original_dtype(
+                external_features_buffer.dtype, columnar_timeseries.external_features_columns_names, original_dtypes
+            )
+            np.save(os.path.join(directory, filename), external_features_buffer.astype(external_features_dtype, copy=False))
+            store["external_features_filename"] = filename
+            filenames.append(filename)
+        stores.append(store)
+    index = {
+        "format_version": COLUMNAR_DATASET_FORMAT_VERSION,
+        "frequency": lazy_list_dataset.process.trans[0].freq,
+        "cut_length": lazy_list_dataset.list_data.cut_length,
+        "stores": stores,
+    }
+    with open(os.path.join(directory, COLUMNAR_DATASET_INDEX_FILENAME), "w") as index_file:
+        json.dump(index, index_file, default=str)
+    return filenames + [COLUMNAR_DATASET_INDEX_FILENAME]
+
+
+def get_external_features_original_dtype(buffer_dtype, external_features_columns_names, original_dtypes):
+    """Return the dtype of the external features buffer created from the columns with their original dtypes.
+    The buffer has the common dtype of all columns, so the dtype of a column that was not compacted is only known through the buffer dtype.
+
+    Args:
+        buffer_dtype (numpy.dtype): Dtype of the external features buffer.
+        external_features_columns_names (list)
+        original_dtypes (dict): Original dtype (value) by column name (key) of the compacted columns.
+
+    Returns:
+        numpy.dtype
+    """
+    known_dtypes = [original_dtypes[column_name] for column_name in external_features_columns_names if column_name in original_dtypes]
+    if len(known_dtypes) == 0:
+        return buffer_dtype
+    if len(known_dtypes) < len(external_features_columns_names):
+        known_dtypes.append(buffer_dtype)
+    return np.result_type(*known_dtypes)
+
+
+def load_lazy_list_dataset(directory, mmap_mode="r"):
+    """Load a LazyListDataset saved with save_lazy_list_dataset.
+    Buffers are memory-mapped by default, so only the parts of the timeseries that are accessed are read from disk.
+
+    Args:
+        directory (str): Local directory containing the index and buffers files.
+        mmap_mode (str, optional): Memory-map mode of numpy.load. Defaults to read-only. None loads the buffers in memory.
+
+    Raises:
+        ValueError: If the index was written with a newer format.
+
+    Returns:
+        LazyListDataset
+    """
+    with open(os.path.join(directory, COLUMNAR_DATASET_INDEX_FILENAME)) as index_file:
+        index = json.load(index_file)
+    if index["format_version"] > COLUMNAR_DATASET_FORMAT_VERSION:
+        raise ValueError(f"Saved dataset format version {index['format_version']} is not supported, please upgrade the plugin")
+    all_columnar_timeseries = []
+    for store in index["stores"]:
+        targets_buffers = {
+            target_column_name: np.load(os.path.join(directory, filename), mmap_mode=mmap_mode) for target_column_name, filename in store["targets_filenames"].items()
+        }
+        external_features_buffer = None
+        if store["external_features_filename"] is not None:
+            external_features_buffer = np.load(os.path.join(directory, store["external_features_filename"]), mmap_mode=mmap_mode)
+        all_columnar_timeseries.append(ColumnarTimeseries.from_metadata(store, targets_buffers, external_features_buffer))
+    return LazyListDataset(LazyTimeseriesList(all_columnar_timeseries, index["cut_length"]), freq=index["frequency"])
@@ -1,13 +1,14 @@
 from constants import EVALUATION_METRICS_DESCRIPTIONS, METRICS_DATASET, TIMESERIES_KEYS, CUSTOMISABLE_FREQUENCIES_OFFSETS
 from gluonts.evaluation.backtest import make_evaluation_predictions
-from gluonts.evaluation import Evaluator
 from gluonts_forecasts.model_handler import ModelHandler
-from gluonts_forecasts.utils import concat_timeseries_per_identifiers, concat_all_timeseries, quantile_forecasts_series
+from gluonts_forecasts.evaluator import BatchEvaluator
+from gluonts_forecasts.utils import concat_timeseries_per_identifiers, concat_all_timeseries, reduce_forecasts_to_quantiles
 from time import perf_counter
 from pandas.tseries.frequencies import to_offset
 from safe_logger import SafeLogger
 import json
-import multiprocessing
+import numpy as np
+import pandas as pd
 
 
 logger = SafeLogger("Forecast plugin")
@@ -95,15 +96,17 @@ class Model(ModelHandler):
     def get_name(self):
         return self.model_name
 
-    def train(self, train_list_dataset, reinit=True):
-        """Train model on train_list_dataset and re-instanciate estimator if reinit=True"""
+    def train(self, train_list_dataset, reinit=True, evaluation_predictor=None):
+        """Train model on train_list_dataset and re-instanciate estimator if reinit=True.
+        Estimators with a retrain method (e.g. AutoARIMA) can start from the evaluation_predictor trained on the truncated timeseries.
+        """
         start = perf_counter()
         logger.info(f"Re-training {self.get_label()} model on entire dataset ...")
 
         if reinit:  # re-instanciate model to re-initialize model parameters
             self.estimator = ModelHandler.estimator(self, self.model_parameters, **self.estimator_kwargs)
 
-        self.predictor = self._train_estimator(train_list_dataset)
+        self.predictor = self._train_estimator(train_list_dataset, evaluation_predictor=evaluation_predictor)
 
         self.retraining_time = perf_counter() - start
         logger.info(f"Re-training {self.get_label()} model on entire dataset: Done in {self.retraining_time:.2f} seconds")
@@ -126,43 +129,59 @@ class Model(ModelHandler):
         start = perf_counter()
         evaluation_predictor = self._train_estimator(train_list_dataset)
 
-        agg_metrics, item_metrics, forecasts = self._make_evaluation_predictions(evaluation_predictor, test_list_dataset)
+        agg_metrics, item_metrics, median_forecasts = self._make_evaluation_predictions(evaluation_predictor, test_list_dataset, make_forecasts=make_forecasts)
         self.evaluation_time = perf_counter() - start
         logger.info(f"Evaluating {self.get_label()} model performance: Done in {self.evaluation_time:.2f} seconds")
 
         if retrain:
-            self.train(test_list_dataset)
+            self.train(test_list_dataset, evaluation_predictor=evaluation_predictor)
 
         metrics, identifiers_columns = self._format_metrics(agg_metrics, item_metrics, train_list_dataset)
 
         if make_forecasts:
-            median_forecasts_timeseries = self._compute_median_forecasts_timeseries(forecasts, train_list_dataset)
+            median_forecasts_timeseries = self._group_median_forecasts_timeseries(median_forecasts, train_list_dataset)
             multiple_df = concat_timeseries_per_identifiers(median_forecasts_timeseries)
             forecasts_df = concat_all_timeseries(multiple_df)
             return metrics, identifiers_columns, forecasts_df
 
         return metrics, identifiers_columns
 
-    def _make_evaluation_predictions(self, predictor, test_list_dataset):
-        """Evaluate predictor and generate sample forecasts.
+    def _make_evaluation_predictions(self, predictor, test_list_dataset, make_forecasts=False):
+        """Evaluate predictor on the last prediction_length values of each timeseries of test_list_dataset.
+        Sample forecasts are consumed by batches and reduced on the fly to the mean and quantiles needed by the BatchEvaluator,
+        which then computes the metrics of all timeseries at once.
 
         Args:
             predictor (gluonts.model.predictor.Predictor): Trained object used to make forecasts.
             test_list_dataset (gluonts.dataset.common.ListDataset): ListDataset created with the GluonDataset class.
+            make_forecasts (bool, optional): Whether to keep the median forecasts. Defaults to False.
 
         Returns:
             Dictionary of aggregated metrics over all timeseries.
             DataFrame of metrics for each timeseries (i.e., each target column).
-            List of gluonts.model.forecast.Forecast (objects storing the predicted distributions as samples).
+            List of median forecasts timeseries (empty if make_forecasts is False).
         """
+        evaluator = BatchEvaluator()
         try:
-            forecast_it, ts_it = make_evaluation_predictions(dataset=test_list_dataset, predictor=predictor, num_samples=100)
-            forecasts = list(forecast_it)
+            forecast_it, _ = make_evaluation_predictions(dataset=test_list_dataset, predictor=predictor, num_samples=100)
+            forecasts_arrays, forecasts_start_dates = reduce_forecasts_to_quantiles(forecast_it, evaluator.forecast_keys)
         except Exception as err:
             raise ModelPredictionError(f"GluonTS '{self.model_name}' model crashed when making predictions. Full error: {err}")
-        evaluator = Evaluator(num_workers=min(2, multiprocessing.cpu_count()))
-        agg_metrics, item_metrics = evaluator(ts_it, forecasts, num_series=len(test_list_dataset))
-        return agg_metrics, item_metrics, forecasts
+
+        prediction_length = predictor.prediction_length
+        targets, past_targets = [], []
+        for timeseries in test_list_dataset:
+            targets += [timeseries[TIMESERIES_KEYS.TARGET][-prediction_length:]]
+            past_targets += [timeseries[TIMESERIES_KEYS.TARGET][:-prediction_length]]
+        agg_metrics, item_metrics = evaluator.evaluate_batch(np.stack(targets), past_targets, np.stack(forecasts_arrays), freq=predictor.freq)
+
+        median_forecasts = []
+        if make_forecasts:
+            median_index = evaluator.forecast_keys.index(0.5)
+            for forecasts_array, start_date in zip(forecasts_arrays, forecasts_start_dates):
+                index = pd.date_range(start_date, periods=forecasts_array.shape[1], freq=self.custom_frequency)
+                median_forecasts += [pd.Series(index=index, data=forecasts_array[median_index])]
+        return agg_metrics, item_metrics, median_forecasts
 
     def _format_metrics(self, agg_metrics, item_metrics, train_list_dataset):
         """Append agg_metrics to item_metrics and add new columns: model_name, target_column, identifiers_columns
@@ -209,12 +228,14 @@ class Model(ModelHandler):
 
         return metrics, identifiers_columns
 
-    def _train_estimator(self, train_list_dataset):
+    def _train_estimator(self, train_list_dataset, evaluation_predictor=None):
         """Train a gluonTS estimator to get a predictor for models that can be trained
         or directly get the existing gluonTS predictor (e.g. for models that don't need training like trivial.identity)
 
         Args:
             train_list_dataset (gluonts.dataset.common.ListDataset): ListDataset created with the GluonDataset class.
+            evaluation_predictor (gluonts.model.predictor.Predictor, optional): Predictor trained during evaluation,
+                used by estimators with a retrain method. Defaults to None.
 
         Returns:
             gluonts.model.predictor.Predictor
@@ -228,7 +249,10 @@ class Model(ModelHandler):
             predictor = ModelHandler.predictor(self, **kwargs)
         else:
             try:
-                predictor = self.estimator.train(train_list_dataset)
+                if evaluation_predictor is not None and hasattr(self.estimator, "retrain"):
+                    predictor = self.estimator.retrain(train_list_dataset, evaluation_predictor)
+                else:
+                    predictor = self.estimator.train(train_list_dataset)
             except Exception as err:
                 raise ModelTrainingError(f"GluonTS '{self.model_name}' model crashed during training. Full error: {err}")
         return predictor
@@ -256,21 +280,19 @@ class Model(ModelHandler):
             model_params["mxnet.context"] = str(self.mxnet_context)
         return json.dumps(model_params)
 
-    def _compute_median_forecasts_timeseries(self, forecasts_list, train_list_dataset):
-        """Compute median forecasts timeseries for each Forecast of forecasts_list.
+    def _group_median_forecasts_timeseries(self, median_forecasts, train_list_dataset):
+        """Name each median forecasts timeseries of median_forecasts and group them by identifiers.
 
         Args:
-            forecasts_list (list): List of gluonts.model.forecast.Forecast (objects storing the predicted distributions as samples).
+            median_forecasts (list): List of median forecasts timeseries, in the order of train_list_dataset.
             train_list_dataset (gluonts.dataset.common.ListDataset): ListDataset created with the GluonDataset class.
 
         Returns:
             Dictionary of list of forecasts timeseries (value) by identifiers (key). Key is None if no identifiers.
         """
         median_forecasts_timeseries = {}
-        for i, sample_forecasts in enumerate(forecasts_list):
-            series = quantile_forecasts_series(sample_forecasts, 0.5, self.custom_frequency).rename(
-                f"{self.model_name}_{train_list_dataset.list_data[i][TIMESERIES_KEYS.TARGET_NAME]}"
-            )
+        for i, median_series in enumerate(median_forecasts):
+            series = median_series.rename(f"{self.model_name}_{train_list_dataset.list_data[i][TIMESERIES_KEYS.TARGET_NAME]}")
             if TIMESERIES_KEYS.IDENTIFIERS in train_list_dataset.list_data[i]:
                 timeseries_identifier_key = tuple(sorted(train_list_dataset.list_data[i][TIMESERIES_KEYS.IDENTIFIERS].items()))
             else:
@@ -1,12 +1,16 @@
 import pandas as pd
 import numpy as np
-from gluonts_forecasts.utils import concat_timeseries_per_identifiers, concat_all_timeseries, add_row_origin, quantile_forecasts_series
+import itertools
+from pandas.tseries.frequencies import to_offset
+from gluonts_forecasts.utils import reduce_forecasts_to_quantiles
 from constants import METRICS_DATASET, METRICS_COLUMNS_DESCRIPTIONS, TIMESERIES_KEYS, ROW_ORIGIN, CUSTOMISABLE_FREQUENCIES_OFFSETS
 from gluonts.model.forecast import QuantileForecast
 from safe_logger import SafeLogger
 
 logger = SafeLogger("Forecast plugin")
 
+FORECASTS_CHUNK_SIZE = 1000  # number of timeseries identifiers whose forecasts are yielded together by TrainedModel.iter_forecasts_dfs
+
 
 class TrainedModel:
     """
@@ -23,6 +27,7 @@ class TrainedModel:
         time_column_name (str): Time column name used in training
         identifiers_columns (list): List of timeseries identifiers column names used in training.
         forecasts_df (DataFrame): Dataframe with the different quantiles forecasts and the training data if include_history is True
+        forecasts_columns (list): Columns of the last assembled forecasts dataframe (without the session and model columns)
     """
 
     def __init__(self, predictor, gluon_dataset, prediction_length, quantiles, include_history, history_length_limit=None):
@@ -34,6 +39,7 @@ class TrainedModel:
         self.time_column_name = None
         self.identifiers_columns = None
         self.forecasts_df = None
+        self.forecasts_columns = []
         self.frequency = gluon_dataset.process.trans[0].freq
         self.history_length_limit = history_length_limit
         self._check()
@@ -41,167 +47,204 @@ class TrainedModel:
     def predict(self):
         """
         Use the gluon dataset of training to predict future values and
-        concat all forecasts timeseries of different identifiers and quantiles together
+        assemble the forecasts of all timeseries and quantiles (and the history if include_history) into the forecasts dataframe
         """
-        forecasts = self.predictor.predict(self.gluon_dataset)
-        forecasts_list = list(forecasts)
-
-        forecasts_timeseries = self._compute_forecasts_timeseries(forecasts_list)
-
-        multiple_df = concat_timeseries_per_identifiers(forecasts_timeseries)
+        timeseries_groups = self._get_timeseries_groups(self._load_timeseries_identifiers())
+        quantiles_arrays, forecasts_start_dates = self._predict_all_timeseries()
+        self.forecasts_df = self._assemble_timeseries_groups(timeseries_groups, quantiles_arrays, forecasts_start_dates)
 
-        self.forecasts_df = concat_all_timeseries(multiple_df)
+    def iter_forecasts_dfs(self, session=None, model_label=None, chunk_size=FORECASTS_CHUNK_SIZE):
+        """Predict future values of all timeseries, then yield the forecasts dataframe of each batch of timeseries identifiers,
+        so that only one batch of timeseries and forecasts dataframe is in memory at a time. Concatenated, the batches are equal to get_forecasts_df.
 
-        self.time_column_name = self.gluon_dataset.list_data[0][TIMESERIES_KEYS.TIME_COLUMN_NAME]
-        self.identifiers_columns = (
-            list(self.gluon_dataset.list_data[0][TIMESERIES_KEYS.IDENTIFIERS].keys()) if TIMESERIES_KEYS.IDENTIFIERS in self.gluon_dataset.list_data[0] else []
-        )
-
-        if self.include_history:
-            self.forecasts_df = self._include_history(self.frequency, history_length_limit=self.history_length_limit)
+        Args:
+            session (Timstamp, optional)
+            model_label (str, optional)
+            chunk_size (int, optional): Number of timeseries identifiers of each batch. Defaults to FORECASTS_CHUNK_SIZE.
 
-        self.forecasts_df = add_row_origin(self.forecasts_df, both=ROW_ORIGIN.FORECAST, left_only=ROW_ORIGIN.HISTORY)
+        Yields:
+            Forecasts DataFrame of a batch of timeseries identifiers
+        """
+        timeseries_groups = self._get_timeseries_groups(self._load_timeseries_identifiers())
+        quantiles_arrays, forecasts_start_dates = self._predict_all_timeseries()
+        for batch_start in range(0, len(timeseries_groups), chunk_size):
+            forecasts_df = self._assemble_timeseries_groups(timeseries_groups[batch_start : batch_start + chunk_size], quantiles_arrays, forecasts_start_dates)
+            yield self._add_session_and_model_label(forecasts_df, session, model_label)
 
-        self.forecasts_df = self.forecasts_df.rename(columns={"index": self.time_column_name})
+    def _load_timeseries_identifiers(self):
+        """Retrieve the identifiers values of each timeseries of the gluon dataset and the time and identifiers columns names.
+        Timeseries dictionaries are not kept, so that lazy datasets only create them again by batches when assembling the forecasts.
 
-    def _include_history(self, frequency, history_length_limit=None):
-        """Include the historical data on which the model was trained to the forecasts dataframe.
+        Returns:
+            List of the tuples of identifiers values (None if no identifiers) of each timeseries, in the gluon dataset order.
+        """
+        all_identifiers = []
+        for timeseries in self.gluon_dataset.list_data:
+            if self.time_column_name is None:
+                self.time_column_name = timeseries[TIMESERIES_KEYS.TIME_COLUMN_NAME]
+                self.identifiers_columns = list(timeseries[TIMESERIES_KEYS.IDENTIFIERS].keys()) if TIMESERIES_KEYS.IDENTIFIERS in timeseries else []
+            if self.identifiers_columns:
+                all_identifiers += [tuple(timeseries[TIMESERIES_KEYS.IDENTIFIERS][column] for column in self.identifiers_columns)]
+            else:
+                all_identifiers += [None]
+        return all_identifiers
 
-        Args:
-            frequency (str): Used to reconstruct the date range (because a gluon ListDataset only store the start date).
-            history_length_limit (int): Maximum number of values to retrieve from historical data per timeseries. Default to None which means all.
+    def _predict_all_timeseries(self):
+        """Predict future values of all timeseries of the gluon dataset, in the order of the dataset the predictor was trained on,
+        as some predictors (e.g. AutoARIMA, SeasonalTrend) select the trained model of each timeseries by its position.
+        Forecasts are reduced to their quantiles as they are predicted, so their samples are not all held in memory.
 
         Returns:
-            DataFrame containing both the historical data and the forecasted values.
+            List of arrays of shape (len(self.quantiles), forecast length) and list of forecasts start dates, in the gluon dataset order.
         """
-        history_timeseries = self._retrieve_history_timeseries(frequency, history_length_limit)
-        multiple_df = concat_timeseries_per_identifiers(history_timeseries)
-        history_df = concat_all_timeseries(multiple_df)
-        return history_df.merge(self.forecasts_df, on=["index"] + self.identifiers_columns, how="left", indicator=True)
+        forecasts = iter(self.predictor.predict(self.gluon_dataset))
+        first_forecast = next(forecasts, None)
+        if isinstance(first_forecast, QuantileForecast):
+            self.quantiles = self._round_to_existing_quantiles(first_forecast)
+        forecasts = itertools.chain([first_forecast], forecasts) if first_forecast is not None else forecasts
+        return reduce_forecasts_to_quantiles(forecasts, self.quantiles)
 
-    def _generate_history_target_series(self, timeseries, frequency, history_length_limit=None):
-        """Creates a pandas time series from the past target values with Nan values for the prediction_length future dates.
+    def _assemble_timeseries_groups(self, timeseries_groups, quantiles_arrays, forecasts_start_dates):
+        """Assemble the forecasts dataframe of some identifiers groups.
+        Only the timeseries of these groups are retrieved from the gluon dataset.
 
         Args:
-            timeseries (dict): Univariate timeseries dictionary created with the GluonDataset class.
-            frequency (str): Used in pandas.date_range.
-            history_length_limit (int): Maximum number of values to retrieve from historical data per timeseries. Default to None which means all.
+            timeseries_groups (list): Identifiers and positions of their timeseries in the gluon dataset, in the output order.
+            quantiles_arrays (list): Quantiles array of each timeseries of the gluon dataset, from the _predict_all_timeseries method.
+            forecasts_start_dates (list): Forecasts start date of each timeseries of the gluon dataset.
 
         Returns:
-            Series with DatetimeIndex.
+            Forecasts DataFrame sorted by ascending identifiers and descending dates.
         """
-        target_series = pd.Series(
-            np.append(timeseries[TIMESERIES_KEYS.TARGET], np.repeat(np.nan, self.prediction_length)),
-            name=timeseries[TIMESERIES_KEYS.TARGET_NAME],
-            index=pd.date_range(
-                start=timeseries[TIMESERIES_KEYS.START],
-                periods=len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length,
-                freq=frequency,
-            ),
-        )
-        if history_length_limit:
-            target_series = target_series.iloc[-(history_length_limit + self.prediction_length) :]
-        return target_series
-
-    def _generate_history_external_features_dataframe(self, timeseries, frequency, history_length_limit=None):
-        """Creates a pandas time series from the past and future external features values.
+        batch_timeseries, batch_timeseries_groups, batch_quantiles_arrays, batch_forecasts_start_dates = [], [], [], []
+        for timeseries_identifiers, timeseries_positions in timeseries_groups:
+            batch_timeseries_groups += [(timeseries_identifiers, list(range(len(batch_timeseries), len(batch_timeseries) + len(timeseries_positions))))]
+            batch_timeseries += [self.gluon_dataset.list_data[i] for i in timeseries_positions]
+            batch_quantiles_arrays += [quantiles_arrays[i] for i in timeseries_positions]
+            batch_forecasts_start_dates += [forecasts_start_dates[i] for i in timeseries_positions]
+        return self._assemble_forecasts_df(batch_timeseries_groups, batch_timeseries, batch_forecasts_start_dates, batch_quantiles_arrays)
+
+    def _get_timeseries_groups(self, all_identifiers):
+        """Group the timeseries positions by identifiers, in the output order (ascending identifiers).
 
         Args:
-            timeseries (dict): Univariate timeseries dictionary created with the GluonDataset class.
-            frequency (str): Used in pandas.date_range.
-            history_length_limit (int): Maximum number of values to retrieve from historical data per timeseries. Default to None which means all.
+            all_identifiers (list): Tuple of identifiers values (None if no identifiers) of each timeseries of the gluon dataset.
 
         Returns:
-            DataFrame with DatetimeIndex.
+            List of tuples of the identifiers values (None if no identifiers) and the list of positions of their timeseries
         """
-        external_features_df = pd.DataFrame(
-            timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL].T[: len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length],
-            columns=timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES],
-            index=pd.date_range(
-                start=timeseries[TIMESERIES_KEYS.START],
-                periods=len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length,
-                freq=frequency,
-            ),
-        )
-        if history_length_limit:
-            external_features_df = external_features_df.iloc[-(history_length_limit + self.prediction_length) :]
-        return external_features_df
-
-    def _retrieve_history_timeseries(self, frequency, history_length_limit=None):
-        """Reconstruct the history timeseries from the gluon_dataset object and fill the dates to predict with Nan values.
+        timeseries_positions_by_identifiers = {}
+        for i, timeseries_identifiers in enumerate(all_identifiers):
+            timeseries_positions_by_identifiers.setdefault(timeseries_identifiers, []).append(i)
+
+        groups_identifiers = list(timeseries_positions_by_identifiers.keys())
+        if self.identifiers_columns:
+            identifiers_df = pd.DataFrame(groups_identifiers, columns=self.identifiers_columns)
+            groups_identifiers = [groups_identifiers[i] for i in identifiers_df.sort_values(by=self.identifiers_columns).index]
+        return [(timeseries_identifiers, timeseries_positions_by_identifiers[timeseries_identifiers]) for timeseries_identifiers in groups_identifiers]
+
+    def _assemble_forecasts_df(self, timeseries_groups, all_timeseries, forecasts_start_dates, quantiles_arrays):
+        """Build the forecasts dataframe by filling preallocated columns positionally.
+        Each group of timeseries with the same identifiers spans a contiguous block of rows sorted by descending dates:
+        first the prediction_length forecasted dates, then the history (if include_history).
+        Timeseries of the same identifiers share the same dates, as created by the GluonDataset class.
 
         Args:
-            frequency (str)
-            history_length_limit (int): Maximum number of values to retrieve from historical data per timeseries. Default to None which means all.
+            timeseries_groups (list): Identifiers and positions of their timeseries, in the output order.
+            all_timeseries (list): List of univariate timeseries dictionaries created with the GluonDataset class.
+            forecasts_start_dates (list): Forecasts start date of each timeseries.
+            quantiles_arrays (list): Array of shape (len(self.quantiles), forecast length) of each timeseries.
 
         Returns:
-            Dictionary of list of timeseries by identifiers (None if no identifiers)
+            Forecasts DataFrame sorted by ascending identifiers and descending dates.
         """
-        history_timeseries = {}
-        for i, timeseries in enumerate(self.gluon_dataset.list_data):
-            if TIMESERIES_KEYS.IDENTIFIERS in timeseries:
-                timeseries_identifier_key = tuple(sorted(timeseries[TIMESERIES_KEYS.IDENTIFIERS].items()))
-            else:
-                timeseries_identifier_key = None
-
-            target_series = self._generate_history_target_series(timeseries, frequency, history_length_limit)
-
-            if TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES in timeseries:
-                assert timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL].shape[1] >= len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length
-                if timeseries_identifier_key not in history_timeseries:
-                    external_features_df = self._generate_history_external_features_dataframe(timeseries, frequency, history_length_limit)
-                    history_timeseries[timeseries_identifier_key] = [external_features_df]
-
-            if timeseries_identifier_key in history_timeseries:
-                history_timeseries[timeseries_identifier_key] += [target_series]
+        forecasts_labels_prefixes = []
+        for quantile in self.quantiles:
+            forecasts_label_prefix = "forecast"
+            if quantile < 0.5:
+                forecasts_label_prefix += "_lower"
+            elif quantile > 0.5:
+                forecasts_label_prefix += "_upper"
+            forecasts_labels_prefixes += [forecasts_label_prefix]
+
+        groups_layouts = []
+        for _, timeseries_positions in timeseries_groups:
+            timeseries = all_timeseries[timeseries_positions[0]]
+            if self.include_history:
+                history_start, start_date = self._get_history_start(timeseries, self.frequency, self.history_length_limit)
+                history_length = len(timeseries[TIMESERIES_KEYS.TARGET]) - history_start
             else:
-                history_timeseries[timeseries_identifier_key] = [target_series]
-        return history_timeseries
-
-    def _compute_forecasts_timeseries(self, forecasts_list):
-        """Compute all forecasts timeseries for each quantile.
+                history_start, start_date, history_length = None, forecasts_start_dates[timeseries_positions[0]], 0
+            groups_layouts += [(history_start, start_date, history_length)]
+        groups_lengths = [history_length + self.prediction_length for _, _, history_length in groups_layouts]
+        groups_ends = np.cumsum(groups_lengths)
+        rows_count = int(groups_ends[-1]) if len(groups_ends) > 0 else 0
+
+        time_column = np.empty(rows_count, dtype="datetime64[ns]")
+        row_origin_column = np.full(rows_count, ROW_ORIGIN.FORECAST if not self.include_history else ROW_ORIGIN.HISTORY, dtype=object)
+        external_features_columns, target_columns, forecasts_columns = {}, {}, {}
+        for (_, timeseries_positions), (history_start, start_date, history_length), group_end in zip(timeseries_groups, groups_layouts, groups_ends):
+            group_start = group_end - history_length - self.prediction_length
+            forecasts_end = group_start + self.prediction_length
+            time_column[group_start:group_end] = pd.date_range(start=start_date, periods=group_end - group_start, freq=self.frequency).values[::-1]
+            row_origin_column[group_start:forecasts_end] = ROW_ORIGIN.FORECAST
+
+            for i in timeseries_positions:
+                timeseries = all_timeseries[i]
+                if self.include_history:
+                    if TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES in timeseries:
+                        external_features = timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]
+                        assert external_features.shape[1] >= len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length
+                        if i == timeseries_positions[0]:
+                            history_end = len(timeseries[TIMESERIES_KEYS.TARGET]) + self.prediction_length
+                            for feature_index, column in enumerate(timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES]):
+                                if column not in external_features_columns:
+                                    external_features_columns[column] = np.empty(rows_count, dtype=external_features.dtype)
+                                external_features_columns[column][group_start:group_end] = external_features[feature_index, history_start:history_end][::-1]
+
+                    target_name = timeseries[TIMESERIES_KEYS.TARGET_NAME]
+                    if target_name not in target_columns:
+                        target_columns[target_name] = np.full(rows_count, np.nan)
+                    target_columns[target_name][forecasts_end:group_end] = timeseries[TIMESERIES_KEYS.TARGET][history_start:][::-1]
+
+                for forecasts_label_prefix, forecasts_quantile in zip(forecasts_labels_prefixes, quantiles_arrays[i]):
+                    column = f"{forecasts_label_prefix}_{timeseries[TIMESERIES_KEYS.TARGET_NAME]}"
+                    if column not in forecasts_columns:
+                        forecasts_columns[column] = np.full(rows_count, np.nan, dtype=np.result_type(forecasts_quantile.dtype, np.float32))
+                    forecasts_columns[column][group_start:forecasts_end] = forecasts_quantile[: self.prediction_length][::-1]
+
+        columns = {self.time_column_name: time_column}
+        for identifier_index, identifier_column in enumerate(self.identifiers_columns):
+            identifiers_values = np.empty(len(timeseries_groups), dtype=object)
+            identifiers_values[:] = [timeseries_identifiers[identifier_index] for timeseries_identifiers, _ in timeseries_groups]
+            columns[identifier_column] = pd.Series(np.repeat(identifiers_values, groups_lengths)).infer_objects()
+        columns.update(external_features_columns)
+        columns.update(target_columns)
+        columns.update(forecasts_columns)
+        columns[ROW_ORIGIN.COLUMN_NAME] = row_origin_column
+        self.forecasts_columns = list(columns.keys())
+        return pd.DataFrame(columns)
+
+    def _get_history_start(self, timeseries, frequency, history_length_limit=None):
+        """Compute the position and date of the first historical value to retrieve, so that only the last values
+        of (possibly memory-mapped) timeseries arrays are read.
 
         Args:
-            forecasts_list (list): List of gluonts.model.forecast.Forecast (objects storing the predicted distributions as samples).
+            timeseries (dict): Univariate timeseries dictionary created with the GluonDataset class.
+            frequency (str)
+            history_length_limit (int): Maximum number of values to retrieve from historical data per timeseries. Default to None which means all.
 
         Returns:
-            Dictionary of list of forecasts timeseries by identifiers (None if no identifiers)
+            Tuple of the position (int) and the date (pandas.Timestamp) of the first historical value
         """
-        forecasts_timeseries = {}
-        for i, sample_forecasts in enumerate(forecasts_list):
-            if TIMESERIES_KEYS.IDENTIFIERS in self.gluon_dataset.list_data[i]:
-                timeseries_identifier_key = tuple(sorted(self.gluon_dataset.list_data[i][TIMESERIES_KEYS.IDENTIFIERS].items()))
-            else:
-                timeseries_identifier_key = None
-
-            if i == 0 and isinstance(sample_forecasts, QuantileForecast):
-                self.quantiles = self._round_to_existing_quantiles(sample_forecasts)
-
-            for quantile in self.quantiles:
-                forecasts_label_prefix = "forecast"
-                if quantile < 0.5:
-                    forecasts_label_prefix += "_lower"
-                elif quantile > 0.5:
-                    forecasts_label_prefix += "_upper"
-
-                forecasts_series = (
-                    quantile_forecasts_series(sample_forecasts, quantile, self.frequency)
-                    .rename(f"{forecasts_label_prefix}_{self.gluon_dataset.list_data[i][TIMESERIES_KEYS.TARGET_NAME]}")
-                    .iloc[: self.prediction_length]
-                )
-                if timeseries_identifier_key in forecasts_timeseries:
-                    forecasts_timeseries[timeseries_identifier_key] += [forecasts_series]
-                else:
-                    forecasts_timeseries[timeseries_identifier_key] = [forecasts_series]
-        return forecasts_timeseries
-
-    def _reorder_forecasts_df(self):
-        """ Reorder columns with timeseries identifiers columns right after time column """
-        forecasts_columns = [column for column in self.forecasts_df if column not in [self.time_column_name] + self.identifiers_columns]
-        self.forecasts_df = self.forecasts_df[[self.time_column_name] + self.identifiers_columns + forecasts_columns]
+        timeseries_length = len(timeseries[TIMESERIES_KEYS.TARGET])
+        if not history_length_limit or history_length_limit >= timeseries_length:
+            return 0, timeseries[TIMESERIES_KEYS.START]
+        history_start = timeseries_length - history_length_limit
+        return history_start, pd.Timestamp(timeseries[TIMESERIES_KEYS.START]) + history_start * to_offset(frequency)
 
     def get_forecasts_df(self, session=None, model_label=None):
-        """Add the session timestamp and model label to the forecasts dataframe. Sort timeseries in revert order to display predictions on top.
+        """Add the session timestamp and model label to the forecasts dataframe, whose timeseries are already in revert order to display predictions on top.
 
         Args:
             session (Timstamp, optional)
@@ -210,24 +253,21 @@ class TrainedModel:
         Returns:
             Forecasts DaaFrame
         """
-        if TIMESERIES_KEYS.IDENTIFIERS in self.gluon_dataset.list_data[0]:
-            self._reorder_forecasts_df()
+        self.forecasts_df = self._add_session_and_model_label(self.forecasts_df, session, model_label)
+        return self.forecasts_df
+
+    def _add_session_and_model_label(self, forecasts_df, session=None, model_label=None):
         if session:
-            self.forecasts_df[METRICS_DATASET.SESSION] = session
+            forecasts_df[METRICS_DATASET.SESSION] = session
         if model_label:
-            self.forecasts_df[METRICS_DATASET.MODEL_COLUMN] = model_label
-
-        self.forecasts_df = self.forecasts_df.sort_values(
-            by=self.identifiers_columns + [self.time_column_name], ascending=[True] * len(self.identifiers_columns) + [False]
-        )
-
-        return self.forecasts_df
+            forecasts_df[METRICS_DATASET.MODEL_COLUMN] = model_label
+        return forecasts_df
 
     def create_forecasts_column_description(self):
         """ Explain the meaning of the forecasts columns """
         column_descriptions = METRICS_COLUMNS_DESCRIPTIONS
         confidence_interval = self._retrieve_confidence_interval()
-        for column in self.forecasts_df.columns:
+        for column in self.forecasts_columns:
             if "forecast_lower_" in column:
                 column_descriptions[column] = f"Lower bound of the {confidence_interval}% forecasts confidence interval."
             elif "forecast_upper_" in column:
@@ -1,6 +1,10 @@
 import pandas as pd
 import os
 import math
+import multiprocessing
+import dill
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
 from pandas.api.types import is_numeric_dtype, is_string_dtype
 from gluonts_forecasts.model import Model
 from constants import METRICS_DATASET, METRICS_COLUMNS_DESCRIPTIONS, TIMESERIES_KEYS, EVALUATION_METRICS_DESCRIPTIONS, ROW_ORIGIN
@@ -12,6 +16,9 @@ from safe_logger import SafeLogger
 
 logger = SafeLogger("Forecast plugin")
 
+# Training session shared with the forked worker processes of TrainingSession._train_evaluate_models
+_forked_training_session = None
+
 
 class TrainingSession:
     """
@@ -24,7 +31,8 @@ class TrainingSession:
         epoch (int): Number of epochs used by the GluonTS Trainer class
         models_parameters (dict): Dictionary of model names (key) and their parameters (value)
         prediction_length (int): Number of time steps to predict
-        training_df (DataFrame): Training dataframe
+        training_df (DataFrame or sequence of DataFrame): Training dataframe, or dataframes (e.g. prepared shards) each holding
+            all the rows of their timeseries
         make_forecasts (bool): True to output the evaluation predictions of the last prediction_length time steps
         external_features_columns_names (list): List of columns with dynamic real features over time
         timeseries_identifiers_names (list): Columns to identify multiple time series when data is in long format
@@ -33,6 +41,7 @@ class TrainingSession:
         num_batches_per_epoch (int): Number of batches per epoch
         season_length (int): Length of the seasonality parameter.
         mxnet_context (mxnet.context.Context): MXNet context to use for Deep Learning models training.
+        n_workers (int): Number of processes training models in parallel. 1 means sequential training.
     """
 
     def __init__(
@@ -51,6 +60,7 @@ class TrainingSession:
         user_num_batches_per_epoch=None,
         season_length=None,
         mxnet_context=None,
+        n_workers=1,
     ):
         self.models_parameters = models_parameters
         self.models = []
@@ -78,6 +88,7 @@ class TrainingSession:
         self.num_batches_per_epoch = None
         self.season_length = season_length
         self.mxnet_context = mxnet_context
+        self.n_workers = n_workers
 
     def init(self, session_name, partition_root=None):
         """Create the session_path. Check types of target, external features and timeseries identifiers columns.
@@ -92,12 +103,14 @@ class TrainingSession:
         else:
             self.session_path = os.path.join(partition_root, session_name)
 
-        self._check_target_columns_types()
-        self._check_external_features_columns_types()
+        for training_df in self._iter_training_dataframes():
+            self._check_target_columns_types(training_df)
+            self._check_external_features_columns_types(training_df)
 
     def create_gluon_datasets(self):
         """Create train and test gluon list datasets.
         The last prediction_length time steps are removed from each timeseries of the train dataset.
+        Both datasets are lazy: they share the same columnar buffers and create their timeseries dictionaries on demand.
         Compute optimal num_batches_per_epoch value based on the train dataset size._check_target_columns_types
         """
 
@@ -111,7 +124,7 @@ class TrainingSession:
             min_length=2 * self.prediction_length,  # Assuming that context_length = prediction_length
         )
 
-        gluon_list_datasets = gluon_dataset.create_list_datasets(cut_lengths=[self.prediction_length, 0])
+        gluon_list_datasets = gluon_dataset.create_lazy_list_datasets(cut_lengths=[self.prediction_length, 0])
         self.evaluation_train_list_dataset = gluon_list_datasets[0]
         self.full_list_dataset = gluon_list_datasets[1]
 
@@ -149,8 +162,7 @@ class TrainingSession:
     def _train_evaluate(self, retrain):
         """Evaluate all the selected models (then retrain on complete data if specified) and get the metrics dataframe. """
         metrics_df = pd.DataFrame()
-        for model in self.models:
-            item_metrics = model.train_evaluate(self.evaluation_train_list_dataset, self.full_list_dataset, retrain=retrain)[0]
+        for item_metrics, identifiers_columns in self._train_evaluate_models(make_forecasts=False, retrain=retrain):
             metrics_df = metrics_df.append(item_metrics)
         metrics_df[METRICS_DATASET.SESSION] = self.session_name
         self.metrics_df = self._reorder_metrics_df(metrics_df)
@@ -158,10 +170,7 @@ class TrainingSession:
     def _train_evaluate_make_forecast(self, retrain):
         """Evaluate all the selected models (then retrain on complete data if specified), get the metrics dataframe and create the forecasts dataframe. """
         metrics_df = pd.DataFrame()
-        for model in self.models:
-            (item_metrics, identifiers_columns, forecasts_df) = model.train_evaluate(
-                self.evaluation_train_list_dataset, self.full_list_dataset, make_forecasts=True, retrain=retrain
-            )
+        for (item_metrics, identifiers_columns, forecasts_df) in self._train_evaluate_models(make_forecasts=True, retrain=retrain):
             forecasts_df = forecasts_df.rename(columns={"index": self.time_column_name})
             if self.forecasts_df.empty:
                 self.forecasts_df = forecasts_df
@@ -171,7 +180,11 @@ class TrainingSession:
         metrics_df[METRICS_DATASET.SESSION] = self.session_name
         self.metrics_df = self._reorder_metrics_df(metrics_df)
 
-        self.evaluation_forecasts_df = self.training_df.merge(self.forecasts_df, on=[self.time_column_name] + identifiers_columns, how="left", indicator=True)
+        evaluation_forecasts_dfs = [
+            training_df.merge(self.forecasts_df, on=[self.time_column_name] + identifiers_columns, how="left", indicator=True)
+            for training_df in self._iter_training_dataframes()
+        ]
+        self.evaluation_forecasts_df = evaluation_forecasts_dfs[0] if len(evaluation_forecasts_dfs) == 1 else pd.concat(evaluation_forecasts_dfs, ignore_index=True)
 
         self.evaluation_forecasts_df = add_row_origin(self.evaluation_forecasts_df, both=ROW_ORIGIN.EVALUATION, left_only=ROW_ORIGIN.TRAIN)
 
@@ -181,6 +194,53 @@ class TrainingSession:
         )
         self.evaluation_forecasts_df[METRICS_DATASET.SESSION] = self.session_name
 
+    def _train_evaluate_models(self, make_forecasts, retrain):
+        """Train and evaluate all the models, in separate processes if n_workers is higher than 1.
+        Worker processes are forked so that they share the gluon datasets without copying them.
+
+        Args:
+            make_forecasts (bool): Whether to make the evaluation forecasts.
+            retrain (bool): Whether to retrain models on the full dataset after the evaluation.
+
+        Returns:
+            List of the results of Model.train_evaluate, in the order of self.models
+        """
+        n_workers = min(self.n_workers, len(self.models))
+        if n_workers <= 1:
+            return [
+                model.train_evaluate(self.evaluation_train_list_dataset, self.full_list_dataset, make_forecasts=make_forecasts, retrain=retrain)
+                for model in self.models
+            ]
+        if multiprocessing.get_start_method() != "fork" or (self.mxnet_context is not None and self.mxnet_context.device_type == "gpu"):
+            logger.warning("Models can only be trained in parallel on CPU with forked processes, training them sequentially")
+            self.n_workers = 1
+            return self._train_evaluate_models(make_forecasts, retrain)
+
+        global _forked_training_session
+        _forked_training_session = self
+        threads_per_worker = max(1, multiprocessing.cpu_count() // n_workers)
+        logger.info(f"Training {len(self.models)} models in {n_workers} processes of {threads_per_worker} threads")
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                models_indices = range(len(self.models))
+                serialized_results = list(
+                    executor.map(
+                        train_evaluate_forked_model,
+                        models_indices,
+                        [make_forecasts] * len(self.models),
+                        [retrain] * len(self.models),
+                        [threads_per_worker] * len(self.models),
+                    )
+                )
+        finally:
+            _forked_training_session = None
+
+        results = []
+        for model, serialized_result in zip(self.models, serialized_results):
+            model.predictor, model.evaluation_time, model.retraining_time, result = dill.loads(serialized_result)
+            results.append(result)
+        return results
+
     def _reorder_metrics_df(self, metrics_df):
         """Sort rows by target column and put aggregated rows on top.
 
@@ -249,16 +309,23 @@ class TrainingSession:
             column_descriptions[column.lower()] = EVALUATION_METRICS_DESCRIPTIONS[column]
         return column_descriptions
 
-    def _check_target_columns_types(self):
+    def _iter_training_dataframes(self):
+        """Yield the training dataframe, or each dataframe if the timeseries are split across multiple dataframes"""
+        if isinstance(self.training_df, pd.DataFrame):
+            yield self.training_df
+        else:
+            yield from self.training_df
+
+    def _check_target_columns_types(self, training_df):
         """ Raises ValueError if a target column is not numerical """
         for column_name in self.target_columns_names:
-            if not is_numeric_dtype(self.training_df[column_name]):
+            if not is_numeric_dtype(training_df[column_name]):
                 raise ValueError(f"Target column '{column_name}' must be of numeric type")
 
-    def _check_external_features_columns_types(self):
+    def _check_external_features_columns_types(self, training_df):
         """ Raises ValueError if an external feature column is not numerical """
         for column_name in self.external_features_columns_names:
-            if not is_numeric_dtype(self.training_df[column_name]):
+            if not is_numeric_dtype(training_df[column_name]):
                 raise ValueError(f"External feature '{column_name}' must be of numeric type")
 
     def _compute_optimal_num_batches_per_epoch(self):
@@ -273,3 +340,24 @@ class TrainingSession:
         optimal_num_batches_per_epoch = max(math.ceil(num_samples_total / self.batch_size), 50)
         logger.info(f"Number of batches per epoch automatically scaled to training data size: {optimal_num_batches_per_epoch}")
         return optimal_num_batches_per_epoch
+
+
+def train_evaluate_forked_model(model_index, make_forecasts, retrain, threads_per_worker):
+    """Train and evaluate a model of the training session inherited from the parent process, with a limited number of BLAS/OpenMP threads.
+
+    Args:
+        model_index (int): Index of the model in the models of the training session.
+        make_forecasts (bool): Whether to make the evaluation forecasts.
+        retrain (bool): Whether to retrain the model on the full dataset after the evaluation.
+        threads_per_worker (int): Maximum number of threads of the BLAS and OpenMP thread pools.
+
+    Returns:
+        Predictor, evaluation time, retraining time and results of Model.train_evaluate, serialized with dill
+    """
+    training_session = _forked_training_session
+    model = training_session.models[model_index]
+    with threadpool_limits(limits=threads_per_worker):
+        result = model.train_evaluate(
+            training_session.evaluation_train_list_dataset, training_session.full_list_dataset, make_forecasts=make_forecasts, retrain=retrain
+        )
+    return dill.dumps((model.predictor, model.evaluation_time, model.retraining_time, result))
@@ -4,8 +4,13 @@ from pandas.tseries.frequencies import to_offset
 import numpy as np
 from functools import reduce
 import copy
+import itertools
 from constants import TIMESERIES_KEYS, ROW_ORIGIN, CUSTOMISABLE_FREQUENCIES_OFFSETS, GPU_CONFIGURATION
 from timeseries_preparation.preparation import TimeseriesPreparator
+from gluonts.model.forecast import SampleForecast
+
+QUANTILES_BATCH_SIZE = 10000
+MEAN_FORECAST_KEY = "mean"
 
 
 def apply_filter_conditions(df, conditions):
@@ -29,6 +34,8 @@ def apply_filter_conditions(df, conditions):
 def add_future_external_features(gluon_train_dataset, external_features_future_df, prediction_length, frequency):
     """Append the future external features to the 'feat_dynamic_real' arrays of each timeseries of the ListDataset used for training.
     First check that all timeseries are valid (regular time steps of the chosen frequency and they all have the same start date).
+    Timeseries of the same identifiers share their 'feat_dynamic_real' array, which is only extended once.
+    Other fields of the returned ListDataset are not copied.
 
     Args:
         gluon_train_dataset (gluonts.dataset.common.ListDataset): ListDataset created with the GluonDataset class.
@@ -42,12 +49,19 @@ def add_future_external_features(gluon_train_dataset, external_features_future_d
     Returns:
         gluonts.dataset.common.ListDataset with future external features.
     """
-    gluon_dataset = copy.deepcopy(gluon_train_dataset)
+    gluon_dataset = copy.copy(gluon_train_dataset)
+    gluon_dataset.list_data = [timeseries.copy() for timeseries in gluon_train_dataset.list_data]
     if isinstance(to_offset(frequency), CUSTOMISABLE_FREQUENCIES_OFFSETS):
         frequency = gluon_train_dataset.process.trans[0].freq
 
-    start_date, periods = None, None
-    for i, timeseries in enumerate(gluon_train_dataset):
+    feat_dynamic_real_appended_by_identifiers = {}
+    for timeseries in gluon_dataset.list_data:
+        feat_dynamic_real_train = timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]
+        timeseries_identifier_key = tuple(sorted(timeseries[TIMESERIES_KEYS.IDENTIFIERS].items())) if TIMESERIES_KEYS.IDENTIFIERS in timeseries else None
+        if timeseries_identifier_key in feat_dynamic_real_appended_by_identifiers:
+            timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] = feat_dynamic_real_appended_by_identifiers[timeseries_identifier_key]
+            continue
+
         if TIMESERIES_KEYS.IDENTIFIERS in timeseries:
             # filter the dataframe to only get rows with the right identifiers
             timeseries_identifiers = timeseries[TIMESERIES_KEYS.IDENTIFIERS]
@@ -56,7 +70,6 @@ def add_future_external_features(gluon_train_dataset, external_features_future_d
         else:
             timeseries_external_features_future_df = external_features_future_df
 
-        feat_dynamic_real_train = timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]
         feat_dynamic_real_columns_names = timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES]
         time_column_name = timeseries[TIMESERIES_KEYS.TIME_COLUMN_NAME]
 
@@ -73,7 +86,8 @@ def add_future_external_features(gluon_train_dataset, external_features_future_d
 
         feat_dynamic_real_appended = np.append(feat_dynamic_real_train, feat_dynamic_real_future, axis=1)
 
-        gluon_dataset.list_data[i][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] = feat_dynamic_real_appended
+        timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] = feat_dynamic_real_appended
+        feat_dynamic_real_appended_by_identifiers[timeseries_identifier_key] = feat_dynamic_real_appended
 
     return gluon_dataset
 
@@ -110,20 +124,75 @@ def concat_all_timeseries(multiple_df):
 
 
 def add_row_origin(df, both, left_only):
-    """Add an extra column that tells if the row is a forecast or historical data and return the new dataframe"""
-    df_copy = df.copy()
-    if "_merge" in df_copy:
-        df_copy["_merge"] = df_copy["_merge"].replace({"both": both, "left_only": left_only})
-        df_copy = df_copy.rename(columns={"_merge": ROW_ORIGIN.COLUMN_NAME})
+    """Add an extra column that tells if the row is a forecast or historical data.
+    The column is added in place as df is always a freshly merged dataframe, to avoid copying it.
+    """
+    if "_merge" in df:
+        df["_merge"] = df["_merge"].replace({"both": both, "left_only": left_only})
+        df.rename(columns={"_merge": ROW_ORIGIN.COLUMN_NAME}, inplace=True)
     else:
-        df_copy[ROW_ORIGIN.COLUMN_NAME] = both
-    return df_copy
+        df[ROW_ORIGIN.COLUMN_NAME] = both
+    return df
+
+
+def quantile_forecasts_arrays(forecasts_list, quantiles, batch_size=QUANTILES_BATCH_SIZE):
+    """Compute the quantiles of all forecasts. Sample forecasts with the same samples shape are stacked by batches
+    into a 3-D array so that each batch is sorted at once, instead of computing each quantile of each forecast one by one.
+    Quantiles are taken with the same rounded sample index as gluonts.model.forecast.SampleForecast.quantile.
+
+    Args:
+        forecasts_list (list): List of gluonts.model.forecast.Forecast.
+        quantiles (list): List of quantiles to compute. MEAN_FORECAST_KEY can be used to compute the forecasts mean instead of a quantile.
+        batch_size (int, optional): Maximum number of forecasts stacked together. Defaults to QUANTILES_BATCH_SIZE.
+
+    Returns:
+        List of arrays of shape (len(quantiles), forecast length), in the same order as forecasts_list.
+    """
+    quantiles_arrays = [None] * len(forecasts_list)
+    sample_forecasts_indices_by_shape = {}
+    for i, forecast in enumerate(forecasts_list):
+        if isinstance(forecast, SampleForecast) and forecast.samples.ndim == 2:
+            sample_forecasts_indices_by_shape.setdefault(forecast.samples.shape, []).append(i)
+        else:
+            quantiles_arrays[i] = np.stack([forecast.mean if quantile == MEAN_FORECAST_KEY else forecast.quantile(quantile) for quantile in quantiles])
+
+    for (num_samples, _), forecasts_indices in sample_forecasts_indices_by_shape.items():
+        samples_indices = [None if quantile == MEAN_FORECAST_KEY else int(np.round((num_samples - 1) * quantile)) for quantile in quantiles]
+        for batch_start in range(0, len(forecasts_indices), batch_size):
+            batch_indices = forecasts_indices[batch_start : batch_start + batch_size]
+            samples = np.stack([forecasts_list[i].samples for i in batch_indices])
+            sorted_samples = np.sort(samples, axis=1)
+            if MEAN_FORECAST_KEY in quantiles:
+                mean_samples = samples.mean(axis=1)
+                batch_quantiles = np.stack([mean_samples if sample_index is None else sorted_samples[:, sample_index, :] for sample_index in samples_indices], axis=1)
+            else:
+                batch_quantiles = sorted_samples[:, samples_indices, :]
+            for i, forecast_quantiles in zip(batch_indices, batch_quantiles):
+                quantiles_arrays[i] = forecast_quantiles
+    return quantiles_arrays
+
+
+def reduce_forecasts_to_quantiles(forecasts, quantiles, batch_size=QUANTILES_BATCH_SIZE):
+    """Consume a forecasts iterator by batches of batch_size forecasts, keeping only their quantiles and start dates,
+    so that the samples of at most one batch of forecasts are held in memory.
 
+    Args:
+        forecasts (iterable): Iterable of gluonts.model.forecast.Forecast.
+        quantiles (list): List of quantiles (or MEAN_FORECAST_KEY) to compute.
+        batch_size (int, optional): Number of forecasts consumed at once. Defaults to QUANTILES_BATCH_SIZE.
 
-def quantile_forecasts_series(sample_forecasts, quantile, frequency):
-    sample_forecasts_quantile = sample_forecasts.quantile(quantile)
-    index = pd.date_range(sample_forecasts.start_date, periods=len(sample_forecasts_quantile), freq=frequency)
-    return pd.Series(index=index, data=sample_forecasts_quantile)
+    Returns:
+        List of arrays of shape (len(quantiles), forecast length) and list of forecasts start dates, in the order of forecasts.
+    """
+    quantiles_arrays, start_dates = [], []
+    forecasts = iter(forecasts)
+    while True:
+        forecasts_batch = list(itertools.islice(forecasts, batch_size))
+        if len(forecasts_batch) == 0:
+            break
+        quantiles_arrays += quantile_forecasts_arrays(forecasts_batch, quantiles, batch_size=batch_size)
+        start_dates += [forecast.start_date for forecast in forecasts_batch]
+    return quantiles_arrays, start_dates
 
 
 def sanitize_model_parameters(model_parameters, model_name):
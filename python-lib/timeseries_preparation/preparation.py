@@ -1,18 +1,39 @@
 import pandas as pd
 import numpy as np
-from pandas.api.types import is_numeric_dtype, is_string_dtype
+from pandas.api.types import is_numeric_dtype, is_string_dtype, is_categorical_dtype
 from pandas.tseries.offsets import Tick, BusinessDay, Week, MonthEnd
 from pandas.tseries.frequencies import to_offset
 from timeseries_preparation.h2g2 import H2G2
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import tracemalloc
 import re
 from safe_logger import SafeLogger
 
 logger = SafeLogger("Forecast plugin")
 
+PARTITIONS_PER_WORKER = 4
+
+# Dataframe shared with the forked worker processes of TimeseriesPreparator._prepare_in_parallel
+_forked_dataframe = None
+
 
 class TimeseriesPreparator:
     """
     Class to check the timeseries has the right data and prepare it to have regular date interval
+
+    Attributes:
+        time_column_name (str)
+        frequency (str): Pandas timeseries frequency (e.g. '3M')
+        target_columns_names (list): List of column names to predict
+        timeseries_identifiers_names (list): Columns to identify multiple time series when data is in long format
+        external_features_columns_names (list): List of columns with dynamic real features over time
+        max_timeseries_length (int): Maximum number of most recent dates to keep per timeseries. Default to None which means all.
+        low_memory (bool): True to only prepare the time, target, identifiers and external features columns without copying
+            the input dataframe, and to log the peak memory allocated by each preparation stage.
+        n_workers (int): Number of processes preparing partitions of the timeseries in parallel in long format. Default to 1 (no parallelism).
+        original_dtypes (dict): Dtype (value) by column name (key) of the columns converted by the compact_dtypes method.
     """
 
     def __init__(
@@ -23,6 +44,8 @@ class TimeseriesPreparator:
         timeseries_identifiers_names=[],
         external_features_columns_names=[],
         max_timeseries_length=None,
+        low_memory=False,
+        n_workers=1,
     ):
         self.time_column_name = time_column_name
         self.frequency = frequency
@@ -30,11 +53,14 @@ class TimeseriesPreparator:
         self.timeseries_identifiers_names = timeseries_identifiers_names
         self.external_features_columns_names = external_features_columns_names
         self.max_timeseries_length = max_timeseries_length
+        self.low_memory = low_memory
+        self.n_workers = n_workers
+        self.original_dtypes = {}
 
     def prepare_timeseries_dataframe(self, dataframe):
-        """Convert time column to pandas.Datetime without timezones. Truncate dates to selected frequency.
+        """Convert time column to pandas.Datetime without timezones. Sort timeseries. Truncate dates to selected frequency.
         Check that there are no duplicate dates and that there are no missing dates.
-        Sort timeseries. Keep only the most recent dates of each timeseries if specified.
+        Keep only the most recent dates of each timeseries if specified.
 
         Args:
             dataframe (DataFrame)
@@ -47,35 +73,211 @@ class TimeseriesPreparator:
         """
         self._check_data(dataframe)
 
-        dataframe_prepared = dataframe.copy()
+        with self._track_peak_memory("Column selection"):
+            if self.low_memory:
+                dataframe_prepared = dataframe.reindex(columns=self._get_used_columns_names(dataframe))
+            else:
+                dataframe_prepared = dataframe.copy()
 
-        try:
-            dataframe_prepared[self.time_column_name] = pd.to_datetime(dataframe[self.time_column_name]).dt.tz_localize(tz=None)
-        except Exception:
-            raise ValueError(f"Please parse the date column '{self.time_column_name}' in a Prepare recipe")
+        with self._track_peak_memory("Date parsing"):
+            dataframe_prepared[self.time_column_name] = self._parse_dates(dataframe_prepared[self.time_column_name])
+
+        if self.n_workers > 1 and len(self.timeseries_identifiers_names) > 0 and len(dataframe_prepared.index) > 0:
+            if multiprocessing.get_start_method() == "fork":
+                with self._track_peak_memory("Parallel preparation"):
+                    return self._prepare_in_parallel(dataframe_prepared)
+            logger.warning("Time series can only be prepared in parallel with forked processes, preparing them sequentially")
 
-        dataframe_prepared = self._truncate_dates(dataframe_prepared)
+        with self._track_peak_memory("Sort"):
+            dataframe_prepared = self._sort(dataframe_prepared)
 
-        dataframe_prepared = self._sort(dataframe_prepared)
+        with self._track_peak_memory("Truncation"):
+            dataframe_prepared = self._truncate_dates(dataframe_prepared)
 
-        self._check_regular_frequency(dataframe_prepared)
+        with self._track_peak_memory("Frequency check"):
+            self._check_regular_frequency(dataframe_prepared)
         log_message_prefix = "Found "
         self._log_timeseries_lengths(dataframe_prepared, log_message_prefix=log_message_prefix)
 
         if self.max_timeseries_length:
-            dataframe_prepared = self._keep_last_dates(dataframe_prepared)
-            log_message_prefix = f"Sampled {self.max_timeseries_length}"
-            self._log_timeseries_lengths(dataframe_prepared, log_message_prefix=log_message_prefix)
+            with self._track_peak_memory("Sampling"):
+                dataframe_prepared = self._keep_last_dates(dataframe_prepared)
+            self._log_sampling(self._get_timeseries_lengths(dataframe_prepared))
 
         return dataframe_prepared
 
+    def compact_dtypes(self, dataframe_prepared, compact_dtypes=None):
+        """Reduce the memory of a prepared dataframe before creating the GluonTS datasets.
+        Target and external features columns are downcast to float32 (the dtype used by GluonTS) when all their values are exactly
+        representable in float32, so that restoring them gives back the original values. Timeseries identifiers columns are converted
+        to categoricals. Columns are converted in place.
+
+        Args:
+            dataframe_prepared (DataFrame): Dataframe prepared with the prepare_timeseries_dataframe method.
+            compact_dtypes (dict, optional): Compact dtype (value) by column name (key), e.g. computed with the get_compact_dtypes
+                method on the whole dataset when it is compacted by parts. Defaults to None which means computed on dataframe_prepared.
+
+        Returns:
+            Dataframe with compacted dtypes. Original dtypes can be restored with the restore_dtypes method.
+        """
+        if compact_dtypes is None:
+            compact_dtypes = self.get_compact_dtypes(dataframe_prepared)
+        self.original_dtypes = {}
+        for column_name, compact_dtype in compact_dtypes.items():
+            self.original_dtypes[column_name] = dataframe_prepared[column_name].dtype
+            dataframe_prepared[column_name] = dataframe_prepared[column_name].astype(compact_dtype)
+        return dataframe_prepared
+
+    def get_compact_dtypes(self, df):
+        """Return the compact dtype (value) by column name (key) of the columns of df that can be compacted without changing their values"""
+        compact_dtypes = {}
+        for column_name in self.target_columns_names + self.external_features_columns_names:
+            column_values = df[column_name].values
+            if column_values.dtype != np.float32 and np.array_equal(column_values.astype(np.float32).astype(column_values.dtype), column_values):
+                compact_dtypes[column_name] = np.float32
+        for column_name in self.timeseries_identifiers_names:
+            if not is_categorical_dtype(df[column_name]):
+                compact_dtypes[column_name] = pd.CategoricalDtype(categories=df[column_name].unique())
+        return compact_dtypes
+
+    def restore_dtypes(self, df):
+        """Convert in place the columns of df compacted by the compact_dtypes method back to their original dtypes.
+        Columns of df that were not compacted are left unchanged.
+
+        Args:
+            df (DataFrame): Dataframe with some columns of the compacted dataframe (e.g. evaluation forecasts or metrics).
+
+        Returns:
+            Dataframe with original dtypes.
+        """
+        for column_name, original_dtype in self.original_dtypes.items():
+            if column_name in df.columns:
+                df[column_name] = df[column_name].astype(original_dtype)
+        return df
+
+    def _prepare_in_parallel(self, df):
+        """Sort, truncate, check and sample partitions of the timeseries in a pool of n_workers forked processes.
+        Partitions are contiguous ranges of the sorted timeseries identifiers, so concatenating the prepared partitions in order
+        gives the same dataframe as the sequential preparation. Workers inherit df from the parent process and only receive
+        the rows positions of their partition. Errors and logs are aggregated over all partitions.
+
+        Args:
+            df (DataFrame): Dataframe in long format with parsed dates.
+
+        Raises:
+            ValueError: If there are duplicate dates or if at least one timeseries doesn't have regular time intervals.
+
+        Returns:
+            Prepared timeseries
+        """
+        partitions_rows = self._split_timeseries_partitions(df, self.n_workers * PARTITIONS_PER_WORKER)
+        partition_preparator = TimeseriesPreparator(
+            time_column_name=self.time_column_name,
+            frequency=self.frequency,
+            target_columns_names=self.target_columns_names,
+            timeseries_identifiers_names=self.timeseries_identifiers_names,
+            external_features_columns_names=self.external_features_columns_names,
+            max_timeseries_length=self.max_timeseries_length,
+        )
+        logger.info(f"Preparing {len(partitions_rows)} partitions of time series with {self.n_workers} workers")
+        global _forked_dataframe
+        _forked_dataframe = df
+        try:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                results = list(executor.map(prepare_forked_timeseries_partition, [partition_preparator] * len(partitions_rows), partitions_rows))
+        finally:
+            _forked_dataframe = None
+        dataframes_prepared, partitions_reports = zip(*results)
+        self._check_partitions_reports(partitions_reports)
+
+        dataframe_prepared = pd.concat(dataframes_prepared)
+        if self.max_timeseries_length:
+            dataframe_prepared = dataframe_prepared.reset_index(drop=True)
+        return dataframe_prepared
+
+    def _check_partitions_reports(self, partitions_reports):
+        """Raise the errors and log the counts of timeseries prepared by partitions, as if they were prepared at once.
+
+        Args:
+            partitions_reports (list): Dictionaries of counts returned by prepare_timeseries_partition for each partition.
+
+        Raises:
+            ValueError: If there are duplicate dates or if at least one timeseries doesn't have regular time intervals.
+        """
+        self._assert_no_duplicate_dates(
+            sum(report["duplicate_dates"] for report in partitions_reports),
+            sum(report["truncated_duplicate_dates"] for report in partitions_reports),
+        )
+        self._log_truncation_counts(*np.sum([report["truncation_counts"] for report in partitions_reports], axis=0))
+        invalid_timeseries_identifiers = [identifiers for report in partitions_reports for identifiers in report["invalid_timeseries_identifiers"]]
+        if len(invalid_timeseries_identifiers) > 0:
+            raise ValueError(
+                irregular_frequency_error_message(
+                    self.time_column_name, self.frequency, invalid_timeseries_identifiers if self.timeseries_identifiers_names else None
+                )
+            )
+        timeseries_lengths = np.concatenate([report["timeseries_lengths"] for report in partitions_reports])
+        self._log_lengths(timeseries_lengths, log_message_prefix="Found ")
+        if self.max_timeseries_length:
+            self._log_sampling(np.minimum(timeseries_lengths, self.max_timeseries_length))
+
+    def _split_timeseries_partitions(self, df, partitions_number):
+        """Split the rows of df into at most partitions_number partitions holding contiguous ranges of the sorted timeseries identifiers.
+        Rows are not copied: each partition is the array of positions of its rows in df.
+        """
+        timeseries_numbers = df.groupby(self.timeseries_identifiers_names, sort=True).ngroup().values
+        timeseries_count = timeseries_numbers.max() + 1 if len(timeseries_numbers) > 0 else 0
+        partitions_numbers = timeseries_numbers * partitions_number // max(timeseries_count, 1)
+        rows_order = np.argsort(partitions_numbers, kind="stable")
+        partitions_ends = np.cumsum(np.bincount(partitions_numbers, minlength=partitions_number))
+        partitions_starts = partitions_ends - np.bincount(partitions_numbers, minlength=partitions_number)
+        return [rows_order[start:end] for start, end in zip(partitions_starts, partitions_ends) if end > start]
+
     def _check_data(self, df):
         self._check_timeseries_identifiers_columns_types(df)
         self._check_no_missing_values(df)
 
+    def _parse_dates(self, time_column):
+        """Convert time column to pandas.Datetime without timezones
+
+        Raises:
+            ValueError: If the time column cannot be parsed as a date by pandas.
+        """
+        try:
+            return pd.to_datetime(time_column).dt.tz_localize(tz=None)
+        except Exception:
+            raise ValueError(f"Please parse the date column '{self.time_column_name}' in a Prepare recipe")
+
+    def _get_used_columns_names(self, df):
+        """Return the names of the columns of df used for forecasting (time, identifiers, targets and external features), in the same order as df"""
+        used_columns_names = set(
+            [self.time_column_name] + self.timeseries_identifiers_names + self.target_columns_names + self.external_features_columns_names
+        )
+        return [column_name for column_name in df.columns if column_name in used_columns_names]
+
+    @contextmanager
+    def _track_peak_memory(self, stage_name):
+        """Log the peak memory allocated during a preparation stage when low_memory is True.
+
+        Args:
+            stage_name (str): Name of the preparation stage used in the log message.
+        """
+        if not self.low_memory:
+            yield
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            retained_memory, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            logger.info(f"{stage_name} stage: peak memory delta of {peak_memory / 1e6:.1f} MB, {retained_memory / 1e6:.1f} MB retained")
+
     def _truncate_dates(self, df):
         """Truncate dates to selected frequency. For Week/Month/Year, truncate to end of Week/Month/Year.
-        Check there are no duplicate dates.
+        Check there are no duplicate dates. The time column of df is replaced in place to avoid copying the whole dataframe.
+        As truncation never changes the order of dates, df stays sorted and duplicates before and after truncation
+        are found in a single scan of adjacent rows.
 
         Examples:
             '2020-12-15 12:45:30' becomes '2020-12-15 12:40:00' with frequency '20min'
@@ -85,7 +287,7 @@ class TimeseriesPreparator:
             '2020-12-15 12:30:00' becomes '2021-12-31 00:00:00' with frequency '6M'
 
         Args:
-            df (DataFrame): Dataframe in wide or long format with a time column.
+            df (DataFrame): Dataframe in wide or long format with a time column, sorted with the _sort method.
 
         Raises:
             ValueError: If there are duplicates dates before or after truncation.
@@ -93,97 +295,162 @@ class TimeseriesPreparator:
         Returns:
             Sorted DataFrame with truncated dates.
         """
-        df_truncated = df.copy()
-
-        error_message_suffix = ". Please check the Long format parameter." if len(self.timeseries_identifiers_names) == 0 else "."
-        self._check_duplicate_dates(df_truncated, error_message_suffix=error_message_suffix)
+        time_column = df[self.time_column_name]
+        truncated_time_column = self._truncate_time_column(time_column)
 
-        frequency_offset = to_offset(self.frequency)
-        if isinstance(frequency_offset, Tick):
-            df_truncated[self.time_column_name] = df_truncated[self.time_column_name].dt.floor(self.frequency)
-        elif isinstance(frequency_offset, BusinessDay):
-            df_truncated[self.time_column_name] = df_truncated[self.time_column_name].dt.floor("D")
-        else:
-            if isinstance(frequency_offset, Week):
-                truncation_offset = pd.offsets.Week(weekday=frequency_offset.weekday, n=0)
-            elif isinstance(frequency_offset, MonthEnd):
-                truncation_offset = pd.offsets.MonthEnd(n=0)
+        self._check_duplicate_dates(df, truncated_time_column)
 
-            df_truncated[self.time_column_name] = df_truncated[self.time_column_name].dt.floor("D") + truncation_offset
+        self._log_truncation(truncated_time_column, time_column)
 
-        self._log_truncation(df_truncated, df)
+        df[self.time_column_name] = truncated_time_column
 
-        error_message_suffix = f" after truncation to '{self.frequency}' frequency. Please check the Frequency parameter."
-        self._check_duplicate_dates(df_truncated, error_message_suffix=error_message_suffix)
+        return df
 
-        return df_truncated
+    def _truncate_time_column(self, time_column):
+        """Return the time column truncated to selected frequency"""
+        frequency_offset = to_offset(self.frequency)
+        if isinstance(frequency_offset, Tick):
+            return time_column.dt.floor(self.frequency)
+        elif isinstance(frequency_offset, BusinessDay):
+            return time_column.dt.floor("D")
+        elif isinstance(frequency_offset, Week):
+            return truncate_to_end_of_week(time_column, frequency_offset.weekday)
+        elif isinstance(frequency_offset, MonthEnd):
+            return truncate_to_end_of_month(time_column)
 
     def _sort(self, df):
         """Return a DataFrame sorted by timeseries identifiers and time column (both ascending) """
         return df.sort_values(by=self.timeseries_identifiers_names + [self.time_column_name])
 
     def _check_regular_frequency(self, df):
-        """Check that time column exactly equals the pandas.dat_range with selected frequency """
-        if self.timeseries_identifiers_names:
-            for identifiers_values, identifiers_df in df.groupby(self.timeseries_identifiers_names):
-                assert_time_column_valid(identifiers_df, self.time_column_name, self.frequency)
-        else:
-            assert_time_column_valid(df, self.time_column_name, self.frequency)
+        """Check that the time column of each timeseries exactly equals the pandas.date_range with selected frequency.
+        All timeseries are checked at once on the dataframe sorted by timeseries identifiers and time column.
+
+        Args:
+            df (DataFrame): Dataframe sorted with the _sort method.
+
+        Raises:
+            ValueError: If at least one timeseries doesn't have regular time intervals of the chosen frequency.
+        """
+        timeseries_starts, _ = get_timeseries_boundaries(df, self.timeseries_identifiers_names)
+        invalid_timeseries = find_irregular_timeseries(df[self.time_column_name], self.frequency, timeseries_starts)
+        if invalid_timeseries.any():
+            invalid_timeseries_identifiers = None
+            if self.timeseries_identifiers_names:
+                invalid_timeseries_starts = timeseries_starts[invalid_timeseries]
+                invalid_timeseries_identifiers = df[self.timeseries_identifiers_names].iloc[invalid_timeseries_starts].to_dict(orient="records")
+            raise ValueError(irregular_frequency_error_message(self.time_column_name, self.frequency, invalid_timeseries_identifiers))
 
     def _keep_last_dates(self, df):
         """Keep only at most the last max_timeseries_length dates of each timeseries.
+        Rows are selected with a single boolean mask computed from the timeseries boundaries.
 
         Args:
-            df (DataFrame)
+            df (DataFrame): Dataframe sorted with the _sort method.
 
         Returns:
             Filtered dataframe
         """
-        if self.max_timeseries_length == 42:
-            print(H2G2)
         if len(self.timeseries_identifiers_names) == 0:
             return df.tail(self.max_timeseries_length)
         else:
-            return df.groupby(self.timeseries_identifiers_names).apply(lambda x: x.tail(self.max_timeseries_length)).reset_index(drop=True)
+            timeseries_starts, timeseries_ends = get_timeseries_boundaries(df, self.timeseries_identifiers_names)
+            rows_until_timeseries_end = np.repeat(timeseries_ends, timeseries_ends - timeseries_starts) - np.arange(len(df.index))
+            return df.iloc[rows_until_timeseries_end <= self.max_timeseries_length].reset_index(drop=True)
+
+    def _log_sampling(self, timeseries_lengths):
+        """Log the number and sizes of time series after keeping their last max_timeseries_length dates"""
+        if self.max_timeseries_length == 42:
+            print(H2G2)
+        self._log_lengths(timeseries_lengths, log_message_prefix=f"Sampled {self.max_timeseries_length}")
 
-    def _log_truncation(self, df_truncated, df):
+    def _log_truncation(self, truncated_time_column, time_column):
         """Log how many dates were truncated for users to understand how their data were changed
 
         Args:
-            df_truncated (DataFrame): Dataframe after truncation
-            df (DataFrame): Original dataframe
+            truncated_time_column (Series): Time column after truncation
+            time_column (Series): Original time column
+
+        """
+        self._log_truncation_counts(*self._count_truncated_dates(truncated_time_column, time_column))
+
+    def _count_truncated_dates(self, truncated_time_column, time_column):
+        """Count the dates changed by the truncation
+
+        Args:
+            truncated_time_column (Series): Time column after truncation
+            time_column (Series): Original time column
 
+        Returns:
+            Total number of dates, number of truncated dates and number of dates kept on the same day of week.
+            The latter is only computed for weekly frequencies when all dates are truncated (0 otherwise).
         """
-        total_dates = len(df_truncated.index)
-        truncated_dates = (df_truncated[self.time_column_name] != df[self.time_column_name]).sum()
+        total_dates = len(truncated_time_column.index)
+        truncated_dates = (truncated_time_column != time_column).sum()
+        same_day_of_week_dates = 0
+        if truncated_dates == total_dates and isinstance(to_offset(self.frequency), Week):
+            same_day_of_week_dates = (truncated_time_column.dt.dayofweek == time_column.dt.dayofweek).sum()
+        return total_dates, truncated_dates, same_day_of_week_dates
+
+    def _log_truncation_counts(self, total_dates, truncated_dates, same_day_of_week_dates):
+        """Log how many dates were truncated from the counts of the _count_truncated_dates method"""
         if truncated_dates > 0:
             logger.warning(
                 f"Dates truncated to {frequency_custom_label(self.frequency)} frequency: {total_dates - truncated_dates} dates kept, {truncated_dates} dates truncated"
             )
             if truncated_dates == total_dates:
-                self._check_end_of_week_frequency(df_truncated, df)
+                self._check_end_of_week_frequency(same_day_of_week_dates)
         else:
             logger.info(f"No dates were changed after truncation to {frequency_custom_label(self.frequency)} frequency")
 
-    def _check_end_of_week_frequency(self, df_truncated, df):
+    def _check_end_of_week_frequency(self, same_day_of_week_dates):
         """Check not all that truncated days are different days"""
         frequency_offset = to_offset(self.frequency)
         if isinstance(frequency_offset, Week):
-            if all(df_truncated[self.time_column_name].dt.dayofweek != df[self.time_column_name].dt.dayofweek):
+            if same_day_of_week_dates == 0:
                 raise ValueError(f"No weekly dates on {WEEKDAYS[frequency_offset.weekday]}. Please check the 'End of week day' parameter.")
 
-    def _check_duplicate_dates(self, df, error_message_suffix=None):
-        """Check dataframe has no duplicate dates and raise an actionable error message """
-        duplicate_dates = self._count_duplicate_dates(df)
+    def _check_duplicate_dates(self, df, truncated_time_column):
+        """Check dataframe has no duplicate dates before and after truncation and raise an actionable error message
+
+        Args:
+            df (DataFrame): Dataframe sorted with the _sort method, before truncation.
+            truncated_time_column (Series): Time column of df after truncation.
+
+        Raises:
+            ValueError: If there are duplicate dates in df or if the truncation created duplicate dates.
+        """
+        self._assert_no_duplicate_dates(*self._count_duplicate_dates(df, truncated_time_column))
+
+    def _assert_no_duplicate_dates(self, duplicate_dates, truncated_duplicate_dates):
+        """Raise an actionable error message from the counts of the _count_duplicate_dates method"""
         if duplicate_dates > 0:
             error_message = f"Input dataset has {duplicate_dates} duplicate dates"
-            if error_message_suffix:
-                error_message += error_message_suffix
+            error_message += ". Please check the Long format parameter." if len(self.timeseries_identifiers_names) == 0 else "."
+            raise ValueError(error_message)
+        if truncated_duplicate_dates > 0:
+            error_message = f"Input dataset has {truncated_duplicate_dates} duplicate dates"
+            error_message += f" after truncation to '{self.frequency}' frequency. Please check the Frequency parameter."
             raise ValueError(error_message)
 
-    def _count_duplicate_dates(self, df):
-        """Return total number of duplicates dates within all timeseries """
-        return df.duplicated(subset=self.timeseries_identifiers_names + [self.time_column_name], keep=False).sum()
+    def _count_duplicate_dates(self, df, truncated_time_column):
+        """Return total number of duplicates dates within all timeseries before and after truncation.
+        Duplicates are adjacent in df sorted by timeseries identifiers and dates, so a single comparison of each row
+        with the previous one is enough.
+
+        Args:
+            df (DataFrame): Dataframe sorted with the _sort method, before truncation.
+            truncated_time_column (Series): Time column of df after truncation.
+
+        Returns:
+            Number of rows with a duplicate date before truncation and after truncation.
+        """
+        timeseries_starts, _ = get_timeseries_boundaries(df, self.timeseries_identifiers_names)
+        is_same_timeseries_as_previous = np.ones(len(df.index), dtype=bool)
+        is_same_timeseries_as_previous[timeseries_starts] = False
+        duplicate_dates = count_adjacent_duplicates(df[self.time_column_name].values, is_same_timeseries_as_previous)
+        truncated_duplicate_dates = count_adjacent_duplicates(truncated_time_column.values, is_same_timeseries_as_previous)
+        return duplicate_dates, truncated_duplicate_dates
 
     def _check_timeseries_identifiers_columns_types(self, df):
         """ Raises ValueError if a timeseries identifiers column is not numerical or string """
@@ -204,10 +471,16 @@ class TimeseriesPreparator:
 
     def _log_timeseries_lengths(self, df, log_message_prefix=None):
         """Log the number and sizes of time series and whether it's after sampling or not"""
+        self._log_lengths(self._get_timeseries_lengths(df), log_message_prefix=log_message_prefix)
+
+    def _get_timeseries_lengths(self, df):
+        """Return the list of the number of records of each timeseries of df"""
         if len(self.timeseries_identifiers_names) == 0:
-            timeseries_lengths = [len(df.index)]
-        else:
-            timeseries_lengths = list(df.groupby(self.timeseries_identifiers_names).size())
+            return [len(df.index)]
+        return list(df.groupby(self.timeseries_identifiers_names).size())
+
+    def _log_lengths(self, timeseries_lengths, log_message_prefix=None):
+        """Log the number and sizes of time series from the list of their lengths"""
         log_message = f"{len(timeseries_lengths)} time series"
         if all(length == timeseries_lengths[0] for length in timeseries_lengths):
             log_message += f" of {timeseries_lengths[0]} records"
@@ -240,9 +513,179 @@ def assert_time_column_valid(dataframe, time_column_name, frequency, start_date=
         date_range_values = pd.date_range(start=start_date, end=end_date, freq=frequency).values
 
     if not np.array_equal(dataframe[time_column_name].values, date_range_values):
-        error_message = f"Time column '{time_column_name}' has missing values with frequency '{frequency}'."
-        error_message += " You can use the Time Series Preparation plugin to resample your time column."
-        raise ValueError(error_message)
+        raise ValueError(irregular_frequency_error_message(time_column_name, frequency))
+
+
+def get_timeseries_boundaries(df, timeseries_identifiers_names):
+    """Compute the positions where each timeseries starts and ends in a dataframe sorted by timeseries identifiers.
+    Identifiers are factorized once per column and compared between adjacent rows.
+
+    Args:
+        df (DataFrame): Dataframe sorted by timeseries identifiers.
+        timeseries_identifiers_names (list): Columns to identify multiple time series when data is in long format.
+
+    Returns:
+        Numpy arrays of the first position (included) and last position (excluded) of each timeseries.
+    """
+    rows_number = len(df.index)
+    is_timeseries_start = np.zeros(rows_number, dtype=bool)
+    is_timeseries_start[:1] = True
+    for identifier_name in timeseries_identifiers_names or []:
+        identifier_codes = pd.factorize(df[identifier_name])[0]
+        is_timeseries_start[1:] |= identifier_codes[1:] != identifier_codes[:-1]
+    timeseries_starts = np.flatnonzero(is_timeseries_start)
+    timeseries_ends = np.empty_like(timeseries_starts)
+    timeseries_ends[:-1] = timeseries_starts[1:]
+    timeseries_ends[-1:] = rows_number
+    return timeseries_starts, timeseries_ends
+
+
+def prepare_forked_timeseries_partition(timeseries_preparator, partition_rows):
+    """Prepare the partition_rows rows of the dataframe inherited from the parent process with prepare_timeseries_partition.
+    Defined at module level to be run by the processes of TimeseriesPreparator._prepare_in_parallel.
+
+    Args:
+        timeseries_preparator (TimeseriesPreparator)
+        partition_rows (numpy.array): Positions of the rows of the partition in the dataframe of the parent process.
+
+    Returns:
+        Prepared dataframe and dictionary with the counts of the partition (see prepare_timeseries_partition).
+    """
+    return prepare_timeseries_partition(timeseries_preparator, _forked_dataframe.iloc[partition_rows])
+
+
+def prepare_timeseries_partition(timeseries_preparator, df):
+    """Sort, truncate, check and sample a partition of the timeseries in long format.
+    Nothing is logged nor raised, the counts of the partition are returned to be aggregated with the other partitions.
+
+    Args:
+        timeseries_preparator (TimeseriesPreparator)
+        df (DataFrame): Dataframe with parsed dates and all the rows of its timeseries.
+
+    Returns:
+        Prepared dataframe and dictionary with the counts of duplicate dates, the truncation counts,
+        the identifiers of the irregular timeseries and the lengths of the timeseries before sampling.
+    """
+    df = timeseries_preparator._sort(df)
+    time_column_name = timeseries_preparator.time_column_name
+    time_column = df[time_column_name]
+    truncated_time_column = timeseries_preparator._truncate_time_column(time_column)
+    duplicate_dates, truncated_duplicate_dates = timeseries_preparator._count_duplicate_dates(df, truncated_time_column)
+    truncation_counts = timeseries_preparator._count_truncated_dates(truncated_time_column, time_column)
+    df[time_column_name] = truncated_time_column
+
+    timeseries_starts, timeseries_ends = get_timeseries_boundaries(df, timeseries_preparator.timeseries_identifiers_names)
+    invalid_timeseries = find_irregular_timeseries(df[time_column_name], timeseries_preparator.frequency, timeseries_starts)
+    invalid_timeseries_identifiers = df[timeseries_preparator.timeseries_identifiers_names].iloc[timeseries_starts[invalid_timeseries]].to_dict(orient="records")
+
+    if timeseries_preparator.max_timeseries_length:
+        df = timeseries_preparator._keep_last_dates(df)
+    partition_report = {
+        "duplicate_dates": duplicate_dates,
+        "truncated_duplicate_dates": truncated_duplicate_dates,
+        "truncation_counts": truncation_counts,
+        "invalid_timeseries_identifiers": invalid_timeseries_identifiers,
+        "timeseries_lengths": timeseries_ends - timeseries_starts,
+    }
+    return df, partition_report
+
+
+def truncate_to_end_of_week(time_column, weekday):
+    """Truncate dates to the day and roll them forward to the next given weekday (if not already on it).
+    Equivalent to time_column.dt.floor("D") + pd.offsets.Week(weekday=weekday, n=0) with vectorized datetime64 arithmetic.
+
+    Args:
+        time_column (Series): Time column of pandas.Datetime without timezone.
+        weekday (int): Day of the week ending the weeks (0 is Monday and 6 is Sunday).
+
+    Returns:
+        Series of truncated dates with the same index as time_column.
+    """
+    days = time_column.values.astype("datetime64[D]")
+    # 1970-01-01 (day 0 of datetime64[D]) is a Thursday, i.e. weekday 3
+    days_until_weekday = (weekday - days.astype(np.int64) - 3) % 7
+    return pd.Series((days + days_until_weekday).astype("datetime64[ns]"), index=time_column.index, name=time_column.name)
+
+
+def truncate_to_end_of_month(time_column):
+    """Truncate dates to the last day of their month.
+    Equivalent to time_column.dt.floor("D") + pd.offsets.MonthEnd(n=0) with vectorized datetime64 arithmetic.
+
+    Args:
+        time_column (Series): Time column of pandas.Datetime without timezone.
+
+    Returns:
+        Series of truncated dates with the same index as time_column.
+    """
+    next_months = time_column.values.astype("datetime64[M]") + 1
+    month_ends = next_months.astype("datetime64[D]") - 1
+    return pd.Series(month_ends.astype("datetime64[ns]"), index=time_column.index, name=time_column.name)
+
+
+def count_adjacent_duplicates(values, is_same_timeseries_as_previous):
+    """Count the rows having the same value as an adjacent row of the same timeseries (all duplicated rows are counted).
+
+    Args:
+        values (numpy.array): Sorted values within each timeseries.
+        is_same_timeseries_as_previous (numpy.array): Boolean array with True if the row belongs to the same timeseries as the previous row.
+
+    Returns:
+        Number of duplicated rows.
+    """
+    is_duplicate_of_previous = is_same_timeseries_as_previous.copy()
+    is_duplicate_of_previous[1:] &= values[1:] == values[:-1]
+    is_duplicate = is_duplicate_of_previous.copy()
+    is_duplicate[:-1] |= is_duplicate_of_previous[1:]
+    return is_duplicate.sum()
+
+
+def find_irregular_timeseries(time_column, frequency, timeseries_starts):
+    """Vectorized equivalent of assert_time_column_valid for all timeseries of a sorted time column.
+    A timeseries equals the pandas.date_range with its first and last dates if its first date is on the frequency offset
+    (pandas.date_range rolls it forward otherwise) and each following date is the previous one shifted by the frequency offset.
+
+    Args:
+        time_column (Series): Datetime column sorted by timeseries identifiers and dates.
+        frequency (str): Pandas timeseries frequency (e.g. '3M').
+        timeseries_starts (numpy.array): First position of each timeseries, as computed by get_timeseries_boundaries.
+
+    Returns:
+        Boolean numpy array with True for each timeseries that doesn't have regular time intervals of the chosen frequency.
+    """
+    if len(timeseries_starts) == 0:
+        return np.zeros(0, dtype=bool)
+    frequency_offset = to_offset(frequency)
+    time_index = pd.DatetimeIndex(time_column)
+    is_valid_date = np.ones(len(time_index), dtype=bool)
+    is_valid_date[1:] = (time_index[:-1] + frequency_offset).values == time_index.values[1:]
+    first_dates = time_index[timeseries_starts]
+    is_valid_date[timeseries_starts] = (first_dates + 0 * frequency_offset).values == first_dates.values
+    return ~np.logical_and.reduceat(is_valid_date, timeseries_starts)
+
+
+def irregular_frequency_error_message(time_column_name, frequency, invalid_timeseries_identifiers=None):
+    """Build the error message raised when time series don't have regular time intervals of the chosen frequency.
+
+    Args:
+        time_column_name (str)
+        frequency (str)
+        invalid_timeseries_identifiers (list, optional): Identifiers dictionaries of the invalid timeseries. Defaults to None.
+
+    Returns:
+        Error message.
+    """
+    error_message = f"Time column '{time_column_name}' has missing values with frequency '{frequency}'."
+    if invalid_timeseries_identifiers:
+        displayed_identifiers = invalid_timeseries_identifiers[:MAX_DISPLAYED_TIMESERIES_IDENTIFIERS]
+        error_message += f" Found {len(invalid_timeseries_identifiers)} invalid time series with identifiers: {displayed_identifiers}"
+        if len(invalid_timeseries_identifiers) > MAX_DISPLAYED_TIMESERIES_IDENTIFIERS:
+            error_message += " ..."
+        error_message += "."
+    error_message += " You can use the Time Series Preparation plugin to resample your time column."
+    return error_message
+
+
+MAX_DISPLAYED_TIMESERIES_IDENTIFIERS = 10
 
 
 FREQUENCY_LABEL = {"T": "minute", "H": "hour", "D": "day", "B": "business day"}
@@ -0,0 +1,316 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from collections.abc import Sequence
+from timeseries_preparation.preparation import prepare_timeseries_partition, get_timeseries_boundaries
+from safe_logger import SafeLogger
+
+logger = SafeLogger("Forecast plugin")
+
+DEFAULT_CHUNKSIZE = 100000
+DEFAULT_SHARDS_NUMBER = 16
+PREPARED_SHARD_EXTENSION = ".prepared.pkl"
+
+# columns of the dataframe describing the timeseries of the prepared shards, used to split them into ranges of identifiers
+ROWS_COUNT_COLUMN = "__rows_count"
+SHARD_INDEX_COLUMN = "__shard_index"
+RANGE_INDEX_COLUMN = "__range_index"
+
+
+class LocalFileDataset:
+    """
+    Local stand-in of a dataiku.Dataset reading a CSV or Parquet file, with the same chunked reading interface
+    and the same streaming writing interface (CSV only)
+
+    Attributes:
+        path (str): Path of a CSV (optionally compressed) or Parquet (extension '.parquet') file
+        schema (list): List of columns dictionaries with 'name' and 'type' keys, set when writing the dataset
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.schema = []
+
+    def read_schema(self):
+        return self.schema
+
+    def write_schema(self, schema):
+        self.schema = schema
+
+    def write_schema_from_dataframe(self, df):
+        self.schema = [{"name": column, "type": str(dtype)} for column, dtype in df.dtypes.items()]
+
+    def get_writer(self):
+        return LocalFileDatasetWriter(self)
+
+    def get_dataframe(self):
+        if self._is_parquet():
+            return pd.read_parquet(self.path)
+        return pd.read_csv(self.path)
+
+    def iter_dataframes(self, chunksize=10000):
+        """Yield the dataset as consecutive dataframes of at most chunksize rows.
+        Parquet files are read by batches with pyarrow which must be installed.
+
+        Args:
+            chunksize (int, optional): Number of rows of each dataframe. Defaults to 10000.
+        """
+        if self._is_parquet():
+            import pyarrow.parquet as pq
+
+            for record_batch in pq.ParquetFile(self.path).iter_batches(batch_size=chunksize):
+                yield record_batch.to_pandas()
+        else:
+            yield from pd.read_csv(self.path, chunksize=chunksize)
+
+    def _is_parquet(self):
+        return self.path.endswith(".parquet")
+
+
+class LocalFileDatasetWriter:
+    """
+    Local stand-in of a dataiku.core.dataset_write.DatasetWriter appending dataframes to the CSV file of a LocalFileDataset.
+    As with dataiku, dataframes must have the columns of the dataset schema.
+
+    Attributes:
+        dataset (LocalFileDataset)
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._file = open(dataset.path, "w", newline="")
+        self._file.write(",".join(column["name"] for column in dataset.schema) + "\n")
+
+    def write_dataframe(self, df):
+        """Append df to the dataset file.
+
+        Raises:
+            ValueError: If the columns of df are not the ones of the dataset schema.
+        """
+        schema_columns = [column["name"] for column in self.dataset.schema]
+        if list(df.columns) != schema_columns:
+            raise ValueError(f"Dataframe columns {list(df.columns)} do not match the dataset schema {schema_columns}")
+        df.to_csv(self._file, header=False, index=False)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StreamingTimeseriesPreparator:
+    """
+    Class to prepare a dataset too large to be loaded at once in memory.
+    The dataset is read in chunks which are checked, and whose rows are spilled to shards on local disk based on a hash of their identifiers.
+    All rows of a timeseries are in the same shard, so each shard is then prepared independently and written back to disk.
+    Prepared shards are finally split into ranges of the sorted identifiers, to keep the timeseries order of the in-memory preparation.
+    Errors and logs are aggregated over all shards, as for the parallel preparation of the TimeseriesPreparator.
+
+    Attributes:
+        timeseries_preparator (TimeseriesPreparator)
+        shards_directory (str): Local directory where the shards are written
+        shards_number (int): Number of shards the timeseries are split into. Only one shard is used in wide format.
+        chunksize (int): Number of rows of each chunk read from the dataset
+        compact_dtypes (bool): Whether to compact the dtypes of the prepared shards with TimeseriesPreparator.compact_dtypes
+        shards_paths (list): Directories of the non empty shards, filled by the write_shards method
+    """
+
+    def __init__(
+        self, timeseries_preparator, shards_directory, shards_number=DEFAULT_SHARDS_NUMBER, chunksize=DEFAULT_CHUNKSIZE, compact_dtypes=False
+    ):
+        self.timeseries_preparator = timeseries_preparator
+        self.shards_directory = shards_directory
+        self.shards_number = shards_number if timeseries_preparator.timeseries_identifiers_names else 1
+        self.chunksize = chunksize
+        self.compact_dtypes = compact_dtypes
+        self.shards_paths = []
+
+    def prepare_timeseries_shards(self, dataset):
+        """Prepare the dataset shard by shard, only holding one shard at a time in memory.
+        Prepared shards are then split again into shards of contiguous ranges of the sorted timeseries identifiers,
+        so that concatenating them in order gives the same dataframe as TimeseriesPreparator.prepare_timeseries_dataframe
+        applied on the whole dataset. They are never concatenated: they can be used directly to create a GluonDataset.
+
+        Args:
+            dataset (dataiku.Dataset or LocalFileDataset): Dataset with an iter_dataframes(chunksize) method
+
+        Raises:
+            ValueError: If the dataset is empty, has duplicate dates or if at least one timeseries doesn't have regular time intervals.
+
+        Returns:
+            PreparedShards yielding the prepared dataframe of each shard, in the order of the timeseries identifiers
+        """
+        self.write_shards(dataset)
+        if len(self.shards_paths) == 0:
+            raise ValueError("Input dataset is empty")
+        prepared_shards_paths, shards_reports, shards_timeseries = [], [], []
+        for shard_index, shard_path in enumerate(self.shards_paths):
+            shard_prepared, shard_report = prepare_timeseries_partition(self.timeseries_preparator, self._read_shard(shard_path))
+            shutil.rmtree(shard_path)
+            prepared_shard_path = f"{shard_path}{PREPARED_SHARD_EXTENSION}"
+            shard_prepared.reset_index(drop=True).to_pickle(prepared_shard_path)
+            prepared_shards_paths.append(prepared_shard_path)
+            shards_reports.append(shard_report)
+            if self.timeseries_preparator.timeseries_identifiers_names:
+                shards_timeseries.append(self._get_shard_timeseries(shard_prepared, shard_index))
+        self.timeseries_preparator._check_partitions_reports(shards_reports)
+        if self.timeseries_preparator.timeseries_identifiers_names:
+            prepared_shards_paths = self._split_identifiers_ranges(prepared_shards_paths, pd.concat(shards_timeseries, ignore_index=True))
+        if self.compact_dtypes:
+            self._compact_prepared_shards(prepared_shards_paths)
+        return PreparedShards(prepared_shards_paths)
+
+    def write_shards(self, dataset):
+        """Read the dataset in chunks, check each chunk and append its rows to the shard of their timeseries.
+        Dates are parsed in each chunk but they are truncated when a whole shard is prepared, to tell apart duplicate dates
+        of the input dataset from duplicate dates created by the truncation.
+
+        Args:
+            dataset (dataiku.Dataset or LocalFileDataset): Dataset with an iter_dataframes(chunksize) method
+
+        Returns:
+            List of directories of the non empty shards
+        """
+        preparator = self.timeseries_preparator
+        shards_paths = set()
+        total_rows = 0
+        for chunk_index, chunk in enumerate(dataset.iter_dataframes(chunksize=self.chunksize)):
+            preparator._check_data(chunk)
+            if preparator.low_memory:
+                chunk = chunk.reindex(columns=preparator._get_used_columns_names(chunk))
+            chunk[preparator.time_column_name] = preparator._parse_dates(chunk[preparator.time_column_name])
+            for shard_index, shard_chunk in chunk.groupby(self._get_shards_indices(chunk), sort=False):
+                shard_path = os.path.join(self.shards_directory, f"shard_{shard_index:04d}")
+                if shard_path not in shards_paths:
+                    os.makedirs(shard_path, exist_ok=True)
+                    shards_paths.add(shard_path)
+                shard_chunk.to_pickle(os.path.join(shard_path, f"part_{chunk_index:06d}.pkl"))
+            total_rows += len(chunk.index)
+        self.shards_paths = sorted(shards_paths)
+        logger.info(f"Split {total_rows} rows into {len(self.shards_paths)} shards of time series")
+        return self.shards_paths
+
+    def _get_shard_timeseries(self, shard_prepared, shard_index):
+        """Return a dataframe with the identifiers, the number of rows and the shard index of each timeseries of a prepared shard"""
+        identifiers_names = self.timeseries_preparator.timeseries_identifiers_names
+        timeseries_starts, timeseries_ends = get_timeseries_boundaries(shard_prepared, identifiers_names)
+        shard_timeseries = shard_prepared[identifiers_names].iloc[timeseries_starts].reset_index(drop=True)
+        shard_timeseries[ROWS_COUNT_COLUMN] = timeseries_ends - timeseries_starts
+        shard_timeseries[SHARD_INDEX_COLUMN] = shard_index
+        return shard_timeseries
+
+    def _split_identifiers_ranges(self, prepared_shards_paths, all_timeseries):
+        """Split the prepared shards into the same number of shards holding contiguous ranges of the sorted timeseries identifiers,
+        with about the same number of rows each. Only one prepared shard, then one range shard, is held in memory at a time.
+
+        Args:
+            prepared_shards_paths (list): Paths of the prepared shards.
+            all_timeseries (DataFrame): Timeseries of all prepared shards, as returned by the _get_shard_timeseries method.
+
+        Returns:
+            Paths of the range shards, in the order of the timeseries identifiers
+        """
+        ranges_number = len(prepared_shards_paths)
+        sorted_timeseries = all_timeseries.sort_values(by=self.timeseries_preparator.timeseries_identifiers_names)
+        rows_counts = sorted_timeseries[ROWS_COUNT_COLUMN].values
+        rows_starts = np.cumsum(rows_counts) - rows_counts
+        all_timeseries[RANGE_INDEX_COLUMN] = pd.Series(rows_starts * ranges_number // rows_counts.sum(), index=sorted_timeseries.index)
+
+        ranges_paths = [os.path.join(self.shards_directory, f"range_{range_index:04d}") for range_index in range(ranges_number)]
+        for shard_index, prepared_shard_path in enumerate(prepared_shards_paths):
+            shard_prepared = pd.read_pickle(prepared_shard_path)
+            shard_timeseries = all_timeseries[all_timeseries[SHARD_INDEX_COLUMN] == shard_index]
+            rows_ranges = np.repeat(shard_timeseries[RANGE_INDEX_COLUMN].values, shard_timeseries[ROWS_COUNT_COLUMN].values)
+            for range_index, range_rows in shard_prepared.groupby(rows_ranges, sort=False):
+                os.makedirs(ranges_paths[range_index], exist_ok=True)
+                range_rows.to_pickle(os.path.join(ranges_paths[range_index], f"part_{shard_index:04d}.pkl"))
+            os.remove(prepared_shard_path)
+
+        sorted_shards_paths = []
+        for range_path in ranges_paths:
+            if os.path.isdir(range_path):
+                range_prepared = self.timeseries_preparator._sort(self._read_shard(range_path)).reset_index(drop=True)
+                shutil.rmtree(range_path)
+                range_prepared.to_pickle(f"{range_path}{PREPARED_SHARD_EXTENSION}")
+                sorted_shards_paths.append(f"{range_path}{PREPARED_SHARD_EXTENSION}")
+        return sorted_shards_paths
+
+    def _compact_prepared_shards(self, prepared_shards_paths):
+        """Compact the dtypes of all prepared shards with the same dtypes, so that they can be restored and concatenated as one dataframe.
+        Columns are downcast to float32 only if it does not change their values in any shard and identifiers categories are shared by all shards.
+
+        Args:
+            prepared_shards_paths (list): Paths of the prepared shards, compacted in place.
+
+        Raises:
+            ValueError: If a column doesn't have the same dtype in all prepared shards.
+        """
+        preparator = self.timeseries_preparator
+        original_dtypes, shards_compact_dtypes = None, []
+        for prepared_shard_path in prepared_shards_paths:
+            shard_prepared = pd.read_pickle(prepared_shard_path)
+            shard_compact_dtypes = preparator.get_compact_dtypes(shard_prepared)
+            shard_dtypes = shard_prepared.dtypes
+            if original_dtypes is None:
+                original_dtypes = shard_dtypes
+            elif not shard_dtypes.equals(original_dtypes):
+                different_columns = [column for column in shard_dtypes.index if shard_dtypes[column] != original_dtypes[column]]
+                raise ValueError(
+                    f"Columns {different_columns} do not have the same type in all time series, their types can't be compacted. "
+                    + "Please disable the compact types option or fix the types of these columns."
+                )
+            shards_compact_dtypes.append(shard_compact_dtypes)
+
+        compact_dtypes = {}
+        for column_name in preparator.target_columns_names + preparator.external_features_columns_names:
+            if all(column_name in shard_compact_dtypes for shard_compact_dtypes in shards_compact_dtypes):
+                compact_dtypes[column_name] = np.float32
+        for column_name in preparator.timeseries_identifiers_names:
+            if column_name in shards_compact_dtypes[0]:
+                categories = shards_compact_dtypes[0][column_name].categories
+                for shard_compact_dtypes in shards_compact_dtypes[1:]:
+                    categories = categories.append(shard_compact_dtypes[column_name].categories)
+                compact_dtypes[column_name] = pd.CategoricalDtype(categories=categories.unique())
+
+        for prepared_shard_path in prepared_shards_paths:
+            preparator.compact_dtypes(pd.read_pickle(prepared_shard_path), compact_dtypes=compact_dtypes).to_pickle(prepared_shard_path)
+
+    def _get_shards_indices(self, chunk):
+        """Return the shard index of each row of chunk based on a hash of its timeseries identifiers.
+        Identifiers are hashed as strings, as the hash of a value depends on its dtype which may differ between chunks.
+        """
+        if self.shards_number == 1:
+            return pd.Series(0, index=chunk.index)
+        identifiers = chunk[self.timeseries_preparator.timeseries_identifiers_names].astype(str)
+        identifiers_hashes = pd.util.hash_pandas_object(identifiers, index=False)
+        return identifiers_hashes % self.shards_number
+
+    def _read_shard(self, shard_path):
+        parts_paths = sorted(os.listdir(shard_path))
+        return pd.concat([pd.read_pickle(os.path.join(shard_path, part_path)) for part_path in parts_paths], ignore_index=True)
+
+
+class PreparedShards(Sequence):
+    """
+    Prepared shards stored on local disk and read one at a time each time they are iterated.
+    Can be used as the dataframe of a GluonDataset or the training dataframe of a TrainingSession.
+
+    Attributes:
+        paths (list): Paths of the pickled prepared dataframes of the shards
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PreparedShards(self.paths[index])
+        return pd.read_pickle(self.paths[index])
@@ -0,0 +1,65 @@
+"""Benchmark of TimeseriesPreparator._keep_last_dates against the previous groupby implementation.
+
+Usage (from the repository root):
+    PYTHONPATH=python-lib python tests/python/benchmarks/benchmark_keep_last_dates.py --timeseries-numbers 10000 100000 1000000
+"""
+from timeseries_preparation.preparation import TimeseriesPreparator
+from time import perf_counter
+import pandas as pd
+import numpy as np
+import argparse
+
+
+def generate_long_format_dataframe(timeseries_number, timeseries_length):
+    """Generate a long format dataframe sorted by identifiers and dates with timeseries_number daily timeseries"""
+    return pd.DataFrame(
+        {
+            "id": np.repeat(np.arange(timeseries_number), timeseries_length),
+            "date": np.tile(pd.date_range("2021-01-01", periods=timeseries_length, freq="D").values, timeseries_number),
+            "target": np.random.rand(timeseries_number * timeseries_length),
+        }
+    )
+
+
+def groupby_keep_last_dates(df, timeseries_identifiers_names, max_timeseries_length):
+    """Previous implementation of _keep_last_dates in long format"""
+    return df.groupby(timeseries_identifiers_names).apply(lambda x: x.tail(max_timeseries_length)).reset_index(drop=True)
+
+
+def run_benchmark(timeseries_numbers, timeseries_length, max_timeseries_length, skip_groupby_above):
+    preparator = TimeseriesPreparator(
+        time_column_name="date",
+        frequency="D",
+        target_columns_names=["target"],
+        timeseries_identifiers_names=["id"],
+        max_timeseries_length=max_timeseries_length,
+    )
+    print(f"{'time series':>12} {'rows':>12} {'groupby (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for timeseries_number in timeseries_numbers:
+        df = generate_long_format_dataframe(timeseries_number, timeseries_length)
+
+        start = perf_counter()
+        df_vectorized = preparator._keep_last_dates(df)
+        vectorized_time = perf_counter() - start
+
+        groupby_time = np.nan
+        if timeseries_number <= skip_groupby_above:
+            start = perf_counter()
+            df_groupby = groupby_keep_last_dates(df, ["id"], max_timeseries_length)
+            groupby_time = perf_counter() - start
+            pd.testing.assert_frame_equal(df_vectorized, df_groupby)
+
+        if np.isnan(groupby_time):
+            print(f"{timeseries_number:>12} {len(df.index):>12} {'skipped':>12} {vectorized_time:>15.3f} {'-':>8}")
+        else:
+            print(f"{timeseries_number:>12} {len(df.index):>12} {groupby_time:>12.2f} {vectorized_time:>15.3f} {groupby_time / vectorized_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeseries-numbers", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--timeseries-length", type=int, default=10)
+    parser.add_argument("--max-timeseries-length", type=int, default=5)
+    parser.add_argument("--skip-groupby-above", type=int, default=100000, help="Skip the (slow) groupby implementation above this number of time series")
+    args = parser.parse_args()
+    run_benchmark(args.timeseries_numbers, args.timeseries_length, args.max_timeseries_length, args.skip_groupby_above)
@@ -0,0 +1,64 @@
+"""Benchmark of SeasonalTrendPredictor.predict_item against the previous implementation calling get_prediction for each alpha.
+
+Usage (from the repository root):
+    PYTHONPATH=python-lib python tests/python/benchmarks/benchmark_seasonal_trend_prediction.py --timeseries-number 200
+"""
+from gluonts_forecasts.custom_models.seasonal_trend import SeasonalTrendEstimator
+from gluonts.dataset.common import ListDataset
+from constants import TIMESERIES_KEYS
+from time import perf_counter
+import numpy as np
+import argparse
+
+
+def generate_seasonal_timeseries(timeseries_number, timeseries_length, season_length):
+    """Generate timeseries_number noisy seasonal timeseries with a trend"""
+    time_steps = np.arange(timeseries_length)
+    return [
+        {
+            TIMESERIES_KEYS.START: "2021-01-01 00:00:00",
+            TIMESERIES_KEYS.TARGET: 0.05 * time_steps + np.sin(2 * np.pi * time_steps / season_length) + np.random.rand(timeseries_length),
+        }
+        for i in range(timeseries_number)
+    ]
+
+
+def alpha_loop_predict_item(item, trained_model, prediction_length):
+    """Previous implementation of SeasonalTrendPredictor.predict_item samples"""
+    target_length = len(item[TIMESERIES_KEYS.TARGET])
+    samples = []
+    for alpha in np.arange(0.02, 1.01, 0.02):
+        predictions = trained_model.get_prediction(start=target_length, end=target_length + prediction_length - 1)
+        confidence_intervals = predictions.conf_int(alpha=alpha)
+        samples += [confidence_intervals["lower"].values, confidence_intervals["upper"].values]
+    return np.stack(samples)
+
+
+def run_benchmark(timeseries_number, timeseries_length, season_length, prediction_length):
+    gluon_dataset = ListDataset(generate_seasonal_timeseries(timeseries_number, timeseries_length, season_length), freq="D")
+    predictor = SeasonalTrendEstimator(prediction_length=prediction_length, freq="D", season_length=season_length).train(gluon_dataset)
+    items = list(gluon_dataset)
+
+    start = perf_counter()
+    alpha_loop_samples = [alpha_loop_predict_item(item, trained_model, prediction_length) for item, trained_model in zip(items, predictor.trained_models)]
+    alpha_loop_time = perf_counter() - start
+
+    start = perf_counter()
+    samples = [predictor.predict_item(item, trained_model).samples for item, trained_model in zip(items, predictor.trained_models)]
+    single_prediction_time = perf_counter() - start
+
+    for expected, actual in zip(alpha_loop_samples, samples):
+        np.testing.assert_allclose(actual, expected, rtol=1e-12)
+
+    print(f"{'time series':>12} {'alpha loop (s)':>15} {'single prediction (s)':>22} {'speedup':>8}")
+    print(f"{timeseries_number:>12} {alpha_loop_time:>15.2f} {single_prediction_time:>22.3f} {alpha_loop_time / single_prediction_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeseries-number", type=int, default=200)
+    parser.add_argument("--timeseries-length", type=int, default=100)
+    parser.add_argument("--season-length", type=int, default=7)
+    parser.add_argument("--prediction-length", type=int, default=7)
+    args = parser.parse_args()
+    run_benchmark(args.timeseries_number, args.timeseries_length, args.season_length, args.prediction_length)
@@ -1,9 +1,11 @@
-from gluonts_forecasts.custom_models.autoarima import AutoARIMAPredictor, AutoARIMAEstimator
+from gluonts_forecasts.custom_models.autoarima import AutoARIMAPredictor, AutoARIMAEstimator, CompactAutoARIMAModel, AutoARIMAParameterError
 from gluonts.evaluation.backtest import make_evaluation_predictions
 from gluonts.evaluation import Evaluator
 from constants import TIMESERIES_KEYS
 from gluonts.dataset.common import ListDataset
 import numpy as np
+import pmdarima as pm
+import dill
 import pytest
 
 
@@ -81,3 +83,103 @@ class TestAutoARIMATrain:
         evaluator = Evaluator()
         agg_metrics, item_metrics = evaluator(iter(timeseries), iter(forecasts), num_series=len(gluon_dataset))
         assert agg_metrics["MAPE"] is not None
+
+    def test_parallel_training(self):
+        prediction_length = 2
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries * 3, freq=frequency)
+        sequential_predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2).train(gluon_dataset)
+        parallel_predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, n_jobs=2, chunksize=2).train(gluon_dataset)
+        assert len(parallel_predictor.trained_models) == 6
+        for sequential_model, parallel_model in zip(sequential_predictor.trained_models, parallel_predictor.trained_models):
+            assert sequential_model.order == parallel_model.order
+            assert np.allclose(sequential_model.params(), parallel_model.params())
+
+    def test_training_failures_collected(self):
+        prediction_length = 2
+        frequency = "12H"
+        failing_target = np.array([1, 2, np.nan, 4, 3, 2, 3, 3])
+        timeseries = [dict(self.timeseries[0], identifiers={"store": 1}), dict(self.timeseries[0], target=failing_target, identifiers={"store": 2})]
+        gluon_dataset = ListDataset(timeseries, freq=frequency)
+        estimator = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency)
+        predictor = estimator.train(gluon_dataset)
+        assert predictor.trained_models[1] is None
+        assert len(estimator.failed_timeseries) == 1
+        assert estimator.failed_timeseries[0][TIMESERIES_KEYS.IDENTIFIERS] == {"store": 2}
+        forecasts = list(predictor.predict(gluon_dataset))
+        assert (forecasts[1].quantile(0.5) == 3).all()
+        with pytest.raises(ValueError, match="AutoARIMA training failed on all time series"):
+            AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency).train(ListDataset(timeseries[1:], freq=frequency))
+
+    def test_bad_season_length_not_collected(self):
+        prediction_length = 2
+        frequency = "12H"
+        timeseries = [dict(self.timeseries[0], identifiers={"store": 1}), dict(self.timeseries[0], target=np.array([1, 2, 3]), identifiers={"store": 2})]
+        gluon_dataset = ListDataset(timeseries, freq=frequency)
+        for n_jobs in [1, 2]:
+            estimator = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=4, n_jobs=n_jobs)
+            with pytest.raises(AutoARIMAParameterError, match="Seasonality of AutoARIMA can't be set to 4"):
+                estimator.train(gluon_dataset)
+
+    def test_confidence_intervals_parity(self):
+        prediction_length = 3
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries, freq=frequency)
+        for estimator_kwargs in [{"season_length": 2}, {"season_length": 4, "use_feat_dynamic_real": True}]:
+            predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, **estimator_kwargs).train(gluon_dataset)
+            for item, trained_model in zip(gluon_dataset, predictor.trained_models):
+                external_features = predictor._set_prediction_external_features(item)
+                expected_samples = []
+                for alpha in np.arange(0.02, 1.01, 0.02):
+                    confidence_intervals = trained_model.predict(n_periods=prediction_length, X=external_features, return_conf_int=True, alpha=alpha)[1]
+                    expected_samples += [confidence_intervals[:, 0], confidence_intervals[:, 1]]
+                samples = predictor.predict_item(item, trained_model).samples
+                assert samples.shape == (100, prediction_length)
+                np.testing.assert_allclose(samples, np.stack(expected_samples), rtol=1e-9, atol=1e-9)
+
+    def test_compact_serialization(self):
+        prediction_length = 2
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries, freq=frequency)
+        for use_feat_dynamic_real in [False, True]:
+            predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, use_feat_dynamic_real=use_feat_dynamic_real).train(
+                gluon_dataset
+            )
+            unpickled_predictor = dill.loads(dill.dumps(predictor))
+            assert all(isinstance(trained_model, CompactAutoARIMAModel) for trained_model in unpickled_predictor.trained_models)
+            assert len(dill.dumps(unpickled_predictor)) < len(dill.dumps(predictor.trained_models)) / 2
+            for forecast, expected_forecast in zip(unpickled_predictor.predict(gluon_dataset), predictor.predict(gluon_dataset)):
+                np.testing.assert_allclose(forecast.samples, expected_forecast.samples, rtol=1e-6, atol=1e-9)
+
+    def test_compact_model_sarimax_arguments(self):
+        prediction_length = 2
+        frequency = "12H"
+        item = next(iter(ListDataset([self.timeseries[0]], freq=frequency)))
+        target = item[TIMESERIES_KEYS.TARGET].astype(float)
+        predictor = AutoARIMAPredictor(prediction_length=prediction_length, freq=frequency, trained_models=[])
+        for arima_kwargs in [{"order": (1, 0, 0)}, {"order": (1, 1, 0), "with_intercept": False}, {"order": (0, 0, 1), "seasonal_order": (1, 0, 0, 2), "trend": "ct"}]:
+            trained_model = pm.ARIMA(**arima_kwargs).fit(target)
+            compact_model = CompactAutoARIMAModel.from_trained_model(trained_model)
+            expected_kwargs = trained_model.arima_res_.model._get_init_kwds()
+            for key, value in compact_model.sarimax_kwargs.items():
+                assert value == expected_kwargs[key]
+            np.testing.assert_allclose(
+                predictor.predict_item(item, compact_model).samples, predictor.predict_item(item, trained_model).samples, rtol=1e-6, atol=1e-9
+            )
+
+    def test_retrain_reuses_evaluation_orders(self):
+        prediction_length = 2
+        frequency = "12H"
+        evaluation_dataset = ListDataset([dict(timeseries, target=timeseries[TIMESERIES_KEYS.TARGET][:-prediction_length]) for timeseries in self.timeseries], freq=frequency)
+        full_dataset = ListDataset(self.timeseries, freq=frequency)
+        evaluation_predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2).train(evaluation_dataset)
+        predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, reuse_evaluation_orders="True").retrain(
+            full_dataset, evaluation_predictor
+        )
+        for evaluation_model, model in zip(evaluation_predictor.trained_models, predictor.trained_models):
+            assert model.order == evaluation_model.order and model.seasonal_order == evaluation_model.seasonal_order
+            assert model.nobs_ == evaluation_model.nobs_ + prediction_length
+        searched_predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2).retrain(full_dataset, evaluation_predictor)
+        expected_predictor = AutoARIMAEstimator(prediction_length=prediction_length, freq=frequency, season_length=2).train(full_dataset)
+        for searched_model, expected_model in zip(searched_predictor.trained_models, expected_predictor.trained_models):
+            assert searched_model.order == expected_model.order
@@ -0,0 +1,46 @@
+from gluonts.evaluation import Evaluator
+from gluonts.model.forecast import SampleForecast
+from gluonts_forecasts.evaluator import BatchEvaluator
+from gluonts_forecasts.utils import reduce_forecasts_to_quantiles
+import pandas as pd
+import numpy as np
+import pytest
+
+
+class TestBatchEvaluator:
+    def setup_class(self):
+        rng = np.random.RandomState(0)
+        self.prediction_length = 3
+        self.targets = []
+        for i in range(20):
+            target = rng.rand(rng.randint(1, 15) + self.prediction_length).astype(np.float32)
+            if i % 4 == 0:
+                target[rng.rand(len(target)) < 0.3] = np.nan
+            if i % 5 == 0:
+                target[-self.prediction_length :] = np.nan
+            if i % 6 == 0:
+                target[-self.prediction_length :] = 0
+            self.targets.append(target)
+        self.samples = [rng.rand(100, self.prediction_length).astype(np.float32) for _ in self.targets]
+
+    @pytest.mark.parametrize("frequency,seasonality", [("D", None), ("12H", None), ("D", 3)])
+    def test_same_metrics_as_gluonts_evaluator(self, frequency, seasonality):
+        timeseries = [pd.DataFrame(index=pd.date_range("2021-01-01", periods=len(target), freq=frequency), data=target) for target in self.targets]
+        forecasts = [
+            SampleForecast(samples=samples, start_date=series.index[-self.prediction_length], freq=frequency) for samples, series in zip(self.samples, timeseries)
+        ]
+        expected_agg_metrics, expected_item_metrics = Evaluator(seasonality=seasonality, num_workers=0)(iter(timeseries), iter(forecasts))
+
+        evaluator = BatchEvaluator(seasonality=seasonality)
+        forecasts_arrays, _ = reduce_forecasts_to_quantiles(iter(forecasts), evaluator.forecast_keys)
+        agg_metrics, item_metrics = evaluator.evaluate_batch(
+            np.stack([target[-self.prediction_length :] for target in self.targets]),
+            [target[: -self.prediction_length] for target in self.targets],
+            np.stack(forecasts_arrays),
+            freq=frequency,
+        )
+
+        pd.testing.assert_frame_equal(item_metrics, expected_item_metrics, rtol=1e-5)
+        assert agg_metrics.keys() == expected_agg_metrics.keys()
+        for metric, expected_value in expected_agg_metrics.items():
+            assert np.isclose(agg_metrics[metric], expected_value, rtol=1e-5, equal_nan=True)
@@ -1,4 +1,4 @@
-from gluonts_forecasts.gluon_dataset import GluonDataset
+from gluonts_forecasts.gluon_dataset import GluonDataset, save_lazy_list_dataset, load_lazy_list_dataset
 from constants import TIMESERIES_KEYS
 import pandas as pd
 import numpy as np
@@ -43,3 +43,82 @@ class TestGluonDataset:
 
     def test_timeseries_identifiers(self):
         assert self.gluon_list_dataset.list_data[2][TIMESERIES_KEYS.IDENTIFIERS] == {"store": 1, "item": 2}
+
+    def test_categorical_timeseries_identifiers(self):
+        df = self.df.astype({"store": "category", "item": pd.CategoricalDtype(categories=[1, 2, 3])})
+        gluon_dataset = GluonDataset(
+            dataframe=df,
+            time_column_name="date",
+            frequency="D",
+            target_columns_names=["volume"],
+            timeseries_identifiers_names=["store", "item"],
+            min_length=2,
+        )
+        gluon_list_dataset = gluon_dataset.create_list_datasets(cut_lengths=[0])[0]
+        assert len(gluon_list_dataset.list_data) == 2
+        assert gluon_list_dataset.list_data[1][TIMESERIES_KEYS.IDENTIFIERS] == {"store": 1, "item": 2}
+
+    def test_cut_lengths_share_buffers(self):
+        gluon_list_datasets = self.gluon_dataset.create_list_datasets(cut_lengths=[1, 0])
+        evaluation_timeseries, full_timeseries = gluon_list_datasets[0].list_data[2], gluon_list_datasets[1].list_data[2]
+        assert (evaluation_timeseries[TIMESERIES_KEYS.TARGET] == np.array([5, 2])).all()
+        assert (evaluation_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == np.array([[0, 1], [1, 0]])).all()
+        assert np.shares_memory(evaluation_timeseries[TIMESERIES_KEYS.TARGET], full_timeseries[TIMESERIES_KEYS.TARGET])
+        assert np.shares_memory(evaluation_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL], full_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL])
+
+    def test_unsorted_dataframe(self):
+        gluon_dataset = GluonDataset(
+            dataframe=self.df.iloc[[3, 0, 4, 1, 5, 2]],
+            time_column_name="date",
+            frequency="D",
+            target_columns_names=["volume", "revenue"],
+            timeseries_identifiers_names=["store", "item"],
+            external_features_columns_names=["is_holiday", "is_weekend"],
+            min_length=2,
+        )
+        gluon_list_dataset = gluon_dataset.create_list_datasets(cut_lengths=[0])[0]
+        for timeseries, expected_timeseries in zip(gluon_list_dataset.list_data, self.gluon_list_dataset.list_data):
+            assert timeseries[TIMESERIES_KEYS.START] == expected_timeseries[TIMESERIES_KEYS.START]
+            assert timeseries[TIMESERIES_KEYS.IDENTIFIERS] == expected_timeseries[TIMESERIES_KEYS.IDENTIFIERS]
+            assert (timeseries[TIMESERIES_KEYS.TARGET] == expected_timeseries[TIMESERIES_KEYS.TARGET]).all()
+            assert (timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == expected_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]).all()
+
+    def test_external_features_shared_by_targets(self):
+        volume_timeseries, revenue_timeseries = self.gluon_list_dataset.list_data[0], self.gluon_list_dataset.list_data[1]
+        assert volume_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] is revenue_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]
+
+    def test_lazy_list_datasets(self):
+        lazy_list_dataset = self.gluon_dataset.create_lazy_list_datasets(cut_lengths=[0])[0]
+        assert len(lazy_list_dataset) == len(lazy_list_dataset.list_data) == 4
+        assert lazy_list_dataset.process.trans[0].freq == "D"
+        for index, expected_timeseries in enumerate(self.gluon_list_dataset.list_data):
+            for timeseries in [lazy_list_dataset.list_data[index], lazy_list_dataset.list_data[index - 4]]:
+                assert timeseries[TIMESERIES_KEYS.START] == expected_timeseries[TIMESERIES_KEYS.START]
+                assert timeseries[TIMESERIES_KEYS.TARGET_NAME] == expected_timeseries[TIMESERIES_KEYS.TARGET_NAME]
+                assert timeseries[TIMESERIES_KEYS.IDENTIFIERS] == expected_timeseries[TIMESERIES_KEYS.IDENTIFIERS]
+                assert (timeseries[TIMESERIES_KEYS.TARGET] == expected_timeseries[TIMESERIES_KEYS.TARGET]).all()
+        with pytest.raises(IndexError):
+            lazy_list_dataset.list_data[4]
+
+    def test_lazy_list_datasets_iterated_every_epoch(self):
+        evaluation_lazy_list_dataset = self.gluon_dataset.create_lazy_list_datasets(cut_lengths=[1, 0])[0]
+        for epoch in range(2):
+            entries = list(evaluation_lazy_list_dataset)
+            assert len(entries) == 4
+            assert (entries[2][TIMESERIES_KEYS.TARGET] == np.array([5, 2])).all()
+            assert entries[2][TIMESERIES_KEYS.START] == pd.Timestamp("2018-01-06")
+
+    def test_save_and_load_lazy_list_dataset(self, tmp_path):
+        lazy_list_dataset = self.gluon_dataset.create_lazy_list_datasets(cut_lengths=[0])[0]
+        save_lazy_list_dataset(lazy_list_dataset, str(tmp_path))
+        loaded_lazy_list_dataset = load_lazy_list_dataset(str(tmp_path))
+        assert len(loaded_lazy_list_dataset) == 4
+        assert loaded_lazy_list_dataset.process.trans[0].freq == "D"
+        for timeseries, expected_timeseries in zip(loaded_lazy_list_dataset.list_data, self.gluon_list_dataset.list_data):
+            assert isinstance(timeseries[TIMESERIES_KEYS.TARGET], np.memmap)
+            assert timeseries[TIMESERIES_KEYS.START] == expected_timeseries[TIMESERIES_KEYS.START]
+            assert timeseries[TIMESERIES_KEYS.TARGET_NAME] == expected_timeseries[TIMESERIES_KEYS.TARGET_NAME]
+            assert timeseries[TIMESERIES_KEYS.IDENTIFIERS] == expected_timeseries[TIMESERIES_KEYS.IDENTIFIERS]
+            assert timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES] == expected_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES]
+            assert (timeseries[TIMESERIES_KEYS.TARGET] == expected_timeseries[TIMESERIES_KEYS.TARGET]).all()
+            assert (timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == expected_timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]).all()
@@ -1,6 +1,8 @@
 from gluonts.dataset.common import ListDataset
+from gluonts_forecasts.gluon_dataset import GluonDataset, save_lazy_list_dataset, load_lazy_list_dataset
 from timeseries_preparation.preparation import assert_time_column_valid
-from gluonts_forecasts.utils import add_future_external_features
+from gluonts_forecasts.utils import add_future_external_features, quantile_forecasts_arrays, reduce_forecasts_to_quantiles
+from gluonts.model.forecast import SampleForecast, QuantileForecast
 from constants import TIMESERIES_KEYS
 import pandas as pd
 import numpy as np
@@ -167,3 +169,96 @@ def test_add_future_external_features_with_identifiers():
     gluon_dataset = add_future_external_features(gluon_train_dataset, external_features_future_df, prediction_length, frequency)
 
     assert (gluon_dataset.list_data[0][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == np.array([[1, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 1, 1, 1, 0, 0]])).all()
+
+
+def test_add_future_external_features_shared_by_targets():
+    frequency = "D"
+    external_features = np.array([[1, 0, 0, 0, 0], [0, 0, 0, 1, 1]])
+    timeseries = [
+        {
+            TIMESERIES_KEYS.START: "2018-01-01",
+            TIMESERIES_KEYS.TARGET: np.array([12, 13, 14, 15, 16]) * (target_index + 1),
+            TIMESERIES_KEYS.TARGET_NAME: f"sales_{target_index}",
+            TIMESERIES_KEYS.TIME_COLUMN_NAME: "date",
+            TIMESERIES_KEYS.FEAT_DYNAMIC_REAL: external_features,
+            TIMESERIES_KEYS.FEAT_DYNAMIC_REAL_COLUMNS_NAMES: ["is_holiday", "is_weekend"],
+            TIMESERIES_KEYS.IDENTIFIERS: {"store": 1},
+        }
+        for target_index in range(2)
+    ]
+    gluon_train_dataset = ListDataset(timeseries, freq=frequency)
+    external_features_future_df = pd.DataFrame(
+        {"date": ["2018-01-06", "2018-01-07"], "store": [1, 1], "is_holiday": [0, 1], "is_weekend": [1, 0]}
+    )
+    external_features_future_df["date"] = pd.to_datetime(external_features_future_df["date"]).dt.tz_localize(tz=None)
+
+    gluon_dataset = add_future_external_features(gluon_train_dataset, external_features_future_df, 2, frequency)
+
+    expected_external_features = np.array([[1, 0, 0, 0, 0, 0, 1], [0, 0, 0, 1, 1, 1, 0]])
+    assert (gluon_dataset.list_data[0][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == expected_external_features).all()
+    assert gluon_dataset.list_data[1][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] is gluon_dataset.list_data[0][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]
+    assert gluon_train_dataset.list_data[0][TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] is external_features
+
+
+def test_quantile_forecasts_arrays_parity():
+    quantiles = [0.1, 0.5, 0.9]
+    forecasts_list = [
+        SampleForecast(samples=np.random.rand(num_samples, prediction_length), start_date=pd.Timestamp("2018-01-01"), freq="D")
+        for num_samples, prediction_length in [(100, 3), (100, 3), (1, 3), (100, 5), (100, 3)]
+    ]
+    forecasts_list.append(
+        QuantileForecast(forecast_arrays=np.random.rand(3, 3), start_date=pd.Timestamp("2018-01-01"), freq="D", forecast_keys=["0.1", "0.5", "0.9"])
+    )
+    quantiles_arrays = quantile_forecasts_arrays(forecasts_list, quantiles, batch_size=2)
+    for forecast, forecast_quantiles in zip(forecasts_list, quantiles_arrays):
+        expected_quantiles = np.stack([forecast.quantile(quantile) for quantile in quantiles])
+        np.testing.assert_array_equal(forecast_quantiles, expected_quantiles)
+
+
+def test_reduce_forecasts_to_quantiles_by_batches():
+    quantiles = [0.1, 0.5, 0.9]
+    forecasts_list = [
+        SampleForecast(samples=np.random.rand(100, 3), start_date=pd.Timestamp("2018-01-01") + pd.Timedelta(days=i), freq="D") for i in range(5)
+    ]
+    quantiles_arrays, start_dates = reduce_forecasts_to_quantiles(iter(forecasts_list), quantiles, batch_size=2)
+    assert start_dates == [forecast.start_date for forecast in forecasts_list]
+    for forecast, forecast_quantiles in zip(forecasts_list, quantiles_arrays):
+        np.testing.assert_array_equal(forecast_quantiles, np.stack([forecast.quantile(quantile) for quantile in quantiles]))
+
+
+def test_add_future_external_features_on_loaded_lazy_dataset(tmp_path):
+    timeseries_number, train_length, prediction_length = 300, 3, 2
+    df = pd.DataFrame(
+        {
+            "date": np.tile(pd.date_range("2018-01-01", periods=train_length, freq="D"), timeseries_number),
+            "store": np.repeat(np.arange(timeseries_number), train_length),
+            "volume": np.arange(timeseries_number * train_length, dtype=float),
+            "revenue": np.arange(timeseries_number * train_length, dtype=float),
+            "store_feature": np.repeat(np.arange(timeseries_number), train_length),
+        }
+    )
+    gluon_dataset = GluonDataset(
+        dataframe=df,
+        time_column_name="date",
+        frequency="D",
+        target_columns_names=["volume", "revenue"],
+        timeseries_identifiers_names=["store"],
+        external_features_columns_names=["store_feature"],
+        min_length=2,
+    )
+    save_lazy_list_dataset(gluon_dataset.create_lazy_list_datasets(cut_lengths=[0])[0], str(tmp_path))
+    gluon_train_dataset = load_lazy_list_dataset(str(tmp_path))
+    external_features_future_df = pd.DataFrame(
+        {
+            "date": np.tile(pd.date_range("2018-01-04", periods=prediction_length, freq="D"), timeseries_number),
+            "store": np.repeat(np.arange(timeseries_number), prediction_length),
+            "store_feature": np.repeat(np.arange(timeseries_number), prediction_length),
+        }
+    )
+
+    gluon_dataset_with_future = add_future_external_features(gluon_train_dataset, external_features_future_df, prediction_length, "D")
+
+    assert len(gluon_dataset_with_future.list_data) == 2 * timeseries_number
+    for timeseries in gluon_dataset_with_future.list_data:
+        expected_external_features = np.full((1, train_length + prediction_length), timeseries[TIMESERIES_KEYS.IDENTIFIERS]["store"])
+        assert (timeseries[TIMESERIES_KEYS.FEAT_DYNAMIC_REAL] == expected_external_features).all()
@@ -1,4 +1,4 @@
-from gluonts_forecasts.custom_models.seasonal_trend import SeasonalTrendPredictor, SeasonalTrendEstimator
+from gluonts_forecasts.custom_models.seasonal_trend import SeasonalTrendPredictor, SeasonalTrendEstimator, CompactSeasonalTrendModel
 from statsmodels.tsa.exponential_smoothing.ets import ETSModel
 from statsmodels.tsa.arima.model import ARIMA
 from gluonts.evaluation.backtest import make_evaluation_predictions
@@ -6,6 +6,7 @@ from gluonts.evaluation import Evaluator
 from constants import TIMESERIES_KEYS
 from gluonts.dataset.common import ListDataset
 import numpy as np
+import dill
 import pytest
 
 
@@ -61,3 +62,44 @@ class TestSeasonalTrendTrain:
         evaluator = Evaluator()
         agg_metrics, item_metrics = evaluator(iter(timeseries), iter(forecasts), num_series=len(gluon_dataset))
         assert agg_metrics["MSE"] is not None
+
+    def test_confidence_intervals_parity(self):
+        prediction_length = 3
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries, freq=frequency)
+        for kwargs in [{"model": ETSModel}, {"model": ARIMA, "model_kwargs": {"order": (2, 1, 1)}}]:
+            predictor = SeasonalTrendEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, **kwargs).train(gluon_dataset)
+            for item, trained_model in zip(gluon_dataset, predictor.trained_models):
+                target_length = len(item[TIMESERIES_KEYS.TARGET])
+                expected_samples = []
+                for alpha in np.arange(0.02, 1.01, 0.02):
+                    predictions = trained_model.get_prediction(start=target_length, end=target_length + prediction_length - 1)
+                    confidence_intervals = predictions.conf_int(alpha=alpha)
+                    expected_samples += [confidence_intervals["lower"].values, confidence_intervals["upper"].values]
+                samples = predictor.predict_item(item, trained_model).samples
+                assert samples.shape == (100, prediction_length)
+                np.testing.assert_allclose(samples, np.stack(expected_samples), rtol=1e-12)
+
+    def test_parallel_training(self):
+        prediction_length = 2
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries * 3, freq=frequency)
+        sequential_predictor = SeasonalTrendEstimator(prediction_length=prediction_length, freq=frequency, season_length=2).train(gluon_dataset)
+        parallel_predictor = SeasonalTrendEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, n_jobs=2, chunksize=2).train(gluon_dataset)
+        assert len(parallel_predictor.trained_models) == 6
+        for item, sequential_model, parallel_model in zip(gluon_dataset, sequential_predictor.trained_models, parallel_predictor.trained_models):
+            np.testing.assert_allclose(
+                parallel_predictor.predict_item(item, parallel_model).samples, sequential_predictor.predict_item(item, sequential_model).samples
+            )
+
+    def test_compact_serialization(self):
+        prediction_length = 2
+        frequency = "12H"
+        gluon_dataset = ListDataset(self.timeseries, freq=frequency)
+        for kwargs in [{"model": ETSModel}, {"model": ARIMA, "model_kwargs": {"order": (2, 1, 1)}}]:
+            predictor = SeasonalTrendEstimator(prediction_length=prediction_length, freq=frequency, season_length=2, **kwargs).train(gluon_dataset)
+            unpickled_predictor = dill.loads(dill.dumps(predictor))
+            assert all(isinstance(trained_model, CompactSeasonalTrendModel) for trained_model in unpickled_predictor.trained_models)
+            assert len(dill.dumps(unpickled_predictor)) < len(dill.dumps(predictor.trained_models)) / 2
+            for forecast, expected_forecast in zip(unpickled_predictor.predict(gluon_dataset), predictor.predict(gluon_dataset)):
+                np.testing.assert_allclose(forecast.samples, expected_forecast.samples, rtol=1e-9)
@@ -0,0 +1,147 @@
+from timeseries_preparation.preparation import TimeseriesPreparator
+from timeseries_preparation.streaming import StreamingTimeseriesPreparator, LocalFileDataset
+from gluonts_forecasts.gluon_dataset import GluonDataset
+from constants import TIMESERIES_KEYS
+import pandas as pd
+import numpy as np
+import pytest
+import logging
+
+
+def create_csv_dataset(path, df):
+    df.to_csv(path, index=False)
+    return LocalFileDataset(str(path))
+
+
+class TestStreamingTimeseriesPreparator:
+    def setup_class(self):
+        self.df = pd.DataFrame(
+            {
+                "date": np.tile(pd.date_range("2021-01-01 10:00:00", periods=6, freq="D").astype(str), 5),
+                "id": np.repeat(["a", "b", "c", "d", "e"], 6),
+                "target": np.arange(30, dtype=float),
+                "unused": np.arange(30),
+            }
+        ).sample(frac=1, random_state=1)
+
+    def setup_method(self):
+        self.preparator = TimeseriesPreparator(
+            time_column_name="date",
+            frequency="D",
+            target_columns_names=["target"],
+            timeseries_identifiers_names=["id"],
+            max_timeseries_length=4,
+        )
+
+    def test_same_result_as_in_memory_preparation(self, tmp_path):
+        dataset = create_csv_dataset(tmp_path / "input.csv", self.df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7)
+        prepared_shards = streaming_preparator.prepare_timeseries_shards(dataset)
+        assert len(prepared_shards) > 1
+        dataframe_prepared = pd.concat(prepared_shards, ignore_index=True)
+        expected_dataframe_prepared = self.preparator.prepare_timeseries_dataframe(dataset.get_dataframe())
+        pd.testing.assert_frame_equal(dataframe_prepared, expected_dataframe_prepared)
+
+    def test_same_gluon_dataset_as_in_memory_preparation(self, tmp_path):
+        df = pd.DataFrame(
+            {
+                "date": np.tile(pd.date_range("2021-01-01", periods=5, freq="D").astype(str), 40),
+                "id": np.repeat(np.arange(40)[::-1], 5),
+                "store": np.repeat(np.arange(40) % 3, 5),
+                "target": np.arange(200, dtype=float),
+            }
+        ).sample(frac=1, random_state=2)
+        preparator = TimeseriesPreparator(time_column_name="date", frequency="D", target_columns_names=["target"], timeseries_identifiers_names=["store", "id"])
+        dataset = create_csv_dataset(tmp_path / "input.csv", df)
+        streaming_preparator = StreamingTimeseriesPreparator(preparator, str(tmp_path / "shards"), shards_number=4, chunksize=30)
+        list_datasets = []
+        for dataframe in [streaming_preparator.prepare_timeseries_shards(dataset), preparator.prepare_timeseries_dataframe(dataset.get_dataframe())]:
+            gluon_dataset = GluonDataset(
+                dataframe=dataframe,
+                time_column_name="date",
+                frequency="D",
+                target_columns_names=["target"],
+                timeseries_identifiers_names=["store", "id"],
+                min_length=2,
+            )
+            list_datasets.append(gluon_dataset.create_list_datasets(cut_lengths=[0])[0])
+        assert len(list_datasets[0].list_data) == len(list_datasets[1].list_data) == 40
+        for timeseries, expected_timeseries in zip(list_datasets[0].list_data, list_datasets[1].list_data):
+            assert timeseries[TIMESERIES_KEYS.IDENTIFIERS] == expected_timeseries[TIMESERIES_KEYS.IDENTIFIERS]
+            assert (timeseries[TIMESERIES_KEYS.TARGET] == expected_timeseries[TIMESERIES_KEYS.TARGET]).all()
+
+    def test_same_compact_dtypes_as_in_memory_preparation(self, tmp_path):
+        df = self.df.copy()
+        df.loc[df["id"] == "e", "target"] += 0.1
+        dataset = create_csv_dataset(tmp_path / "input.csv", df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7, compact_dtypes=True)
+        prepared_shards = streaming_preparator.prepare_timeseries_shards(dataset)
+        assert len(prepared_shards) > 1
+        assert all(shard_prepared["id"].dtype == prepared_shards[0]["id"].dtype for shard_prepared in prepared_shards)
+        dataframe_prepared = pd.concat(prepared_shards, ignore_index=True)
+        preparator = TimeseriesPreparator(
+            time_column_name="date", frequency="D", target_columns_names=["target"], timeseries_identifiers_names=["id"], max_timeseries_length=4
+        )
+        expected_dataframe_prepared = preparator.prepare_timeseries_dataframe(dataset.get_dataframe())
+        expected_dataframe_compacted = preparator.compact_dtypes(expected_dataframe_prepared.copy())
+        pd.testing.assert_frame_equal(dataframe_prepared, expected_dataframe_compacted)
+        assert dataframe_prepared["target"].dtype == "float64"
+        assert self.preparator.original_dtypes == preparator.original_dtypes
+        pd.testing.assert_frame_equal(self.preparator.restore_dtypes(dataframe_prepared), expected_dataframe_prepared)
+
+    def test_logs_aggregated_over_shards(self, tmp_path, caplog):
+        dataset = create_csv_dataset(tmp_path / "input.csv", self.df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7)
+        with caplog.at_level(logging.INFO):
+            prepared_shards = streaming_preparator.prepare_timeseries_shards(dataset)
+        assert len(prepared_shards) > 1
+        lengths_messages = [record.getMessage() for record in caplog.records if "time series of" in record.getMessage()]
+        assert len(lengths_messages) == 2
+        assert lengths_messages[0].endswith("Found  5 time series of 6 records")
+        assert lengths_messages[1].endswith("Sampled 4 5 time series of 4 records")
+
+    def test_same_shards_for_identifiers_of_different_dtypes(self, tmp_path):
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3)
+        integer_identifiers = pd.DataFrame({"id": [1, 2, 3, 4, 5]})
+        string_identifiers = pd.DataFrame({"id": ["1", "2", "3", "4", "5"]})
+        pd.testing.assert_series_equal(
+            streaming_preparator._get_shards_indices(integer_identifiers), streaming_preparator._get_shards_indices(string_identifiers)
+        )
+
+    def test_irregular_timeseries_across_shards(self, tmp_path):
+        df = self.df[~((self.df["id"].isin(["a", "d"])) & (self.df["date"] == "2021-01-03 10:00:00"))]
+        dataset = create_csv_dataset(tmp_path / "input.csv", df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7)
+        with pytest.raises(ValueError, match="Found 2 invalid time series"):
+            streaming_preparator.prepare_timeseries_shards(dataset)
+
+    def test_timeseries_in_single_shard(self, tmp_path):
+        dataset = create_csv_dataset(tmp_path / "input.csv", self.df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7)
+        streaming_preparator.write_shards(dataset)
+        shards_identifiers = [set(streaming_preparator._read_shard(shard_path)["id"]) for shard_path in streaming_preparator.shards_paths]
+        assert sum(len(identifiers) for identifiers in shards_identifiers) == 5
+        assert set.union(*shards_identifiers) == {"a", "b", "c", "d", "e"}
+
+    def test_duplicate_dates_across_chunks(self, tmp_path):
+        df = pd.DataFrame({"date": ["2021-01-01", "2021-01-02", "2021-01-03", "2021-01-01"], "id": [1, 1, 1, 1], "target": [1, 2, 3, 4]})
+        dataset = create_csv_dataset(tmp_path / "input.csv", df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), chunksize=2)
+        with pytest.raises(ValueError, match="Input dataset has 2 duplicate dates."):
+            streaming_preparator.prepare_timeseries_shards(dataset)
+
+    def test_gluon_dataset_from_shards(self, tmp_path):
+        dataset = create_csv_dataset(tmp_path / "input.csv", self.df)
+        streaming_preparator = StreamingTimeseriesPreparator(self.preparator, str(tmp_path / "shards"), shards_number=3, chunksize=7)
+        gluon_dataset = GluonDataset(
+            dataframe=streaming_preparator.prepare_timeseries_shards(dataset),
+            time_column_name="date",
+            frequency="D",
+            target_columns_names=["target"],
+            timeseries_identifiers_names=["id"],
+            min_length=2,
+        )
+        gluon_list_dataset = gluon_dataset.create_list_datasets(cut_lengths=[0])[0]
+        targets = {timeseries[TIMESERIES_KEYS.IDENTIFIERS]["id"]: timeseries[TIMESERIES_KEYS.TARGET] for timeseries in gluon_list_dataset.list_data}
+        assert len(targets) == 5
+        assert (targets["b"] == np.array([8, 9, 10, 11])).all()
@@ -1,5 +1,7 @@
-from timeseries_preparation.preparation import TimeseriesPreparator
+from timeseries_preparation.preparation import TimeseriesPreparator, truncate_to_end_of_week, truncate_to_end_of_month
+from timeseries_preparation.h2g2 import H2G2
 import pandas as pd
+import numpy as np
 import pytest
 
 
@@ -23,7 +25,24 @@ def test_duplicate_dates():
         frequency=frequency,
     )
     with pytest.raises(ValueError):
-        dataframe_prepared = preparator._truncate_dates(df)
+        dataframe_prepared = preparator._truncate_dates(preparator._sort(df))
+
+
+def test_duplicate_dates_before_and_after_truncation():
+    df = pd.DataFrame(
+        {
+            "date": ["2021-01-01 12:00:00", "2021-01-01 12:00:00", "2021-01-01 18:00:00", "2021-01-01 12:00:00", "2021-01-01 18:00:00"],
+            "id": [1, 1, 1, 2, 2],
+        }
+    )
+    df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(tz=None)
+    preparator = TimeseriesPreparator(time_column_name="date", frequency="D", timeseries_identifiers_names=["id"])
+    with pytest.raises(ValueError, match="Input dataset has 2 duplicate dates.$"):
+        preparator._truncate_dates(preparator._sort(df))
+
+    df_without_raw_duplicates = df.drop(index=1)
+    with pytest.raises(ValueError, match="Input dataset has 4 duplicate dates after truncation to 'D' frequency"):
+        preparator._truncate_dates(preparator._sort(df_without_raw_duplicates))
 
 
 def test_minutes_truncation():
@@ -46,8 +65,8 @@ def test_minutes_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2021-01-01  12:15:00")
@@ -79,8 +98,8 @@ def test_hour_truncation():
         timeseries_identifiers_names=timeseries_identifiers_names,
         max_timeseries_length=2,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
     dataframe_prepared = preparator._keep_last_dates(dataframe_prepared)
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2020-01-07 16:00:00")
@@ -107,8 +126,8 @@ def test_day_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2021-01-01")
@@ -135,8 +154,8 @@ def test_business_day_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2021-01-04")
@@ -164,8 +183,8 @@ def test_week_sunday_truncation():
         timeseries_identifiers_names=timeseries_identifiers_names,
         max_timeseries_length=2,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     dataframe_prepared = preparator._keep_last_dates(dataframe_prepared)
@@ -193,8 +212,8 @@ def test_quarter_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2020-12-31")
@@ -221,8 +240,8 @@ def test_semester_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2020-12-31")
@@ -250,10 +269,155 @@ def test_year_truncation():
         frequency=frequency,
         timeseries_identifiers_names=timeseries_identifiers_names,
     )
-    dataframe_prepared = preparator._truncate_dates(df)
-    dataframe_prepared = preparator._sort(dataframe_prepared)
+    dataframe_prepared = preparator._sort(df)
+    dataframe_prepared = preparator._truncate_dates(dataframe_prepared)
     preparator._check_regular_frequency(dataframe_prepared)
 
     assert dataframe_prepared[time_column_name][0] == pd.Timestamp("2020-12-31")
     assert dataframe_prepared[time_column_name][1] == pd.Timestamp("2021-12-31")
-    assert dataframe_prepared[time_column_name][2] == pd.Timestamp("2022-12-31")
\ No newline at end of file
+    assert dataframe_prepared[time_column_name][2] == pd.Timestamp("2022-12-31")
+
+
+def test_end_of_week_and_month_truncation_parity_with_offsets():
+    time_column = pd.Series(pd.date_range("1967-12-25 05:00:00", "1972-03-05 23:00:00", freq="7H"), name="date")
+    edge_dates = pd.Series(pd.to_datetime(["2000-02-29 23:59:59", "2020-12-31 00:00:00", "2021-01-03 12:00:00"]), name="date")
+    time_column = pd.concat([time_column, edge_dates], ignore_index=True)
+    for weekday in range(7):
+        expected = time_column.dt.floor("D") + pd.offsets.Week(weekday=weekday, n=0)
+        pd.testing.assert_series_equal(truncate_to_end_of_week(time_column, weekday), expected)
+    expected = time_column.dt.floor("D") + pd.offsets.MonthEnd(n=0)
+    pd.testing.assert_series_equal(truncate_to_end_of_month(time_column), expected)
+
+
+def test_regular_frequency_multiple_timeseries():
+    df = pd.DataFrame(
+        {
+            "date": [
+                "2021-01-31",
+                "2021-02-28",
+                "2021-03-31",
+                "2020-11-30",
+                "2020-12-31",
+                "2021-01-31",
+                "2021-02-28",
+            ],
+            "store": [1, 1, 1, 2, 2, 2, 2],
+            "item": ["a", "a", "a", "a", "a", "a", "a"],
+        }
+    )
+    time_column_name = "date"
+    df[time_column_name] = pd.to_datetime(df[time_column_name]).dt.tz_localize(tz=None)
+    preparator = TimeseriesPreparator(
+        time_column_name=time_column_name,
+        frequency="M",
+        timeseries_identifiers_names=["store", "item"],
+    )
+    dataframe_prepared = preparator._sort(df)
+    preparator._check_regular_frequency(dataframe_prepared)
+
+
+def test_irregular_frequency_error_identifiers():
+    df = pd.DataFrame(
+        {
+            "date": [
+                "2021-01-01",
+                "2021-01-02",
+                "2021-01-03",
+                "2021-01-01",
+                "2021-01-03",
+                "2021-01-04",
+                "2021-01-02",
+                "2021-01-03",
+            ],
+            "id": [1, 1, 1, 2, 2, 2, 3, 3],
+        }
+    )
+    time_column_name = "date"
+    df[time_column_name] = pd.to_datetime(df[time_column_name]).dt.tz_localize(tz=None)
+    preparator = TimeseriesPreparator(
+        time_column_name=time_column_name,
+        frequency="D",
+        timeseries_identifiers_names=["id"],
+    )
+    dataframe_prepared = preparator._sort(df)
+    with pytest.raises(ValueError, match="1 invalid time series with identifiers: \\[{'id': 2}\\]"):
+        preparator._check_regular_frequency(dataframe_prepared)
+
+
+def test_low_memory_preparation():
+    df = pd.DataFrame(
+        {
+            "date": ["2021-01-03", "2021-01-01", "2021-01-02", "2021-01-01", "2021-01-02"],
+            "id": [1, 1, 1, 2, 2],
+            "target": [3, 1, 2, 4, 5],
+            "unused": ["c", "a", "b", "d", "e"],
+        }
+    )
+    df_input = df.copy()
+    preparator_kwargs = {"time_column_name": "date", "frequency": "D", "target_columns_names": ["target"], "timeseries_identifiers_names": ["id"]}
+    dataframe_prepared = TimeseriesPreparator(**preparator_kwargs).prepare_timeseries_dataframe(df)
+    dataframe_prepared_low_memory = TimeseriesPreparator(low_memory=True, **preparator_kwargs).prepare_timeseries_dataframe(df)
+
+    pd.testing.assert_frame_equal(df, df_input)
+    assert list(dataframe_prepared_low_memory.columns) == ["date", "id", "target"]
+    pd.testing.assert_frame_equal(dataframe_prepared_low_memory, dataframe_prepared[["date", "id", "target"]])
+
+
+def test_parallel_preparation():
+    df = pd.DataFrame(
+        {
+            "date": ["2021-01-01 12:00:00", "2021-01-02 12:00:00", "2021-01-03 12:00:00"] * 4,
+            "id": [4, 4, 4, 3, 3, 3, 2, 2, 2, 1, 1, 1],
+            "target": range(12),
+        }
+    )
+    preparator_parameters = {
+        "time_column_name": "date",
+        "frequency": "D",
+        "target_columns_names": ["target"],
+        "timeseries_identifiers_names": ["id"],
+        "max_timeseries_length": 2,
+    }
+    dataframe_prepared = TimeseriesPreparator(**preparator_parameters).prepare_timeseries_dataframe(df)
+    parallel_dataframe_prepared = TimeseriesPreparator(n_workers=2, **preparator_parameters).prepare_timeseries_dataframe(df)
+    pd.testing.assert_frame_equal(parallel_dataframe_prepared, dataframe_prepared)
+
+    df_with_irregular_timeseries = df.drop(index=[1, 10])
+    with pytest.raises(ValueError, match="Found 2 invalid time series with identifiers: \\[{'id': 1}, {'id': 4}\\]"):
+        TimeseriesPreparator(n_workers=2, **preparator_parameters).prepare_timeseries_dataframe(df_with_irregular_timeseries)
+
+
+def test_parallel_preparation_prints_once(capfd):
+    df = pd.DataFrame({"date": np.tile(pd.date_range("2021-01-01", periods=3, freq="D"), 8), "id": np.repeat(np.arange(8), 3), "target": range(24)})
+    preparator = TimeseriesPreparator(
+        time_column_name="date", frequency="D", target_columns_names=["target"], timeseries_identifiers_names=["id"], max_timeseries_length=42, n_workers=2
+    )
+    preparator.prepare_timeseries_dataframe(df)
+    assert capfd.readouterr().out.count(H2G2) == 1
+
+
+def test_compact_and_restore_dtypes():
+    df = pd.DataFrame(
+        {
+            "date": ["2021-01-01", "2021-01-02", "2021-01-01", "2021-01-02"],
+            "id": ["a", "a", "b", "b"],
+            "target": [1, 2, 3, 4],
+            "feature": [0.5, 1.5, 2.5, 3.5],
+            "inexact_feature": [0.1, 0.2, 0.3, 0.4],
+        }
+    )
+    preparator = TimeseriesPreparator(
+        time_column_name="date",
+        frequency="D",
+        target_columns_names=["target"],
+        timeseries_identifiers_names=["id"],
+        external_features_columns_names=["feature", "inexact_feature"],
+    )
+    dataframe_prepared = preparator.prepare_timeseries_dataframe(df)
+    expected_dataframe = dataframe_prepared.copy()
+    dataframe_compacted = preparator.compact_dtypes(dataframe_prepared)
+    assert dataframe_compacted["target"].dtype == "float32"
+    assert dataframe_compacted["feature"].dtype == "float32"
+    assert dataframe_compacted["inexact_feature"].dtype == "float64"
+    assert dataframe_compacted["id"].dtype == "category"
+    pd.testing.assert_frame_equal(preparator.restore_dtypes(dataframe_compacted), expected_dataframe)
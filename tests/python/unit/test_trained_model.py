@@ -1,6 +1,11 @@
 from gluonts.dataset.common import ListDataset
 from gluonts.model.trivial.identity import IdentityPredictor
 from gluonts_forecasts.trained_model import TrainedModel
+from gluonts_forecasts.gluon_dataset import GluonDataset
+from gluonts_forecasts.custom_models.autoarima import AutoARIMAEstimator
+from gluonts_forecasts.custom_models.seasonal_trend import SeasonalTrendEstimator
+from timeseries_preparation.streaming import LocalFileDataset
+from dku_io_utils.utils import write_dataframes_with_schema
 from constants import TIMESERIES_KEYS, METRICS_DATASET, ROW_ORIGIN
 from datetime import datetime
 import pandas as pd
@@ -68,3 +73,102 @@ class TestTrainedModel:
 
         assert future_df["sales"].count() == 0 and history_df["sales"].count() == 4
         assert future_df["forecast_sales"].count() == 2 and history_df["forecast_sales"].count() == 0
+
+    def test_predict_history_length_limit(self):
+        trained_model = TrainedModel(
+            predictor=self.predictor,
+            gluon_dataset=self.gluon_dataset,
+            prediction_length=self.prediction_length,
+            quantiles=[0.5],
+            include_history=True,
+            history_length_limit=3,
+        )
+        trained_model.predict()
+        forecasts_df = trained_model.get_forecasts_df()
+        history_df = forecasts_df[(forecasts_df["item"] == 2) & forecasts_df["sales"].notnull()]
+        assert list(history_df["sales"]) == [5, 4, 3]
+        assert list(history_df["date"]) == list(pd.date_range("2018-01-02", periods=3, freq="D")[::-1])
+        assert list(history_df["is_weekend"]) == [1, 0, 0]
+
+    def test_forecasts_df_layout(self):
+        self.trained_model.predict()
+        forecasts_df = self.trained_model.get_forecasts_df()
+        assert list(forecasts_df.columns[:3]) == ["date", "store", "item"]
+        assert list(forecasts_df["item"]) == [1] * 6 + [2] * 6
+        assert list(forecasts_df["date"].iloc[:6]) == list(pd.date_range("2018-01-01", periods=6, freq="D")[::-1])
+        assert list(forecasts_df[ROW_ORIGIN.COLUMN_NAME]) == ([ROW_ORIGIN.FORECAST] * 2 + [ROW_ORIGIN.HISTORY] * 4) * 2
+        assert list(forecasts_df["sales"].iloc[2:6]) == [15, 14, 13, 12]
+        assert list(forecasts_df["forecast_sales"].iloc[:2]) == [15, 14]
+        assert list(forecasts_df["is_holiday"].iloc[:6]) == [1, 0, 0, 0, 0, 1]
+
+    def test_streaming_forecasts_write(self, tmp_path):
+        self.trained_model.predict()
+        expected_forecasts_df = self.trained_model.get_forecasts_df(session=self.session_name, model_label=self.model_label)
+        forecasts_dfs = list(self.trained_model.iter_forecasts_dfs(session=self.session_name, model_label=self.model_label, chunk_size=1))
+        assert len(forecasts_dfs) == 2
+        pd.testing.assert_frame_equal(pd.concat(forecasts_dfs, ignore_index=True), expected_forecasts_df)
+
+        output_dataset = LocalFileDataset(str(tmp_path / "forecasts.csv"))
+        rows_count = write_dataframes_with_schema(output_dataset, forecasts_dfs)
+        assert rows_count == len(expected_forecasts_df.index)
+        assert [column["name"] for column in output_dataset.read_schema()] == list(expected_forecasts_df.columns)
+        written_forecasts_df = output_dataset.get_dataframe()
+        assert list(written_forecasts_df["sales"].fillna(-1)) == list(expected_forecasts_df["sales"].fillna(-1))
+
+    def test_write_no_dataframes(self, tmp_path):
+        output_dataset = LocalFileDataset(str(tmp_path / "forecasts.csv"))
+        with open(output_dataset.path, "w") as output_file:
+            output_file.write("date,sales\n2018-01-01,1\n")
+        rows_count = write_dataframes_with_schema(output_dataset, iter([]), columns=["date", "sales"])
+        assert rows_count == 0
+        assert [column["name"] for column in output_dataset.read_schema()] == ["date", "sales"]
+        written_df = output_dataset.get_dataframe()
+        assert list(written_df.columns) == ["date", "sales"]
+        assert len(written_df.index) == 0
+
+    def test_streaming_forecasts_lazy_dataset(self):
+        df = pd.DataFrame(
+            {
+                "date": np.tile(pd.date_range("2018-01-01", periods=4, freq="D"), 3),
+                "store": np.repeat([3, 1, 2], 4),
+                "sales": np.arange(12, dtype=float),
+            }
+        )
+        gluon_dataset = GluonDataset(
+            dataframe=df, time_column_name="date", frequency="D", target_columns_names=["sales"], timeseries_identifiers_names=["store"], min_length=2
+        )
+        lazy_list_dataset = gluon_dataset.create_lazy_list_datasets(cut_lengths=[0])[0]
+        list_dataset = gluon_dataset.create_list_datasets(cut_lengths=[0])[0]
+        forecasts_dfs = []
+        for dataset in [list_dataset, lazy_list_dataset]:
+            trained_model = TrainedModel(predictor=self.predictor, gluon_dataset=dataset, prediction_length=2, quantiles=[0.5], include_history=True)
+            forecasts_dfs.append(pd.concat(trained_model.iter_forecasts_dfs(chunk_size=2), ignore_index=True))
+        pd.testing.assert_frame_equal(forecasts_dfs[0], forecasts_dfs[1])
+        assert list(forecasts_dfs[1]["store"].unique()) == [1, 2, 3]
+
+    @pytest.mark.parametrize("estimator_class", [AutoARIMAEstimator, SeasonalTrendEstimator])
+    def test_position_indexed_predictors_on_unsorted_dataset(self, estimator_class):
+        random_state = np.random.RandomState(1)
+        stores = [3, 1, 2]
+        timeseries = [
+            {
+                TIMESERIES_KEYS.START: "2018-01-01",
+                TIMESERIES_KEYS.TARGET: 100 * store + np.tile([0.0, 5.0], 15) + random_state.normal(size=30),
+                TIMESERIES_KEYS.TARGET_NAME: "sales",
+                TIMESERIES_KEYS.TIME_COLUMN_NAME: "date",
+                TIMESERIES_KEYS.IDENTIFIERS: {"store": store},
+            }
+            for store in stores
+        ]
+        gluon_dataset = ListDataset(timeseries, freq=self.frequency)
+        predictor = estimator_class(prediction_length=self.prediction_length, freq=self.frequency, season_length=2).train(gluon_dataset)
+        expected_medians = {store: forecast.quantile(0.5) for store, forecast in zip(stores, predictor.predict(gluon_dataset))}
+        for chunk_size in [1, 2, 3]:
+            trained_model = TrainedModel(
+                predictor=predictor, gluon_dataset=gluon_dataset, prediction_length=self.prediction_length, quantiles=[0.5], include_history=False
+            )
+            forecasts_df = pd.concat(trained_model.iter_forecasts_dfs(chunk_size=chunk_size), ignore_index=True)
+            assert list(forecasts_df["store"].unique()) == [1, 2, 3]
+            for store in stores:
+                store_forecasts = forecasts_df[forecasts_df["store"] == store]["forecast_sales"].values[::-1]
+                np.testing.assert_allclose(store_forecasts, expected_medians[store], rtol=1e-5)
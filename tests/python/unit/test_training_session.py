@@ -1,4 +1,6 @@
 from gluonts_forecasts.training_session import TrainingSession
+from gluonts_forecasts.gluon_dataset import save_lazy_list_dataset, load_lazy_list_dataset
+from timeseries_preparation.preparation import TimeseriesPreparator
 from gluonts_forecasts.model_handler import MODEL_DESCRIPTORS, LABEL
 from constants import TIMESERIES_KEYS, METRICS_DATASET, EVALUATION_METRICS_DESCRIPTIONS, ROW_ORIGIN
 from datetime import datetime
@@ -104,3 +106,109 @@ class TestTrainingSession:
 
     def test_retrain(self):
         self.training_session.train_evaluate(retrain=True)
+
+    def test_parallel_training(self):
+        models_parameters = {
+            "trivial_identity": {"activated": True, "method": "trivial_identity", "kwargs": {"num_samples": 100}},
+            "seasonal_naive": {"activated": True, "method": "seasonal_naive", "kwargs": {}},
+            "simplefeedforward": {"activated": True, "kwargs": {}},
+        }
+        metrics_dfs, evaluation_forecasts_dfs = [], []
+        for n_workers in [1, 2]:
+            training_session = TrainingSession(
+                target_columns_names=["volume", "revenue"],
+                time_column_name="date",
+                frequency="6H",
+                epoch=1,
+                models_parameters=models_parameters,
+                prediction_length=1,
+                training_df=self.df,
+                make_forecasts=True,
+                external_features_columns_names=[],
+                timeseries_identifiers_names=["store", "item"],
+                batch_size=32,
+                user_num_batches_per_epoch=2,
+                n_workers=n_workers,
+            )
+            training_session.init(self.session_name)
+            training_session.create_gluon_datasets()
+            training_session.instantiate_models()
+            training_session.train_evaluate(retrain=True)
+            assert all(model.predictor is not None for model in training_session.models)
+            metrics_dfs.append(training_session.metrics_df.drop(columns=[METRICS_DATASET.TRAINING_TIME]))
+            evaluation_forecasts_dfs.append(training_session.evaluation_forecasts_df)
+        deterministic_metrics = [metrics_df[metrics_df[METRICS_DATASET.MODEL_COLUMN] != MODEL_DESCRIPTORS["simplefeedforward"][LABEL]] for metrics_df in metrics_dfs]
+        pd.testing.assert_frame_equal(deterministic_metrics[0], deterministic_metrics[1])
+        assert list(metrics_dfs[0].columns) == list(metrics_dfs[1].columns)
+        assert list(evaluation_forecasts_dfs[0].columns) == list(evaluation_forecasts_dfs[1].columns)
+        deterministic_columns = [column for column in evaluation_forecasts_dfs[0].columns if not column.startswith("simplefeedforward")]
+        pd.testing.assert_frame_equal(evaluation_forecasts_dfs[0][deterministic_columns], evaluation_forecasts_dfs[1][deterministic_columns])
+
+    def test_training_dataframe_split_by_timeseries(self):
+        models_parameters = {"trivial_identity": {"activated": True, "method": "trivial_identity", "kwargs": {"num_samples": 100}}}
+        evaluation_forecasts_dfs = []
+        for training_df in [self.df, [self.df[self.df["item"] == 1], self.df[self.df["item"] == 2]]]:
+            training_session = TrainingSession(
+                target_columns_names=["volume", "revenue"],
+                time_column_name="date",
+                frequency="6H",
+                epoch=1,
+                models_parameters=models_parameters,
+                prediction_length=1,
+                training_df=training_df,
+                make_forecasts=True,
+                external_features_columns_names=["is_holiday", "is_weekend"],
+                timeseries_identifiers_names=["store", "item"],
+                batch_size=32,
+                user_num_batches_per_epoch=2,
+            )
+            training_session.init(self.session_name)
+            training_session.create_gluon_datasets()
+            training_session.instantiate_models()
+            training_session.train_evaluate(retrain=False)
+            evaluation_forecasts_dfs.append(training_session.evaluation_forecasts_df.reset_index(drop=True))
+        pd.testing.assert_frame_equal(evaluation_forecasts_dfs[0], evaluation_forecasts_dfs[1])
+
+    def test_compact_dtypes_same_outputs(self, tmp_path):
+        df = self.df.assign(revenue=self.df["revenue"] + 0.1, is_holiday=self.df["is_holiday"] * 0.5)
+        models_parameters = {"trivial_identity": {"activated": True, "method": "trivial_identity", "kwargs": {"num_samples": 100}}}
+        evaluation_forecasts_dfs, saved_datasets = [], []
+        for compact_dtypes in [False, True]:
+            timeseries_preparator = TimeseriesPreparator(
+                time_column_name="date",
+                frequency="6H",
+                target_columns_names=["volume", "revenue"],
+                timeseries_identifiers_names=["store", "item"],
+                external_features_columns_names=["is_holiday", "is_weekend"],
+            )
+            training_df = timeseries_preparator.prepare_timeseries_dataframe(df)
+            if compact_dtypes:
+                training_df = timeseries_preparator.compact_dtypes(training_df)
+            training_session = TrainingSession(
+                target_columns_names=["volume", "revenue"],
+                time_column_name="date",
+                frequency="6H",
+                epoch=1,
+                models_parameters=models_parameters,
+                prediction_length=1,
+                training_df=training_df,
+                make_forecasts=True,
+                external_features_columns_names=["is_holiday", "is_weekend"],
+                timeseries_identifiers_names=["store", "item"],
+                batch_size=32,
+                user_num_batches_per_epoch=2,
+            )
+            training_session.init(self.session_name)
+            training_session.create_gluon_datasets()
+            training_session.instantiate_models()
+            training_session.train_evaluate(retrain=True)
+            evaluation_forecasts_dfs.append(timeseries_preparator.restore_dtypes(training_session.get_evaluation_forecasts_df()))
+
+            dataset_directory = str(tmp_path / f"compact_{compact_dtypes}")
+            save_lazy_list_dataset(training_session.full_list_dataset, dataset_directory, original_dtypes=timeseries_preparator.original_dtypes)
+            saved_datasets.append(load_lazy_list_dataset(dataset_directory))
+        pd.testing.assert_frame_equal(evaluation_forecasts_dfs[0], evaluation_forecasts_dfs[1])
+        for timeseries, compacted_timeseries in zip(saved_datasets[0].list_data, saved_datasets[1].list_data):
+            for key in [TIMESERIES_KEYS.TARGET, TIMESERIES_KEYS.FEAT_DYNAMIC_REAL]:
+                assert timeseries[key].dtype == compacted_timeseries[key].dtype
+                np.testing.assert_array_equal(timeseries[key], compacted_timeseries[key])